@@ -1,79 +1,185 @@
+import gzip
 import json
+import logging
 import random
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from typing import Optional
 
-from celery.result import AsyncResult
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Request
 from fastapi.responses import JSONResponse, Response
-from redis import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.celery import celery_app
-from app.config import REDIS_URL
+from app.db.cache import get_cache_client
+from app.db.partitions import ensure_transaction_partitions
 from app.db.sessions import async_session_maker, get_async_session
-from app.exceptions.exceptions import (ReportEnqueueException,
+from app.exceptions.exceptions import (BadRequestDataException,
+                                       ReportEnqueueException,
                                        ReportGenerationFailedException)
-from app.schemas.enums import (CurrencyEnum, TransactionStatusEnum,
-                               TransactionTypeEnum, UserStatusEnum)
+from app.schemas.enums import (CurrencyEnum, GranularityEnum,
+                               TransactionStatusEnum, TransactionTypeEnum,
+                               UserStatusEnum)
 from app.schemas.transaction_schemas import RequestTransactionModel
 from app.schemas.user_schemas import RequestUserModel
+from app.services import queries
+from app.services.balance_snapshot_service import clear_balance_snapshots
+from app.services.bucket_cache_service import (get_range_metrics,
+                                               invalidate_all_buckets)
 from app.services.exchange_service import create_exchange_transaction
+from app.services.report_service import (REPORT_EXCEL_ETAG_KEY,
+                                         REPORT_EXCEL_KEY,
+                                         REPORT_JSON_ETAG_KEY, REPORT_JSON_KEY,
+                                         enqueue_report_generation,
+                                         get_in_flight_task_id,
+                                         get_report_freshness,
+                                         get_stored_report, get_task_state)
+from app.services.rollup_service import rebuild_weekly_rollups
 from app.services.transaction_service import create_transaction
 from app.services.user_service import create_user
 
-redis_cache = Redis.from_url(REDIS_URL, db=1)
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
+def _etag_matches(request: Request, etag: Optional[str]) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if etag is None or if_none_match is None:
+        return False
+    candidates = [candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+async def _report_headers(etag: Optional[str], stale: bool) -> dict:
+    headers = {"Cache-Control": "no-cache"}
+    if etag:
+        headers["ETag"] = etag
+    if stale:
+        # Serve the last good report and refresh it in the background
+        headers["X-Report-Stale"] = "true"
+        try:
+            headers["X-Report-Task-Id"] = await enqueue_report_generation()
+        except ReportEnqueueException as e:
+            # The stored report is still good to serve; the next request retries the refresh
+            logger.error("Could not refresh the stale report: %s", e.detail)
+    return headers
+
+
+def _accepts_gzip(request: Request) -> bool:
+    """
+    Whether the Accept-Encoding header allows gzip: listed, or covered by "*", with a non-zero q-value.
+    """
+    qualities = {}
+    for item in request.headers.get("accept-encoding", "").split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            qualities[coding.lower()] = quality
+    return qualities.get("gzip", qualities.get("x-gzip", qualities.get("*", 0.0))) > 0
+
+
+def _gzip_etag(etag: Optional[str]) -> Optional[str]:
+    # The compressed and the identity representation are different bytes, so they need different strong ETags
+    return f'{etag[:-1]}-gzip"' if etag else etag
+
+
 @router.get("/reports/weekly/json")
-async def get_weekly_report_json():
-    cached_data = redis_cache.get("weekly_report_json")
-    if cached_data:
-        data = json.loads(cached_data)
-        return {"report": data}
+async def get_weekly_report_json(request: Request):
+    body, etag, stale = await get_stored_report(REPORT_JSON_KEY, REPORT_JSON_ETAG_KEY)
+    if body:
+        gzip_accepted = _accepts_gzip(request)
+        if gzip_accepted:
+            etag = _gzip_etag(etag)
+        headers = await _report_headers(etag, stale)
+        headers["Vary"] = "Accept-Encoding"
+        if _etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+        # The body is stored gzip-compressed and is passed through as is when the client accepts gzip
+        if gzip_accepted:
+            headers["Content-Encoding"] = "gzip"
+        else:
+            body = gzip.decompress(body)
+        return Response(content=body, media_type="application/json", headers=headers)
     else:
-        try:
-            task = celery_app.send_task("generate_weekly_report")
-        except Exception as e:
-            raise ReportEnqueueException(f"Failed to enqueue report generation: {str(e)}")
-        return JSONResponse(content={"task_id": task.id, "status": "processing"}, status_code=202)
+        task_id = await enqueue_report_generation()
+        return JSONResponse(content={"task_id": task_id, "status": "processing"}, status_code=202)
 
 
 @router.get("/reports/weekly/excel")
-async def download_weekly_report_excel():
-    excel_data = redis_cache.get("weekly_report_excel")
+async def download_weekly_report_excel(request: Request):
+    excel_data, etag, stale = await get_stored_report(REPORT_EXCEL_KEY, REPORT_EXCEL_ETAG_KEY)
     if excel_data:
-        headers = {"Content-Disposition": 'attachment; filename="weekly_report.xlsx"'}
+        headers = await _report_headers(etag, stale)
+        if _etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+        headers["Content-Disposition"] = 'attachment; filename="weekly_report.xlsx"'
         return Response(
             content=excel_data,
             media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             headers=headers,
         )
     else:
-        try:
-            task = celery_app.send_task("generate_weekly_report")
-        except Exception as e:
-            raise ReportEnqueueException(f"Failed to enqueue report generation: {str(e)}")
-        return JSONResponse(content={"task_id": task.id, "status": "processing"}, status_code=202)
+        task_id = await enqueue_report_generation()
+        return JSONResponse(content={"task_id": task_id, "status": "processing"}, status_code=202)
+
+
+@router.get("/reports/weekly/status")
+async def get_current_report_status():
+    task_id = await get_in_flight_task_id()
+    generated_at, stale = await get_report_freshness()
+    response = {"generated_at": generated_at.isoformat() if generated_at else None, "stale": stale}
+    if task_id is None:
+        return {"task_id": None, "status": "idle", **response}
+    state = await get_task_state(task_id)
+    return {"task_id": task_id, "status": state.lower(), **response}
 
 
 @router.get("/reports/weekly/status/{task_id}")
-def get_report_status(task_id: str):
-    result = AsyncResult(task_id, app=celery_app)
-    if result.state == "SUCCESS":
-        cached_data = redis_cache.get("weekly_report_json")
+async def get_report_status(task_id: str):
+    state = await get_task_state(task_id)
+    if state == "SUCCESS":
+        cached_data = await get_cache_client().get(REPORT_JSON_KEY)
         if cached_data:
-            data = json.loads(cached_data)
-            return {"task_id": task_id, "status": "completed", "report": data}
+            data = json.loads(gzip.decompress(cached_data))
+            return {"task_id": task_id, "status": "completed", **data}
         else:
-            return {"task_id": task_id, "status": "completed", "report": None}
-    elif result.state in ["PENDING", "STARTED"]:
-        return {"task_id": task_id, "status": result.state.lower()}
-    elif result.state == "FAILURE":
+            return {"task_id": task_id, "status": "completed", "report": None, "generated_at": None}
+    elif state in ["PENDING", "STARTED"]:
+        return {"task_id": task_id, "status": state.lower()}
+    elif state == "FAILURE":
         raise ReportGenerationFailedException("Report generation failed")
     else:
-        return {"task_id": task_id, "status": result.state.lower()}
+        return {"task_id": task_id, "status": state.lower()}
+
+
+@router.get("/metrics")
+async def get_metrics(
+    start_date: date = Query(..., description="First day of the range (inclusive)"),
+    end_date: date = Query(..., description="Last day of the range (inclusive)"),
+    granularity: GranularityEnum = Query(GranularityEnum.WEEK),
+    session: AsyncSession = Depends(get_async_session),
+):
+    if start_date > end_date:
+        raise BadRequestDataException(detail="start_date must not be after end_date")
+    buckets = await get_range_metrics(session, start_date, end_date, granularity)
+    return {"granularity": granularity, "buckets": buckets}
+
+
+@router.get("/summary")
+async def get_summary(
+    start_date: date = Query(..., description="First day of the range (inclusive)"),
+    end_date: date = Query(..., description="Last day of the range (inclusive)"),
+    session: AsyncSession = Depends(get_async_session),
+):
+    if start_date > end_date:
+        raise BadRequestDataException(detail="start_date must not be after end_date")
+    return await queries.get_summary(session, start_date, end_date)
 
 
 def generate_random_datetime(start: datetime, end: datetime) -> datetime:
@@ -99,6 +205,8 @@ async def populate_db(
     users = []
     now = datetime.utcnow()
     reg_start = now - timedelta(days=360)  # roughly the last year
+    # Transactions are back-dated, so their monthly partitions must exist
+    await ensure_transaction_partitions(await session.connection(), reg_start.date())
 
     # Create users via create_user
     for i in range(num_users):
@@ -195,4 +303,9 @@ async def populate_db(
                 if txn:
                     created_transactions.append(txn)
 
+    # Dates and statuses were rewritten after creation, so rebuild the rollups from raw data
+    await clear_balance_snapshots(session)
+    await rebuild_weekly_rollups(session, reg_start.date(), now.date())
+    await invalidate_all_buckets()
+
     return {"detail": f"Populated DB with {num_users} users and {len(created_transactions)} transactions."}
@@ -1,16 +1,17 @@
-import json
-
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.sessions import get_async_session
 from app.dependencies import get_current_user
-from app.exceptions.exceptions import (BadRequestDataException,
-                                       CurrencyRateFetchException)
+from app.exceptions.exceptions import BadRequestDataException
 from app.schemas.enums import CurrencyEnum
+from app.schemas.exchange_schemas import (RequestQuotesModel,
+                                          ResponseQuotesModel)
 from app.schemas.transaction_schemas import TransactionModel
-from app.services.exchange_service import create_exchange_transaction
-from app.tasks.update_rates import CURRENCIES, redis_client, update_rates
+from app.services.exchange_service import (create_exchange_transaction,
+                                           get_cached_rates_for_base,
+                                           get_quotes)
+from app.tasks.update_rates import CURRENCIES
 
 router = APIRouter()
 
@@ -34,18 +35,13 @@ async def post_exchange(
 
 
 @router.get("/rates/{base}", summary="Get exchange rates")
-def get_rates(base: str):
+async def get_rates(base: str):
     base = base.upper()
     if base not in CURRENCIES:
         raise BadRequestDataException(detail="Base currency not supported")
-    cache_key = f"rates:{base}"
-    data = redis_client.get(cache_key)
-    if data:
-        return json.loads(data)
-    # Fallback: update rates if not in cache
-    update_rates()
-    data = redis_client.get(cache_key)
-    if data:
-        return json.loads(data)
-    else:
-        raise CurrencyRateFetchException(detail="Unable to retrieve rates")
+    return await get_cached_rates_for_base(base)
+
+
+@router.post("/quotes", response_model=ResponseQuotesModel, summary="Convert a batch of amounts at one rates snapshot")
+async def post_quotes(request: RequestQuotesModel):
+    return await get_quotes(request)
@@ -3,28 +3,32 @@ import typing
 from fastapi import APIRouter, Depends, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import TRANSACTION_GROUP_COMMIT
 from app.db.sessions import get_async_session
 from app.dependencies import get_current_admin, get_current_user
 from app.exceptions.exceptions import InsufficientPrivilegesException
 from app.schemas.enums import TransactionDirectionEnum, UserRoleEnum
-from app.schemas.transaction_schemas import (RequestTransactionModel,
-                                             TransactionModel)
+from app.schemas.transaction_schemas import (BatchRollbackRequestModel,
+                                             BatchRollbackResponseModel,
+                                             BatchTransactionRequestModel,
+                                             BatchTransactionResponseModel,
+                                             RequestTransactionModel,
+                                             TransactionModel,
+                                             TransactionPageModel)
 from app.services import transaction_service
 
 router = APIRouter()
 
 
-@router.get(
-    "/",
-    response_model=typing.Optional[list[TransactionModel]] | None,
-    status_code=status.HTTP_200_OK,
-)
+@router.get("/", response_model=TransactionPageModel, status_code=status.HTTP_200_OK)
 async def get_transactions(
     session: AsyncSession = Depends(get_async_session),
     current_user=Depends(get_current_user),
     user_id: typing.Optional[int] = Query(None, description="For admins only"),
     direction: typing.Optional[TransactionDirectionEnum] = Query(None),
-) -> typing.List[TransactionModel]:
+    limit: int = Query(50, ge=1, le=500, description="Page size"),
+    cursor: typing.Optional[str] = Query(None, description="next_cursor of the previous page"),
+) -> TransactionPageModel:
 
     if current_user.role != UserRoleEnum.ADMIN:
         if user_id is not None and user_id != current_user.id:
@@ -33,7 +37,7 @@ async def get_transactions(
     else:
         target_user_id = user_id
 
-    return await transaction_service.get_transactions(target_user_id, session, direction)
+    return await transaction_service.get_transactions(target_user_id, session, direction, limit, cursor)
 
 
 @router.post("/", response_model=typing.Optional[TransactionModel] | None, status_code=status.HTTP_200_OK)
@@ -42,7 +46,27 @@ async def create_transaction(
     session: AsyncSession = Depends(get_async_session),
     current_user=Depends(get_current_user),
 ):
-    return await transaction_service.create_transaction(session, current_user.id, transaction)
+    if TRANSACTION_GROUP_COMMIT:
+        return await transaction_service.create_transaction_grouped(current_user.id, transaction, current_user)
+    return await transaction_service.create_transaction(session, current_user.id, transaction, current_user)
+
+
+@router.post("/batch", response_model=BatchTransactionResponseModel, status_code=status.HTTP_200_OK)
+async def create_transactions_batch(
+    batch: BatchTransactionRequestModel,
+    session: AsyncSession = Depends(get_async_session),
+    admin=Depends(get_current_admin),
+):
+    return await transaction_service.create_transactions_batch(session, batch.rows)
+
+
+@router.post("/rollback", response_model=BatchRollbackResponseModel, status_code=status.HTTP_200_OK)
+async def rollback_transactions_batch(
+    request: BatchRollbackRequestModel,
+    session: AsyncSession = Depends(get_async_session),
+    admin=Depends(get_current_admin),
+):
+    return await transaction_service.rollback_transactions_batch(session, request)
 
 
 @router.patch("/{transaction_id}/rollback", response_model=TransactionModel)
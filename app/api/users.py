@@ -1,15 +1,20 @@
 import typing
+from datetime import datetime, timezone
 
 from fastapi import APIRouter, Depends, Query, status
 from pydantic import EmailStr
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.sessions import get_async_session
-from app.dependencies import get_current_admin
-from app.schemas.enums import UserStatusEnum
-from app.schemas.user_schemas import (RequestUserModel, RequestUserUpdateModel,
+from app.dependencies import get_current_admin, get_current_user
+from app.exceptions.exceptions import InsufficientPrivilegesException
+from app.schemas.enums import UserRoleEnum, UserStatusEnum
+from app.schemas.user_schemas import (RequestBalanceStripesModel,
+                                      RequestUserModel, RequestUserUpdateModel,
+                                      ResponseUserBalanceModel,
                                       ResponseUserModel, UserModel)
-from app.services import user_service
+from app.services import (balance_snapshot_service, balance_stripe_service,
+                          user_service)
 
 router = APIRouter()
 
@@ -41,3 +46,26 @@ async def update_user_status(
     admin=Depends(get_current_admin),
 ):
     return await user_service.update_user_status(user_id, status_update, session)
+
+
+@router.get("/{user_id}/balances", response_model=typing.List[ResponseUserBalanceModel], status_code=status.HTTP_200_OK)
+async def get_user_balances(
+    user_id: int,
+    as_of: typing.Optional[datetime] = Query(None, description="Point in time, UTC if no offset (default: now)"),
+    session: AsyncSession = Depends(get_async_session),
+    current_user=Depends(get_current_user),
+):
+    if current_user.role != UserRoleEnum.ADMIN and user_id != current_user.id:
+        raise InsufficientPrivilegesException()
+    return await balance_snapshot_service.get_balances_as_of(session, user_id, as_of or datetime.now(timezone.utc))
+
+
+@router.put("/{user_id}/balance-stripes", response_model=ResponseUserModel, status_code=status.HTTP_200_OK)
+async def set_balance_stripes(
+    user_id: int,
+    stripes_update: RequestBalanceStripesModel,
+    session: AsyncSession = Depends(get_async_session),
+    admin=Depends(get_current_admin),
+):
+    await balance_stripe_service.set_balance_stripes(session, user_id, stripes_update.stripes)
+    return await user_service.get_user_by_id(session, user_id)
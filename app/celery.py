@@ -1,12 +1,26 @@
 from celery import Celery
+from celery.schedules import crontab
 
 from app.config import BROKER_URL, REDIS_URL
 
 celery_app = Celery(
-    "app", broker=BROKER_URL, backend=REDIS_URL, include=["app.tasks.update_rates", "app.tasks.create_report"]
+    "app",
+    broker=BROKER_URL,
+    backend=REDIS_URL,
+    include=[
+        "app.tasks.update_rates",
+        "app.tasks.create_report",
+        "app.tasks.rebuild_rollups",
+        "app.tasks.partitions",
+        "app.tasks.balance_snapshots",
+    ],
 )
 
 celery_app.conf.beat_schedule = {
-    "refresh-rates-hourly": {"task": "app.tasks.update_rates.update_rates", "schedule": 3600.0}  # 3600 seconds = 1 hour
+    # 3600 seconds = 1 hour
+    "refresh-rates-hourly": {"task": "app.tasks.update_rates.update_rates", "schedule": 3600.0},
+    "create-transaction-partitions-daily": {"task": "create_transaction_partitions", "schedule": 86400.0},
+    # Past BALANCE_SNAPSHOT_LAG_SECONDS after midnight UTC, the snapshot's as_of
+    "take-balance-snapshot-daily": {"task": "take_balance_snapshot", "schedule": crontab(hour=0, minute=15)},
 }
 celery_app.conf.timezone = "UTC"
@@ -16,3 +16,45 @@ JWT_EXPIRATION_MINUTES = int(os.getenv("JWT_EXPIRATION_MINUTES", 30))
 BROKER_URL = os.getenv("BROKER_URL", "")
 REDIS_URL = os.getenv("REDIS_URL", "")
 COINMARKETCAP_API_URL = os.getenv("COINMARKETCAP_API_URL", "")
+# Quotes endpoint; point it at scripts/cmc_stub.py to refresh rates offline
+COINMARKETCAP_BASE_URL = os.getenv(
+    "COINMARKETCAP_BASE_URL", "https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest"
+)
+
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+# Threads that publish Celery tasks and read task states off the event loop
+CELERY_PUBLISH_WORKERS = int(os.getenv("CELERY_PUBLISH_WORKERS", 4))
+
+# Monthly transaction partitions created ahead of the current month
+TRANSACTION_PARTITION_MONTHS_AHEAD = int(os.getenv("TRANSACTION_PARTITION_MONTHS_AHEAD", 3))
+
+# Group commit for POST /transactions/: requests arriving within the window are committed together
+TRANSACTION_GROUP_COMMIT = os.getenv("TRANSACTION_GROUP_COMMIT", "false").lower() == "true"
+TRANSACTION_BATCH_MAX_SIZE = int(os.getenv("TRANSACTION_BATCH_MAX_SIZE", 64))
+TRANSACTION_BATCH_MAX_WAIT_MS = float(os.getenv("TRANSACTION_BATCH_MAX_WAIT_MS", 2))
+
+# Striped balances of hot accounts: how long a process trusts its list of striped accounts, and the stripe limit
+BALANCE_STRIPES_CACHE_SECONDS = float(os.getenv("BALANCE_STRIPES_CACHE_SECONDS", 30))
+BALANCE_MAX_STRIPES = int(os.getenv("BALANCE_MAX_STRIPES", 64))
+
+# Closed day/week/month buckets of GET /analysis/metrics kept in Redis
+BUCKET_CACHE_SECONDS = int(os.getenv("BUCKET_CACHE_SECONDS", 24 * 3600))
+
+# Age a balance snapshot's as_of must have, so the transactions created before it have committed
+BALANCE_SNAPSHOT_LAG_SECONDS = int(os.getenv("BALANCE_SNAPSHOT_LAG_SECONDS", 600))
+
+# Rows per week (and per sender or conversion) of the weekly rollups, so concurrent transactions rarely share one
+ROLLUP_STRIPES = int(os.getenv("ROLLUP_STRIPES", 16))
+
+# Exchange rates kept in-process in front of Redis
+RATES_LOCAL_TTL_SECONDS = float(os.getenv("RATES_LOCAL_TTL_SECONDS", 30))
+# Largest batch accepted by POST /exchange/quotes
+QUOTES_MAX_ITEMS = int(os.getenv("QUOTES_MAX_ITEMS", 10000))
+
+# bcrypt runs in a process pool off the event loop; logins and registrations beyond the pending limit get 503
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 32))
+
+# Authenticated principal (id, role, status): seconds in Redis, and in-process in front of it
+PRINCIPAL_CACHE_SECONDS = int(os.getenv("PRINCIPAL_CACHE_SECONDS", 60))
+PRINCIPAL_LOCAL_TTL_SECONDS = float(os.getenv("PRINCIPAL_LOCAL_TTL_SECONDS", 5))
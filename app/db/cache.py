@@ -0,0 +1,14 @@
+import redis.asyncio as aioredis
+
+from app.config import REDIS_MAX_CONNECTIONS, REDIS_URL
+
+_cache_client = None
+
+
+def get_cache_client() -> aioredis.Redis:
+    global _cache_client
+    if _cache_client is None:
+        # Async client for the report and analytics cache (Redis db 1) on one shared connection pool
+        pool = aioredis.ConnectionPool.from_url(REDIS_URL, db=1, max_connections=REDIS_MAX_CONNECTIONS)
+        _cache_client = aioredis.Redis(connection_pool=pool)
+    return _cache_client
@@ -0,0 +1,55 @@
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Iterable, List, Sequence
+
+from sqlalchemy import (ARRAY, ColumnClause, ColumnElement, Date,
+                        TableValuedAlias, and_, any_, cast, func, literal)
+
+
+def day_start(day: date) -> datetime:
+    """
+    Returns the UTC midnight of the given day.
+    """
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+
+def utc_day(moment: datetime) -> date:
+    """
+    Returns the UTC date of a moment; naive datetimes are taken as UTC.
+    """
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return moment.date()
+
+
+def created_between(column, start_date: date, end_date: date) -> ColumnElement[bool]:
+    """
+    Builds a half-open `column >= start AND column < end + 1 day` predicate for an inclusive date range.
+    The column is compared as is, so a B-tree index on it can be used.
+    """
+    return and_(column >= day_start(start_date), column < day_start(end_date + timedelta(days=1)))
+
+
+def date_bucket(column, granularity: str = "week") -> ColumnElement[date]:
+    """
+    Returns the first day of the day/week/month bucket the column value belongs to.
+    Buckets are taken in UTC whatever the session TimeZone, like utc_day() on the Python side.
+    """
+    return cast(func.date_trunc(granularity, func.timezone("UTC", column)), Date)
+
+
+def in_array(column, items: Iterable[Any], item_type) -> ColumnElement[bool]:
+    """
+    Builds `column = ANY(:items)` with the items bound as one array, where column.in_(items) binds
+    one parameter per item and stops working past the 32767 bind parameters of a statement.
+    """
+    return column == any_(literal(list(items), ARRAY(item_type)))
+
+
+def unnest_rows(name: str, columns: List[ColumnClause], rows: Iterable[Sequence[Any]]) -> TableValuedAlias:
+    """
+    Returns the rows as `unnest(:column1, :column2, ...) AS name(column1, column2, ...)`, one array
+    bind parameter per column, where values(...).data(rows) binds one per cell.
+    """
+    rows = list(rows)
+    arrays = [literal([row[index] for row in rows], ARRAY(col.type)) for index, col in enumerate(columns)]
+    return func.unnest(*arrays).table_valued(*columns).render_derived(name=name)
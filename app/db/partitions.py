@@ -0,0 +1,184 @@
+import logging
+import re
+from datetime import date, datetime, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.config import TRANSACTION_PARTITION_MONTHS_AHEAD
+from app.models.db_models import Transaction
+
+logger = logging.getLogger(__name__)
+
+TRANSACTION_TABLE = Transaction.__tablename__
+# Catches rows outside every monthly partition, so an insert never fails for a missing month
+DEFAULT_PARTITION = f"{TRANSACTION_TABLE}_default"
+_PARTITION_NAME = re.compile(rf"^{TRANSACTION_TABLE}_y(\d{{4}})m(\d{{2}})$")
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{TRANSACTION_TABLE}_y{month.year}m{month.month:02d}"
+
+
+async def is_transaction_table_partitioned(conn: AsyncConnection) -> bool:
+    result = await conn.execute(
+        text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:table)"), {"table": f'"{TRANSACTION_TABLE}"'}
+    )
+    return bool(result.scalar())
+
+
+async def _table_exists(conn: AsyncConnection, name: str) -> bool:
+    return bool((await conn.execute(text("SELECT to_regclass(:name)"), {"name": f'"{name}"'})).scalar())
+
+
+async def create_default_partition(conn: AsyncConnection) -> None:
+    await conn.execute(
+        text(f'CREATE TABLE IF NOT EXISTS "{DEFAULT_PARTITION}" PARTITION OF "{TRANSACTION_TABLE}" DEFAULT')
+    )
+
+
+async def create_transaction_partition(conn: AsyncConnection, month: date) -> None:
+    """
+    Creates the partition holding transactions created in the given month (UTC), if it does not exist.
+    Rows of that month already in the default partition are moved into it.
+    """
+    month = month.replace(day=1)
+    name = partition_name(month)
+    if await _table_exists(conn, name):
+        return
+    # Bounds are dates formatted by us: DDL does not accept bind parameters
+    lower, upper = f"'{month.isoformat()} 00:00:00+00'", f"'{add_months(month, 1).isoformat()} 00:00:00+00'"
+    in_month = f"created >= {lower} AND created < {upper}"
+    if not await _table_exists(conn, DEFAULT_PARTITION) or not (
+        await conn.execute(text(f'SELECT EXISTS (SELECT FROM "{DEFAULT_PARTITION}" WHERE {in_month})'))
+    ).scalar():
+        await conn.execute(
+            text(f'CREATE TABLE "{name}" PARTITION OF "{TRANSACTION_TABLE}" FOR VALUES FROM ({lower}) TO ({upper})')
+        )
+        return
+
+    # A partition cannot be created over rows the default partition holds: fill it first, then attach it
+    logger.warning("Moving transactions of %s out of %s", month, DEFAULT_PARTITION)
+    await conn.execute(
+        text(f'CREATE TABLE "{name}" (LIKE "{TRANSACTION_TABLE}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+    )
+    await conn.execute(
+        text(
+            f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" WHERE {in_month} RETURNING *) '
+            f'INSERT INTO "{name}" SELECT * FROM moved'
+        )
+    )
+    await conn.execute(
+        text(f'ALTER TABLE "{TRANSACTION_TABLE}" ATTACH PARTITION "{name}" FOR VALUES FROM ({lower}) TO ({upper})')
+    )
+
+
+async def ensure_transaction_partitions(
+    conn: AsyncConnection,
+    start: Optional[date] = None,
+    months_ahead: int = TRANSACTION_PARTITION_MONTHS_AHEAD,
+) -> List[str]:
+    """
+    Creates the default partition and the monthly partitions from the month of `start` (default: the current month)
+    up to `months_ahead` months after the current one. Returns the monthly partition names.
+    Fails if the transaction table is not partitioned yet: the app must not start on the old table.
+    """
+    if not await is_transaction_table_partitioned(conn):
+        raise RuntimeError(
+            f"Table {TRANSACTION_TABLE} is not partitioned, run python -m app.tasks.partitions --convert first"
+        )
+    await create_default_partition(conn)
+    current = datetime.now(timezone.utc).date().replace(day=1)
+    month = (start or current).replace(day=1)
+    names = []
+    while month <= add_months(current, months_ahead):
+        await create_transaction_partition(conn, month)
+        names.append(partition_name(month))
+        month = add_months(month, 1)
+    return names
+
+
+async def list_transaction_partitions(conn: AsyncConnection) -> List[Tuple[str, date]]:
+    """
+    Returns the attached monthly partitions with their months, oldest first.
+    """
+    result = await conn.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:table)"
+        ),
+        {"table": f'"{TRANSACTION_TABLE}"'},
+    )
+    partitions = []
+    for name in result.scalars():
+        match = _PARTITION_NAME.match(name)
+        if match:
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+async def detach_transaction_partitions(conn: AsyncConnection, before: date) -> List[str]:
+    """
+    Detaches the partitions of months before the month of `before`. The detached tables keep
+    their rows for archival (pg_dump, then DROP TABLE); nothing is deleted row by row.
+    Returns the detached partition names.
+    """
+    detached = []
+    for name, month in await list_transaction_partitions(conn):
+        if month < before.replace(day=1):
+            await conn.execute(text(f'ALTER TABLE "{TRANSACTION_TABLE}" DETACH PARTITION "{name}"'))
+            # The archive must not keep a dependency on the live id sequence
+            await conn.execute(text(f'ALTER TABLE "{name}" ALTER COLUMN id DROP DEFAULT'))
+            detached.append(name)
+    return detached
+
+
+async def convert_transaction_table_to_partitioned(conn: AsyncConnection) -> int:
+    """
+    One-off migration of an existing plain transaction table into the partitioned one.
+    Copies the rows (columns the old table does not have stay NULL) in the caller's DB transaction
+    and keeps the ids and the id sequence position.
+    Returns the number of copied rows.
+    """
+    if await is_transaction_table_partitioned(conn):
+        return 0
+    legacy = f"{TRANSACTION_TABLE}_legacy"
+    await conn.execute(text(f'ALTER TABLE "{TRANSACTION_TABLE}" RENAME TO "{legacy}"'))
+    await conn.execute(text(f'ALTER SEQUENCE IF EXISTS "{TRANSACTION_TABLE}_id_seq" RENAME TO "{legacy}_id_seq"'))
+    await conn.execute(text(f'ALTER TABLE "{legacy}" RENAME CONSTRAINT "{TRANSACTION_TABLE}_pkey" TO "{legacy}_pkey"'))
+    for index in Transaction.__table__.indexes:
+        await conn.execute(text(f'DROP INDEX IF EXISTS "{index.name}"'))
+
+    await conn.run_sync(Transaction.__table__.create)
+    first_created = (await conn.execute(text(f'SELECT min(created) FROM "{legacy}"'))).scalar()
+    await ensure_transaction_partitions(conn, first_created.date() if first_created else None)
+
+    result = await conn.execute(
+        text("SELECT column_name FROM information_schema.columns WHERE table_name = :table"), {"table": legacy}
+    )
+    legacy_columns = set(result.scalars())
+    columns = ", ".join(
+        f'"{column.name}"'
+        for column in Transaction.__table__.columns
+        if column.name in legacy_columns and column.name != "created"
+    )
+    result = await conn.execute(
+        text(
+            f'INSERT INTO "{TRANSACTION_TABLE}" ({columns}, "created") '
+            f'SELECT {columns}, coalesce("created", now()) FROM "{legacy}"'
+        )
+    )
+    await conn.execute(
+        text(
+            f"SELECT setval(pg_get_serial_sequence('\"{TRANSACTION_TABLE}\"', 'id'), "
+            f'coalesce((SELECT max(id) FROM "{TRANSACTION_TABLE}"), 0) + 1, false)'
+        )
+    )
+    await conn.execute(text(f'DROP TABLE "{legacy}"'))
+    return result.rowcount
@@ -4,6 +4,7 @@ from sqlalchemy.ext.asyncio import (AsyncSession, async_sessionmaker,
                                     create_async_engine)
 
 from app.config import DATABASE_URL
+from app.db.partitions import ensure_transaction_partitions
 from app.models.db_models import Base
 
 engine = create_async_engine(DATABASE_URL)
@@ -13,6 +14,7 @@ async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
 async def create_db_and_tables():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await ensure_transaction_partitions(conn)
 
 
 async def get_async_session() -> typing.AsyncGenerator[AsyncSession, None]:
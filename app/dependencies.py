@@ -7,7 +7,7 @@ from app.exceptions.exceptions import (InsufficientPrivilegesException,
                                        InvalidTokenException)
 from app.schemas.enums import UserRoleEnum
 from app.services.auth_service import decode_access_token
-from app.services.user_service import get_user_by_id
+from app.services.principal_service import get_principal
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
@@ -17,7 +17,7 @@ async def get_current_user(session: AsyncSession = Depends(get_async_session), t
     user_id = payload.get("sub")
     if not user_id:
         raise InvalidTokenException()
-    return await get_user_by_id(session, int(user_id))
+    return await get_principal(session, int(user_id))
 
 
 async def get_current_admin(current_user=Depends(get_current_user)):
@@ -164,3 +164,8 @@ class ReportEnqueueException(HTTPException):
 class ReportGenerationFailedException(HTTPException):
     def __init__(self, detail: str = "Report generation failed") -> None:
         super().__init__(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=detail)
+
+
+class PasswordHashingBusyException(HTTPException):
+    def __init__(self, detail: str = "Too many logins in progress, retry later") -> None:
+        super().__init__(detail=detail, status_code=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": "1"})
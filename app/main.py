@@ -4,6 +4,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api import analysis, auth, exchange, transactions, users
 from app.db.sessions import create_db_and_tables, get_async_session
+from app.services.password_service import shutdown_password_pool
 
 app = FastAPI()
 
@@ -19,5 +20,10 @@ async def on_startup(session: AsyncSession = Depends(get_async_session)):
     await create_db_and_tables()
 
 
+@app.on_event("shutdown")
+async def on_shutdown():
+    shutdown_password_pool()
+
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=7999, reload=True)
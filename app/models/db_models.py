@@ -1,9 +1,9 @@
-from datetime import datetime
+from datetime import date, datetime
 from decimal import Decimal
 from typing import Optional
 
-from sqlalchemy import (DateTime, Enum, ForeignKey, Integer, Numeric, String,
-                        UniqueConstraint)
+from sqlalchemy import (Date, DateTime, Enum, ForeignKey, Index, Integer,
+                        Numeric, String, UniqueConstraint)
 from sqlalchemy.orm import (DeclarativeMeta, Mapped, declarative_base,
                             relationship)
 from sqlalchemy.testing.schema import mapped_column
@@ -16,6 +16,7 @@ Base: DeclarativeMeta = declarative_base()
 
 class User(Base):
     __tablename__ = "user"
+    __table_args__ = (Index("ix_user_created", "created"),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     role: Mapped["UserRoleEnum"] = mapped_column(
         Enum(UserRoleEnum, native_enum=False, create_constraint=True), nullable=False, default=UserRoleEnum.USER
@@ -44,9 +45,29 @@ class UserBalance(Base):
     owner: Mapped["User"] = relationship("User", back_populates="user_balance")
 
 
+class BalanceStripe(Base):
+    # Hot accounts only: the balance is the user_balance amount plus its stripes,
+    # see app/services/balance_stripe_service.py
+    __tablename__ = "user_balance_stripe"
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("user.id"), primary_key=True)
+    currency: Mapped["CurrencyEnum"] = mapped_column(
+        Enum(CurrencyEnum, native_enum=False, create_constraint=True, name="stripecurrencyenum"), primary_key=True
+    )
+    stripe: Mapped[int] = mapped_column(Integer, primary_key=True)
+    amount: Mapped[Decimal] = mapped_column(Numeric(precision=12, scale=6), nullable=False, default=0)
+
+
 class Transaction(Base):
     __tablename__ = "transaction"
-    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    __table_args__ = (
+        Index("ix_transaction_created_type_status", "created", "type", "status"),
+        Index("ix_transaction_created_id", "created", "id"),
+        Index("ix_transaction_sender_created", "sender_id", "created", "id"),
+        Index("ix_transaction_recipient_created", "recipient_id", "created", "id"),
+        # Range-partitioned by month on created, see app/db/partitions.py
+        {"postgresql_partition_by": "RANGE (created)"},
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     sender_id: Mapped[int] = mapped_column(Integer, ForeignKey("user.id"), nullable=False)
     recipient_id: Mapped[Optional[int]] = mapped_column(Integer, ForeignKey("user.id"), nullable=True)
     currency: Mapped["CurrencyEnum"] = mapped_column(
@@ -62,7 +83,72 @@ class Transaction(Base):
     to_currency: Mapped["CurrencyEnum"] = mapped_column(
         Enum(CurrencyEnum, native_enum=False, create_constraint=True, name="tocurrencyenum"), nullable=True
     )
+    converted_amount: Mapped[Optional[Decimal]] = mapped_column(Numeric(precision=12, scale=6), nullable=True)
+    # Version of the rates snapshot an exchange was priced with
+    rate_version: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     status: Mapped["TransactionStatusEnum"] = mapped_column(
         Enum(TransactionStatusEnum, native_enum=False, create_constraint=True), nullable=False
     )
-    created: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True, default=datetime.now)
+    # The partition key has to be part of the primary key
+    created: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True, default=datetime.now)
+
+
+# The weekly rollups are split into ROLLUP_STRIPES rows per key: writers add to a random stripe,
+# readers sum the stripes of a week
+class WeeklyMetrics(Base):
+    __tablename__ = "weekly_metrics"
+    week_start: Mapped[date] = mapped_column(Date, primary_key=True)
+    stripe: Mapped[int] = mapped_column(Integer, primary_key=True, default=0)
+    new_users: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    sum_deposits: Mapped[Decimal] = mapped_column(Numeric(precision=20, scale=6), nullable=False, default=0)
+    deposit_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    sum_withdrawals: Mapped[Decimal] = mapped_column(Numeric(precision=20, scale=6), nullable=False, default=0)
+    withdrawal_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    sum_transfers: Mapped[Decimal] = mapped_column(Numeric(precision=20, scale=6), nullable=False, default=0)
+    total_transactions: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    completed_transactions: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class WeeklySender(Base):
+    __tablename__ = "weekly_sender"
+    week_start: Mapped[date] = mapped_column(Date, primary_key=True)
+    sender_id: Mapped[int] = mapped_column(Integer, ForeignKey("user.id"), primary_key=True)
+    stripe: Mapped[int] = mapped_column(Integer, primary_key=True, default=0)
+    transactions: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    deposits: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class WeeklyConversion(Base):
+    __tablename__ = "weekly_conversion"
+    week_start: Mapped[date] = mapped_column(Date, primary_key=True)
+    from_currency: Mapped["CurrencyEnum"] = mapped_column(
+        Enum(CurrencyEnum, native_enum=False, create_constraint=True, name="weeklyfromcurrencyenum"), primary_key=True
+    )
+    to_currency: Mapped["CurrencyEnum"] = mapped_column(
+        Enum(CurrencyEnum, native_enum=False, create_constraint=True, name="weeklytocurrencyenum"), primary_key=True
+    )
+    stripe: Mapped[int] = mapped_column(Integer, primary_key=True, default=0)
+    count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    sum_amount: Mapped[Decimal] = mapped_column(Numeric(precision=20, scale=6), nullable=False, default=0)
+
+
+class BalanceSnapshot(Base):
+    __tablename__ = "balance_snapshot"
+    __table_args__ = (Index("ix_balance_snapshot_user_currency", "user_id", "currency", "as_of"),)
+    as_of: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("user.id"), primary_key=True)
+    currency: Mapped["CurrencyEnum"] = mapped_column(
+        Enum(CurrencyEnum, native_enum=False, create_constraint=True, name="snapshotcurrencyenum"), primary_key=True
+    )
+    amount: Mapped[Decimal] = mapped_column(Numeric(precision=20, scale=6), nullable=False)
+
+
+class RateHistory(Base):
+    # One row per currency for every rates refresh, see app/services/rate_history_service.py
+    __tablename__ = "rate_history"
+    recorded_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    currency: Mapped["CurrencyEnum"] = mapped_column(
+        Enum(CurrencyEnum, native_enum=False, create_constraint=True, name="ratecurrencyenum"), primary_key=True
+    )
+    version: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    usd_value: Mapped[Decimal] = mapped_column(Numeric(precision=30, scale=12), nullable=False)
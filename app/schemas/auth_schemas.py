@@ -1,6 +1,15 @@
 from pydantic import BaseModel
 
+from app.schemas.enums import UserRoleEnum, UserStatusEnum
+
 
 class Token(BaseModel):
     access_token: str
     token_type: str
+
+
+class PrincipalModel(BaseModel):
+    # What authorization needs from the authenticated user; cached by app/services/principal_service.py
+    id: int
+    role: UserRoleEnum
+    status: UserStatusEnum
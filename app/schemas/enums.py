@@ -39,3 +39,9 @@ class UserRoleEnum(StrEnum):
 class TransactionDirectionEnum(StrEnum):
     RECEIVED = "RECEIVED"
     SENT = "SENT"
+
+
+class GranularityEnum(StrEnum):
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
@@ -0,0 +1,47 @@
+import typing
+from datetime import datetime
+from decimal import Decimal
+
+from pydantic import BaseModel, Field
+
+from app.config import QUOTES_MAX_ITEMS
+from app.schemas.enums import CurrencyEnum
+
+
+class QuoteItemModel(BaseModel):
+    from_currency: CurrencyEnum
+    to_currency: CurrencyEnum
+    amount: Decimal = Field(gt=0)
+
+
+class PortfolioModel(BaseModel):
+    # Amount held in every currency, all valued in target
+    holdings: typing.Dict[CurrencyEnum, Decimal] = Field(min_length=1)
+    target: CurrencyEnum
+
+
+class RequestQuotesModel(BaseModel):
+    items: typing.List[QuoteItemModel] = Field([], max_length=QUOTES_MAX_ITEMS)
+    portfolio: typing.Optional[PortfolioModel] = None
+
+
+class QuoteModel(BaseModel):
+    from_currency: CurrencyEnum
+    to_currency: CurrencyEnum
+    amount: float
+    rate: float
+    converted_amount: float
+
+
+class ResponsePortfolioModel(BaseModel):
+    target: CurrencyEnum
+    total: float
+    holdings: typing.List[QuoteModel]
+
+
+class ResponseQuotesModel(BaseModel):
+    # Every conversion of the response uses the rates of this snapshot
+    version: int
+    updated: datetime
+    quotes: typing.List[QuoteModel]
+    portfolio: typing.Optional[ResponsePortfolioModel] = None
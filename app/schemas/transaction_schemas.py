@@ -1,7 +1,7 @@
 import typing
-from datetime import datetime
+from datetime import date, datetime
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 
 from app.schemas.enums import (CurrencyEnum, TransactionStatusEnum,
                                TransactionTypeEnum)
@@ -25,3 +25,63 @@ class TransactionModel(BaseModel):
     type: typing.Optional[TransactionTypeEnum] = None
     status: typing.Optional[TransactionStatusEnum] = None
     created: typing.Optional[datetime] = None
+    rate_version: typing.Optional[int] = None
+
+
+class TransactionPageModel(BaseModel):
+    items: typing.List[TransactionModel]
+    next_cursor: typing.Optional[str] = None
+
+
+class BatchTransactionRowModel(BaseModel):
+    user_id: int
+    currency: CurrencyEnum
+    amount: float
+    type: TransactionTypeEnum
+
+
+class BatchTransactionRequestModel(BaseModel):
+    rows: typing.List[BatchTransactionRowModel] = Field(..., min_length=1, max_length=50000)
+
+
+class BatchTransactionRowResultModel(BaseModel):
+    index: int
+    accepted: bool
+    transaction_id: typing.Optional[int] = None
+    error: typing.Optional[str] = None
+
+
+class BatchTransactionResponseModel(BaseModel):
+    accepted: int
+    rejected: int
+    results: typing.List[BatchTransactionRowResultModel]
+
+
+class BatchRollbackRequestModel(BaseModel):
+    transaction_ids: typing.Optional[typing.List[int]] = Field(None, min_length=1, max_length=50000)
+    user_id: typing.Optional[int] = None
+    type: typing.Optional[TransactionTypeEnum] = None
+    currency: typing.Optional[CurrencyEnum] = None
+    start_date: typing.Optional[date] = None
+    end_date: typing.Optional[date] = None
+    dry_run: bool = False
+
+
+class BatchRollbackResultModel(BaseModel):
+    transaction_id: int
+    rolled_back: bool
+    error: typing.Optional[str] = None
+
+
+class BalanceChangeModel(BaseModel):
+    user_id: int
+    currency: CurrencyEnum
+    delta: float
+
+
+class BatchRollbackResponseModel(BaseModel):
+    dry_run: bool
+    rolled_back: int
+    failed: int
+    balance_changes: typing.List[BalanceChangeModel]
+    results: typing.List[BatchRollbackResultModel]
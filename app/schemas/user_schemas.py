@@ -1,8 +1,9 @@
 import typing
 from datetime import datetime
 
-from pydantic import BaseModel, ConfigDict, EmailStr, model_validator
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, model_validator
 
+from app.config import BALANCE_MAX_STRIPES
 from app.schemas.enums import CurrencyEnum, UserRoleEnum, UserStatusEnum
 
 
@@ -15,6 +16,11 @@ class RequestUserUpdateModel(BaseModel):
     status: UserStatusEnum
 
 
+class RequestBalanceStripesModel(BaseModel):
+    # 0 turns striping off
+    stripes: int = Field(ge=0, le=BALANCE_MAX_STRIPES)
+
+
 class ResponseUserBalanceModel(BaseModel):
     currency: typing.Optional[CurrencyEnum] = None
     amount: float
@@ -1,29 +1,33 @@
 import json
+import logging
+import tempfile
 from datetime import date, datetime, timedelta
 from io import BytesIO
-from typing import Any, Dict, List, Optional, Tuple
+from pathlib import Path
+from typing import (Any, BinaryIO, Dict, Iterable, Iterator, List, Optional,
+                    Union)
 
 from openpyxl import Workbook
-from sqlalchemy import func, select
+from openpyxl.utils import get_column_letter
+from sqlalchemy import Date, column, func, select, values
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.db.filters import created_between, date_bucket
 from app.db.sessions import async_session_maker
-from app.models.db_models import Transaction, User
-from app.schemas.enums import TransactionStatusEnum, TransactionTypeEnum
+from app.models.db_models import (Transaction, User, WeeklyConversion,
+                                  WeeklyMetrics, WeeklySender)
+from app.schemas.enums import (GranularityEnum, TransactionStatusEnum,
+                               TransactionTypeEnum)
+from app.services.rate_history_service import usd_totals
+
+logger = logging.getLogger(__name__)
 
 
 async def get_new_users_count(session: AsyncSession, start_date: date, end_date: date) -> int:
     """
     Returns the count of new users created within the date range (inclusive).
     """
-    query = (
-        select(func.count())
-        .select_from(User)
-        .where(
-                func.date(User.created) >= start_date,
-                func.date(User.created) <= end_date,
-        )
-    )
+    query = select(func.count()).select_from(User).where(created_between(User.created, start_date, end_date))
     return (await session.scalar(query)) or 0
 
 
@@ -38,7 +42,7 @@ async def get_distinct_senders_count(
     Returns the number of unique users (sender_id) in the specified date range.
     You can filter by transaction type and status if provided.
     """
-    conditions = [func.date(Transaction.created) >= start_date, func.date(Transaction.created) <= end_date]
+    conditions = [created_between(Transaction.created, start_date, end_date)]
     if txn_type:
         conditions.append(Transaction.type == txn_type)
     if txn_status:
@@ -59,7 +63,7 @@ async def get_transaction_sum(
     Returns the total transaction amount within the specified date range.
     Transaction type and status can be specified if needed.
     """
-    conditions = [func.date(Transaction.created) >= start_date, func.date(Transaction.created) <= end_date]
+    conditions = [created_between(Transaction.created, start_date, end_date)]
     if txn_type:
         conditions.append(Transaction.type == txn_type)
     if txn_status:
@@ -81,7 +85,7 @@ async def get_transaction_count(
     Returns the number of transactions within the specified date range.
     You can filter by status and type if needed.
     """
-    conditions = [func.date(Transaction.created) >= start_date, func.date(Transaction.created) <= end_date]
+    conditions = [created_between(Transaction.created, start_date, end_date)]
     if txn_status:
         conditions.append(Transaction.status == txn_status)
     if txn_type:
@@ -102,7 +106,7 @@ async def get_average_transaction_amount(
     Returns the average transaction amount within the specified date range.
     You can filter by status and type if needed.
     """
-    conditions = [func.date(Transaction.created) >= start_date, func.date(Transaction.created) <= end_date]
+    conditions = [created_between(Transaction.created, start_date, end_date)]
     if txn_type:
         conditions.append(Transaction.type == txn_type)
     if txn_status:
@@ -123,8 +127,7 @@ async def get_conversions(session: AsyncSession, start_date: date, end_date: dat
     for transactions of type EXCHANGE with status PROCESSED during the period.
     """
     conditions = [
-        func.date(Transaction.created) >= start_date,
-        func.date(Transaction.created) <= end_date,
+        created_between(Transaction.created, start_date, end_date),
         Transaction.type == TransactionTypeEnum.EXCHANGE.value,
         Transaction.status == TransactionStatusEnum.PROCESSED.value,
     ]
@@ -150,6 +153,29 @@ async def get_conversions(session: AsyncSession, start_date: date, end_date: dat
     return conversions
 
 
+DYNAMICS_METRICS = ("new_users", "sum_deposits", "sum_withdrawals", "sum_transfers", "total_transactions")
+
+
+def calc_delta(current: float, prev: Optional[float]) -> Dict[str, Optional[float]]:
+    """
+    Calculates the difference and percentage change against the previous value.
+    """
+    if prev is None:
+        return {"delta": None, "pct_change": None}
+    delta = current - prev
+    pct = (delta / prev * 100.0) if prev != 0 else None
+    return {"delta": delta, "pct_change": pct}
+
+
+def week_dynamics(current: Dict[str, Any], previous: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Returns the dynamics block of a week against the previous week's metrics (empty for the first week).
+    """
+    if not previous:
+        return {}
+    return {metric: calc_delta(current[metric], previous.get(metric)) for metric in DYNAMICS_METRICS}
+
+
 async def collect_week_metrics(
     session: AsyncSession,
     week_start: datetime,
@@ -218,14 +244,6 @@ async def collect_week_metrics(
 
     active_users = await get_distinct_senders_count(session, week_start_date, week_end_date)
 
-    # Function to calculate the difference and percentage change
-    def calc_delta(current: float, prev: Optional[float]) -> Dict[str, Optional[float]]:
-        if prev is None:
-            return {"delta": None, "pct_change": None}
-        delta = current - prev
-        pct = (delta / prev * 100.0) if prev != 0 else None
-        return {"delta": delta, "pct_change": pct}
-
     # If previous week's data is available, calculate the changes
     dynamics = {}
     if previous:
@@ -254,17 +272,234 @@ async def collect_week_metrics(
     }
 
 
-async def collect_all_weeks_report() -> Tuple[str, bytes]:
+def _bucket_metrics_subquery(granularity: str, bucket_starts: List[date], end_date: date):
     """
-    Collects a report for the last 52 weeks, starting with the current (or previous) week.
+    Returns a subquery with one row of aggregates per bucket start (zeros for empty buckets).
+    Transactions and users are bucketed with date_trunc(granularity, created).
+    """
+    start_date = bucket_starts[0]
+    buckets_table = values(column("bucket_start", Date), name="buckets").data([(d,) for d in bucket_starts])
+
+    txn_bucket = date_bucket(Transaction.created, granularity)
+    is_processed = Transaction.status == TransactionStatusEnum.PROCESSED.value
+    is_deposit = Transaction.type == TransactionTypeEnum.DEPOSIT.value
+    is_withdrawal = Transaction.type == TransactionTypeEnum.WITHDRAWAL.value
+    is_transfer = Transaction.type == TransactionTypeEnum.TRANSFER.value
+
+    txn_agg = (
+        select(
+            txn_bucket.label("bucket_start"),
+            func.count(func.distinct(Transaction.sender_id)).filter(is_deposit).label("deposit_users"),
+            func.count(func.distinct(Transaction.sender_id)).label("transaction_users"),
+            func.sum(Transaction.amount).filter(is_deposit & is_processed).label("sum_deposits"),
+            func.sum(Transaction.amount).filter(is_withdrawal & is_processed).label("sum_withdrawals"),
+            func.sum(Transaction.amount).filter(is_transfer & is_processed).label("sum_transfers"),
+            func.count().label("total_transactions"),
+            func.count().filter(is_processed).label("completed_transactions"),
+            func.avg(Transaction.amount).filter(is_deposit & is_processed).label("avg_deposit"),
+            func.avg(Transaction.amount).filter(is_withdrawal & is_processed).label("avg_withdrawal"),
+        )
+        .where(created_between(Transaction.created, start_date, end_date))
+        .group_by(txn_bucket)
+        .subquery("txn_agg")
+    )
+
+    user_bucket = date_bucket(User.created, granularity)
+    user_agg = (
+        select(user_bucket.label("bucket_start"), func.count().label("new_users"))
+        .where(created_between(User.created, start_date, end_date))
+        .group_by(user_bucket)
+        .subquery("user_agg")
+    )
+
+    return (
+        select(
+            buckets_table.c.bucket_start,
+            func.coalesce(user_agg.c.new_users, 0).label("new_users"),
+            func.coalesce(txn_agg.c.deposit_users, 0).label("deposit_users"),
+            func.coalesce(txn_agg.c.transaction_users, 0).label("transaction_users"),
+            func.coalesce(txn_agg.c.sum_deposits, 0).label("sum_deposits"),
+            func.coalesce(txn_agg.c.sum_withdrawals, 0).label("sum_withdrawals"),
+            func.coalesce(txn_agg.c.sum_transfers, 0).label("sum_transfers"),
+            func.coalesce(txn_agg.c.total_transactions, 0).label("total_transactions"),
+            func.coalesce(txn_agg.c.completed_transactions, 0).label("completed_transactions"),
+            func.coalesce(txn_agg.c.avg_deposit, 0).label("avg_deposit"),
+            func.coalesce(txn_agg.c.avg_withdrawal, 0).label("avg_withdrawal"),
+        )
+        .select_from(
+            buckets_table.outerjoin(txn_agg, txn_agg.c.bucket_start == buckets_table.c.bucket_start).outerjoin(
+                user_agg, user_agg.c.bucket_start == buckets_table.c.bucket_start
+            )
+        )
+        .subquery("bucket_metrics")
+    )
+
+
+async def _collect_bucket_conversions(
+    session: AsyncSession, granularity: str, start_date: date, end_date: date
+) -> Dict[date, Dict[str, Any]]:
+    """
+    Returns the processed EXCHANGE conversions per bucket start, in the get_conversions format.
+    """
+    txn_bucket = date_bucket(Transaction.created, granularity)
+    query = (
+        select(
+            txn_bucket.label("bucket_start"),
+            Transaction.from_currency,
+            Transaction.to_currency,
+            func.count().label("count"),
+            func.coalesce(func.sum(Transaction.amount), 0).label("sum_amount"),
+        )
+        .where(
+            created_between(Transaction.created, start_date, end_date),
+            Transaction.type == TransactionTypeEnum.EXCHANGE.value,
+            Transaction.status == TransactionStatusEnum.PROCESSED.value,
+        )
+        .group_by(txn_bucket, Transaction.from_currency, Transaction.to_currency)
+        .order_by(txn_bucket, Transaction.from_currency, Transaction.to_currency)
+    )
+    conversions: Dict[date, Dict[str, Any]] = {}
+    for row in await session.execute(query):
+        conversions.setdefault(row.bucket_start, {})[f"{row.from_currency}_to_{row.to_currency}"] = {
+            "count": row.count,
+            "sum_amount": float(row.sum_amount),
+        }
+    return conversions
+
+
+def _bucket_row_to_metrics(
+    row,
+    start_date: date,
+    end_date: date,
+    conversions: Dict[str, Any],
+    dynamics: Dict[str, Any],
+    period: str = "week",
+) -> Dict[str, Any]:
+    return {
+        f"{period}_start": start_date.isoformat(),
+        f"{period}_end": end_date.isoformat(),
+        "new_users": row["new_users"],
+        "deposit_users": row["deposit_users"],
+        "transaction_users": row["transaction_users"],
+        "sum_deposits": float(row["sum_deposits"]),
+        "sum_withdrawals": float(row["sum_withdrawals"]),
+        "sum_transfers": float(row["sum_transfers"]),
+        "total_transactions": row["total_transactions"],
+        "completed_transactions": row["completed_transactions"],
+        "conversions": conversions,
+        "avg_deposit": float(row["avg_deposit"]),
+        "avg_withdrawal": float(row["avg_withdrawal"]),
+        "active_users": row["transaction_users"],
+        "dynamics": dynamics,
+    }
+
+
+async def collect_weeks_metrics(session: AsyncSession, start_date: date, weeks: int) -> List[Dict[str, Any]]:
+    """
+    Collects metrics for `weeks` consecutive weeks starting at start_date (a Monday) in two grouped queries:
+    one for the per-week aggregates (with the previous week's values fetched by window functions)
+    and one for the per-week conversions.
+    Returns the same list of dictionaries as calling collect_week_metrics week by week.
+    """
+    end_date = start_date + timedelta(weeks=weeks, days=-1)
+    week_starts = [start_date + timedelta(weeks=i) for i in range(weeks)]
+
+    weekly = _bucket_metrics_subquery("week", week_starts, end_date)
+    query = select(
+        weekly,
+        *[
+            func.lag(weekly.c[metric]).over(order_by=weekly.c.bucket_start).label(f"prev_{metric}")
+            for metric in DYNAMICS_METRICS
+        ],
+    ).order_by(weekly.c.bucket_start)
+    rows = (await session.execute(query)).mappings().all()
+    conversions_by_week = await _collect_bucket_conversions(session, "week", start_date, end_date)
+
+    report = []
+    for row in rows:
+        dynamics = {}
+        if row["prev_new_users"] is not None:
+            for metric in DYNAMICS_METRICS:
+                current, prev = row[metric], row[f"prev_{metric}"]
+                if not isinstance(prev, int):
+                    current, prev = float(current), float(prev)
+                dynamics[metric] = calc_delta(current, prev)
+
+        week_start = row["bucket_start"]
+        report.append(
+            _bucket_row_to_metrics(
+                row, week_start, week_start + timedelta(days=6), conversions_by_week.get(week_start, {}), dynamics
+            )
+        )
+    return report
+
+
+async def collect_buckets_metrics(
+    session: AsyncSession, granularity: GranularityEnum, bucket_starts: List[date]
+) -> Dict[date, Dict[str, Any]]:
+    """
+    Collects the metrics of consecutive day/week/month buckets in two grouped queries.
+    The result has the weekly report format with "bucket_start"/"bucket_end" instead of "week_start"/"week_end"
+    and an empty dynamics block, since dynamics depend on the neighbouring bucket.
+    """
+    end_date = next_bucket_start(bucket_starts[-1], granularity) - timedelta(days=1)
+    buckets = _bucket_metrics_subquery(granularity.value, bucket_starts, end_date)
+    rows = (await session.execute(select(buckets))).mappings().all()
+    conversions = await _collect_bucket_conversions(session, granularity.value, bucket_starts[0], end_date)
+
+    return {
+        row["bucket_start"]: _bucket_row_to_metrics(
+            row,
+            row["bucket_start"],
+            next_bucket_start(row["bucket_start"], granularity) - timedelta(days=1),
+            conversions.get(row["bucket_start"], {}),
+            {},
+            period="bucket",
+        )
+        for row in rows
+    }
+
+
+def bucket_start_of(day: date, granularity: GranularityEnum) -> date:
+    """
+    Returns the first day of the day/week/month bucket the day belongs to.
+    """
+    if granularity == GranularityEnum.WEEK:
+        return day - timedelta(days=day.weekday())
+    if granularity == GranularityEnum.MONTH:
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket_start(bucket_start: date, granularity: GranularityEnum) -> date:
+    """
+    Returns the first day of the bucket following bucket_start.
+    """
+    if granularity == GranularityEnum.WEEK:
+        return bucket_start + timedelta(weeks=1)
+    if granularity == GranularityEnum.MONTH:
+        return (bucket_start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return bucket_start + timedelta(days=1)
+
+
+def get_report_window(weeks: int = 52) -> date:
+    """
+    Returns the Monday `weeks` weeks before the Monday of the current week.
+    """
+    today = datetime.utcnow().date()
+    # last_monday: find the Monday of the current week
+    last_monday = today - timedelta(days=today.weekday())
+    return last_monday - timedelta(weeks=weeks)
+
+
+async def collect_all_weeks_report_sequential() -> List[Dict[str, Any]]:
+    """
+    Collects the last 52 weeks week by week with collect_week_metrics.
+    Kept as the reference implementation for collect_weeks_metrics.
     """
     async with async_session_maker() as session:
         report = []
-        today = datetime.utcnow().date()
-        # last_monday: find the Monday of the current week
-        last_monday = today - timedelta(days=today.weekday())
-        # start_date: the Monday 52 weeks ago
-        start_date = last_monday - timedelta(weeks=52)
+        start_date = get_report_window(52)
 
         previous_metrics = None
         for i in range(52):
@@ -273,47 +508,158 @@ async def collect_all_weeks_report() -> Tuple[str, bytes]:
             metrics = await collect_week_metrics(session, week_start, week_end, previous_metrics)
             report.append(metrics)
             previous_metrics = metrics
+    return report
+
 
-    report_json = json.dumps(report, ensure_ascii=False)
-    excel_bytes = generate_excel_file(report)
+async def collect_weeks_from_rollup(session: AsyncSession, start_date: date, weeks: int) -> List[Dict[str, Any]]:
+    """
+    Builds the same report as collect_weeks_metrics from the pre-aggregated weekly rollup tables,
+    summing the stripes of every week.
+    """
+    end_date = start_date + timedelta(weeks=weeks, days=-1)
 
-    return report_json, excel_bytes
+    sum_deposits = func.sum(WeeklyMetrics.sum_deposits)
+    sum_withdrawals = func.sum(WeeklyMetrics.sum_withdrawals)
+    metrics_query = (
+        select(
+            WeeklyMetrics.week_start,
+            func.sum(WeeklyMetrics.new_users).label("new_users"),
+            sum_deposits.label("sum_deposits"),
+            sum_withdrawals.label("sum_withdrawals"),
+            func.sum(WeeklyMetrics.sum_transfers).label("sum_transfers"),
+            func.sum(WeeklyMetrics.total_transactions).label("total_transactions"),
+            func.sum(WeeklyMetrics.completed_transactions).label("completed_transactions"),
+            func.coalesce(sum_deposits / func.nullif(func.sum(WeeklyMetrics.deposit_count), 0), 0).label("avg_deposit"),
+            func.coalesce(sum_withdrawals / func.nullif(func.sum(WeeklyMetrics.withdrawal_count), 0), 0).label(
+                "avg_withdrawal"
+            ),
+        )
+        .where(WeeklyMetrics.week_start.between(start_date, end_date))
+        .group_by(WeeklyMetrics.week_start)
+    )
+    rows_by_week = {row.week_start: row for row in await session.execute(metrics_query)}
 
+    # A sender has a row per stripe it was written to, so the users of a week are its distinct senders
+    users_query = (
+        select(
+            WeeklySender.week_start,
+            func.count(func.distinct(WeeklySender.sender_id)).label("transaction_users"),
+            func.count(func.distinct(WeeklySender.sender_id)).filter(WeeklySender.deposits > 0).label("deposit_users"),
+        )
+        .where(WeeklySender.week_start.between(start_date, end_date))
+        .group_by(WeeklySender.week_start)
+    )
+    users_by_week = {row.week_start: row for row in await session.execute(users_query)}
 
-def generate_excel_file(report_data: List[Dict[str, Any]]) -> bytes:
+    conversion_count = func.sum(WeeklyConversion.count)
+    conversions_query = (
+        select(
+            WeeklyConversion.week_start,
+            WeeklyConversion.from_currency,
+            WeeklyConversion.to_currency,
+            conversion_count.label("conversions"),
+            func.sum(WeeklyConversion.sum_amount).label("sum_amount"),
+        )
+        .where(WeeklyConversion.week_start.between(start_date, end_date))
+        .group_by(WeeklyConversion.week_start, WeeklyConversion.from_currency, WeeklyConversion.to_currency)
+        .having(conversion_count > 0)
+        .order_by(WeeklyConversion.week_start, WeeklyConversion.from_currency, WeeklyConversion.to_currency)
+    )
+    conversions_by_week: Dict[date, Dict[str, Any]] = {}
+    for conversion in await session.execute(conversions_query):
+        key = f"{conversion.from_currency}_to_{conversion.to_currency}"
+        conversions_by_week.setdefault(conversion.week_start, {})[key] = {
+            "count": conversion.conversions,
+            "sum_amount": float(conversion.sum_amount),
+        }
+
+    report = []
+    previous: Optional[Dict[str, Any]] = None
+    for i in range(weeks):
+        week_start = start_date + timedelta(weeks=i)
+        row = rows_by_week.get(week_start)
+        users = users_by_week.get(week_start)
+        metrics = {
+            "week_start": week_start.isoformat(),
+            "week_end": (week_start + timedelta(days=6)).isoformat(),
+            "new_users": row.new_users if row else 0,
+            "deposit_users": users.deposit_users if users else 0,
+            "transaction_users": users.transaction_users if users else 0,
+            "sum_deposits": float(row.sum_deposits) if row else 0.0,
+            "sum_withdrawals": float(row.sum_withdrawals) if row else 0.0,
+            "sum_transfers": float(row.sum_transfers) if row else 0.0,
+            "total_transactions": row.total_transactions if row else 0,
+            "completed_transactions": row.completed_transactions if row else 0,
+            "conversions": conversions_by_week.get(week_start, {}),
+            "avg_deposit": float(row.avg_deposit) if row else 0.0,
+            "avg_withdrawal": float(row.avg_withdrawal) if row else 0.0,
+            "active_users": users.transaction_users if users else 0,
+            "dynamics": {},
+        }
+        metrics["dynamics"] = week_dynamics(metrics, previous)
+        report.append(metrics)
+        previous = metrics
+    return report
+
+
+async def add_weekly_usd_sums(session: AsyncSession, report: List[Dict[str, Any]]) -> None:
     """
-    Generates an Excel file with three sheets
+    Adds the not rolled back deposit and withdrawal sums in USD, at the rates of the transactions' times,
+    to every week of the report.
     """
-    wb = Workbook()
-
-    # Sheet 1: Weekly Report
-    ws_main = wb.active
-    ws_main.title = "Weekly Report"
-    main_headers = [
-        "week_start",
-        "week_end",
-        "new_users",
-        "deposit_users",
-        "transaction_users",
-        "sum_deposits",
-        "sum_withdrawals",
-        "sum_transfers",
-        "total_transactions",
-        "completed_transactions",
-        "avg_deposit",
-        "avg_withdrawal",
-        "active_users",
-    ]
-    ws_main.append(main_headers)
+    if not report:
+        return
+    start_date = date.fromisoformat(report[0]["week_start"])
+    end_date = date.fromisoformat(report[-1]["week_end"])
+    not_rollbacked = Transaction.status != TransactionStatusEnum.ROLLBACKED.value
+    for key, txn_type in (
+        ("sum_deposits_usd", TransactionTypeEnum.DEPOSIT),
+        ("sum_withdrawals_usd", TransactionTypeEnum.WITHDRAWAL),
+    ):
+        totals = await usd_totals(
+            session, start_date, end_date, Transaction.type == txn_type.value, not_rollbacked, granularity="week"
+        )
+        for week in report:
+            week[key] = totals.get(date.fromisoformat(week["week_start"]), 0.0)
+
+
+async def collect_all_weeks_report() -> List[Dict[str, Any]]:
+    """
+    Collects a report for the last 52 weeks, starting with the current (or previous) week.
+    """
+    async with async_session_maker() as session:
+        report = await collect_weeks_from_rollup(session, get_report_window(52), 52)
+        await add_weekly_usd_sums(session, report)
+        return report
+
+
+MAIN_HEADERS = [
+    "week_start",
+    "week_end",
+    "new_users",
+    "deposit_users",
+    "transaction_users",
+    "sum_deposits",
+    "sum_withdrawals",
+    "sum_transfers",
+    "sum_deposits_usd",
+    "sum_withdrawals_usd",
+    "total_transactions",
+    "completed_transactions",
+    "avg_deposit",
+    "avg_withdrawal",
+    "active_users",
+]
+
+
+def _weekly_report_rows(report_data: List[Dict[str, Any]]) -> Iterator[List[Any]]:
+    yield MAIN_HEADERS
     for week in report_data:
-        row = [week.get(key) for key in main_headers]
-        ws_main.append(row)
-    _auto_adjust_column_width(ws_main)
-
-    # Sheet 2: Conversions
-    ws_conv = wb.create_sheet(title="Conversions")
-    conv_headers = ["week_start", "week_end", "direction", "count", "sum_amount"]
-    ws_conv.append(conv_headers)
+        yield [week.get(key) for key in MAIN_HEADERS]
+
+
+def _conversion_rows(report_data: List[Dict[str, Any]]) -> Iterator[List[Any]]:
+    yield ["week_start", "week_end", "direction", "count", "sum_amount"]
     for week in report_data:
         week_start = week.get("week_start")
         week_end = week.get("week_end")
@@ -321,43 +667,65 @@ def generate_excel_file(report_data: List[Dict[str, Any]]) -> bytes:
         if conversions:
             for direction, data in conversions.items():
                 direction_str = direction.lower().replace("_", "-")
-                row = [
-                    week_start,
-                    week_end,
-                    direction_str,
-                    data.get("count", 0),
-                    data.get("sum_amount", 0),
-                ]
-                ws_conv.append(row)
+                yield [week_start, week_end, direction_str, data.get("count", 0), data.get("sum_amount", 0)]
         else:
-            ws_conv.append([week_start, week_end, "No conversions", "", ""])
-    _auto_adjust_column_width(ws_conv)
+            yield [week_start, week_end, "No conversions", "", ""]
 
-    # Sheet 3: Dynamics
-    ws_dyn = wb.create_sheet(title="Dynamics")
-    dyn_headers = ["week_start", "week_end", "metric", "delta", "pct_change"]
-    ws_dyn.append(dyn_headers)
+
+def _dynamics_rows(report_data: List[Dict[str, Any]]) -> Iterator[List[Any]]:
+    yield ["week_start", "week_end", "metric", "delta", "pct_change"]
     for week in report_data:
         week_start = week.get("week_start")
         week_end = week.get("week_end")
         dynamics = week.get("dynamics") or {}
         if dynamics:
             for metric, d in dynamics.items():
-                row = [
-                    week_start,
-                    week_end,
-                    metric,
-                    d.get("delta"),
-                    d.get("pct_change"),
-                ]
-                ws_dyn.append(row)
+                yield [week_start, week_end, metric, d.get("delta"), d.get("pct_change")]
         else:
-            ws_dyn.append([week_start, week_end, "No dynamics", "", ""])
-    _auto_adjust_column_width(ws_dyn)
+            yield [week_start, week_end, "No dynamics", "", ""]
+
+
+EXCEL_SHEETS = (
+    ("Weekly Report", _weekly_report_rows),
+    ("Conversions", _conversion_rows),
+    ("Dynamics", _dynamics_rows),
+)
+
+
+def write_excel_report(report_data: List[Dict[str, Any]], output: Union[str, Path, BinaryIO]) -> None:
+    """
+    Writes the Excel report (three sheets) to a file path or a binary file object.
+    Uses openpyxl's write-only mode, so no cell objects are kept in memory.
+    """
+    wb = Workbook(write_only=True)
+    for title, rows in EXCEL_SHEETS:
+        ws = wb.create_sheet(title=title)
+        # Column widths go before the sheet data in the file, so they are measured on the row values first
+        for index, width in enumerate(_column_widths(rows(report_data)), start=1):
+            ws.column_dimensions[get_column_letter(index)].width = width
+        for row in rows(report_data):
+            ws.append(row)
+    wb.save(output)
+
+
+def iter_excel_report(report_data: List[Dict[str, Any]], chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """
+    Yields the Excel report in chunks of chunk_size bytes.
+    The file is built in a temporary file on disk instead of memory.
+    """
+    with tempfile.TemporaryFile() as buffer:
+        write_excel_report(report_data, buffer)
+        buffer.seek(0)
+        while chunk := buffer.read(chunk_size):
+            yield chunk
+
 
+def generate_excel_file(report_data: List[Dict[str, Any]]) -> bytes:
+    """
+    Generates an Excel file with three sheets
+    """
     buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
+    write_excel_report(report_data, buffer)
     return buffer.getvalue()
 
 
@@ -368,10 +736,16 @@ def convert_report_to_json(report_data: List[Dict[str, Any]]) -> str:
     return json.dumps(report_data, ensure_ascii=False)
 
 
-def _auto_adjust_column_width(ws):
+def _column_widths(rows: Iterable[List[Any]]) -> List[int]:
     """
-    Automatically adjusts the column width to fit the maximum content length.
+    Returns the column widths that fit the maximum content length of the rows.
     """
-    for col in ws.columns:
-        max_length = max(len(str(cell.value)) if cell.value is not None else 0 for cell in col)
-        ws.column_dimensions[col[0].column_letter].width = max_length + 2
+    widths: List[int] = []
+    for row in rows:
+        for index, value in enumerate(row):
+            length = len(str(value)) if value is not None else 0
+            if index == len(widths):
+                widths.append(length)
+            elif length > widths[index]:
+                widths[index] = length
+    return [width + 2 for width in widths]
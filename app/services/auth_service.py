@@ -3,7 +3,6 @@ from typing import Any, Dict, Optional
 
 import jwt
 from jwt import ExpiredSignatureError, InvalidTokenError
-from passlib.context import CryptContext
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -11,14 +10,15 @@ from app.config import JWT_ALGORITHM, JWT_EXPIRATION_MINUTES, JWT_SECRET
 from app.exceptions.exceptions import (InvalidTokenException,
                                        TokenExpiredException)
 from app.models.db_models import User
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.services.password_service import verify_password
 
 
 async def authenticate_user(session: AsyncSession, email: str, password: str) -> Optional[User]:
     user_query = await session.execute(select(User).where(User.email == email))
     user = user_query.scalar()
-    if not user or not pwd_context.verify(password, user.password):
+    # Return the connection to the pool before the slow hash check, so waiting logins do not hold connections
+    await session.commit()
+    if not user or not await verify_password(password, user.password):
         return None
     return user
 
@@ -0,0 +1,212 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from sqlalchemy import (DateTime, Integer, Numeric, String, and_, case, column,
+                        delete, func, literal, select, union_all, update)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import BALANCE_SNAPSHOT_LAG_SECONDS
+from app.db.filters import unnest_rows
+from app.exceptions.exceptions import UserNotExistsException
+from app.models.db_models import (BalanceSnapshot, BalanceStripe, Transaction,
+                                  User, UserBalance)
+from app.schemas.enums import (CurrencyEnum, TransactionStatusEnum,
+                               TransactionTypeEnum)
+from app.schemas.user_schemas import ResponseUserBalanceModel
+
+
+def _ledger_legs(start: Optional[datetime], end: Optional[datetime], user_id: Optional[int] = None):
+    """
+    Returns a subquery (user_id, currency, delta) with the balance changes made by PROCESSED
+    transactions created in [start, end). Rolled back transactions are treated as never applied,
+    which is what the current balances reflect.
+    """
+
+    def in_window(*conditions):
+        window = [Transaction.status == TransactionStatusEnum.PROCESSED.value, *conditions]
+        if start is not None:
+            window.append(Transaction.created >= start)
+        if end is not None:
+            window.append(Transaction.created < end)
+        return window
+
+    def for_user(user_column):
+        return [user_column == user_id] if user_id is not None else []
+
+    is_deposit = Transaction.type == TransactionTypeEnum.DEPOSIT.value
+    sender_leg = select(
+        Transaction.sender_id.label("user_id"),
+        func.coalesce(Transaction.from_currency, Transaction.currency).label("currency"),
+        case((is_deposit, Transaction.amount), else_=-Transaction.amount).label("delta"),
+    ).where(*in_window(*for_user(Transaction.sender_id)))
+    recipient_leg = select(Transaction.recipient_id, Transaction.currency, Transaction.amount).where(
+        *in_window(Transaction.type == TransactionTypeEnum.TRANSFER.value, *for_user(Transaction.recipient_id))
+    )
+    exchange_leg = select(Transaction.sender_id, Transaction.to_currency, Transaction.converted_amount).where(
+        *in_window(
+            Transaction.type == TransactionTypeEnum.EXCHANGE.value,
+            Transaction.converted_amount.is_not(None),
+            *for_user(Transaction.sender_id),
+        )
+    )
+    return union_all(sender_leg, recipient_leg, exchange_leg).subquery("ledger_legs")
+
+
+def _balances_before(as_of: datetime, user_id: Optional[int] = None) -> List:
+    """
+    Returns the selects of (user_id, currency, delta) rows summing to the balances at `as_of`: the current
+    balances, stripes included, minus the transactions created since. Used where no earlier snapshot exists,
+    so balances that were never written through transactions are counted too.
+    """
+    balances = select(UserBalance.user_id, UserBalance.currency, UserBalance.amount.label("delta"))
+    stripes = select(BalanceStripe.user_id, BalanceStripe.currency, BalanceStripe.amount)
+    if user_id is not None:
+        balances = balances.where(UserBalance.user_id == user_id)
+        stripes = stripes.where(BalanceStripe.user_id == user_id)
+    later = _ledger_legs(as_of, None, user_id)
+    return [balances, stripes, select(later.c.user_id, later.c.currency, -later.c.delta)]
+
+
+async def _latest_snapshot_at(session: AsyncSession, moment: datetime) -> Optional[datetime]:
+    result = await session.execute(select(func.max(BalanceSnapshot.as_of)).where(BalanceSnapshot.as_of <= moment))
+    return result.scalar()
+
+
+async def take_balance_snapshot(session: AsyncSession, as_of: datetime) -> int:
+    """
+    Writes the balances of every (user_id, currency) at `as_of` in one INSERT ... SELECT,
+    rolling the previous snapshot forward by the transactions since; the first snapshot is taken back from
+    the current balances. Returns the number of rows.
+    `as_of` must be BALANCE_SNAPSHOT_LAG_SECONDS old, so transactions created before it have committed.
+    """
+    if as_of > datetime.now(timezone.utc) - timedelta(seconds=BALANCE_SNAPSHOT_LAG_SECONDS):
+        raise ValueError(f"Balance snapshot at {as_of} is less than {BALANCE_SNAPSHOT_LAG_SECONDS}s old")
+    previous_at = await _latest_snapshot_at(session, as_of)
+    if previous_at == as_of:
+        return 0
+
+    if previous_at is None:
+        parts = _balances_before(as_of)
+    else:
+        legs = _ledger_legs(previous_at, as_of)
+        parts = [
+            select(legs.c.user_id, legs.c.currency, legs.c.delta),
+            select(BalanceSnapshot.user_id, BalanceSnapshot.currency, BalanceSnapshot.amount).where(
+                BalanceSnapshot.as_of == previous_at
+            ),
+        ]
+    rows = union_all(*parts).subquery("balance_rows")
+    stmt = insert(BalanceSnapshot).from_select(
+        ["as_of", "user_id", "currency", "amount"],
+        select(literal(as_of, DateTime(timezone=True)), rows.c.user_id, rows.c.currency, func.sum(rows.c.delta))
+        .group_by(rows.c.user_id, rows.c.currency),
+    )
+    result = await session.execute(stmt.on_conflict_do_nothing())
+    await session.commit()
+    return result.rowcount
+
+
+async def get_balances_as_of(session: AsyncSession, user_id: int, as_of: datetime) -> List[ResponseUserBalanceModel]:
+    """
+    Returns the user's balances at `as_of` (UTC if naive): the nearest earlier snapshot plus the transactions after it,
+    or the current balances minus the transactions since if there is no earlier snapshot.
+    """
+    if await session.get(User, user_id) is None:
+        raise UserNotExistsException(user_id=user_id)
+    if as_of.tzinfo is None:
+        as_of = as_of.replace(tzinfo=timezone.utc)
+    snapshot_at = await _latest_snapshot_at(session, as_of)
+    if snapshot_at is None:
+        parts = _balances_before(as_of, user_id)
+    else:
+        legs = _ledger_legs(snapshot_at, as_of, user_id)
+        parts = [
+            select(legs.c.user_id, legs.c.currency, legs.c.delta).where(legs.c.user_id == user_id),
+            select(BalanceSnapshot.user_id, BalanceSnapshot.currency, BalanceSnapshot.amount).where(
+                BalanceSnapshot.as_of == snapshot_at, BalanceSnapshot.user_id == user_id
+            ),
+        ]
+    rows = union_all(*parts).subquery("balance_rows")
+    result = await session.execute(select(rows.c.currency, func.sum(rows.c.delta)).group_by(rows.c.currency))
+    amounts: Dict[str, Decimal] = dict(result.tuples().all())
+    return [ResponseUserBalanceModel(currency=currency, amount=amounts.get(currency, 0)) for currency in CurrencyEnum]
+
+
+def _transaction_legs(transaction: Transaction) -> List[tuple]:
+    if transaction.type == TransactionTypeEnum.DEPOSIT:
+        return [(transaction.sender_id, transaction.currency, transaction.amount)]
+    if transaction.type == TransactionTypeEnum.WITHDRAWAL:
+        return [(transaction.sender_id, transaction.currency, -transaction.amount)]
+    if transaction.type == TransactionTypeEnum.TRANSFER:
+        return [
+            (transaction.sender_id, transaction.currency, -transaction.amount),
+            (transaction.recipient_id, transaction.currency, transaction.amount),
+        ]
+    legs = [(transaction.sender_id, transaction.from_currency, -transaction.amount)]
+    if transaction.converted_amount is not None:
+        legs.append((transaction.sender_id, transaction.to_currency, transaction.converted_amount))
+    return legs
+
+
+async def revert_transactions_from_snapshots(session: AsyncSession, transactions: List[Transaction]) -> None:
+    """
+    Takes transactions that are being rolled back out of the snapshots taken after they were created,
+    in one UPDATE. Must run in the same DB transaction as the status update.
+    """
+    legs = [
+        (user_id, CurrencyEnum(currency).value, transaction.created, -Decimal(delta))
+        for transaction in transactions
+        for user_id, currency, delta in _transaction_legs(transaction)
+    ]
+    if not legs:
+        return
+    # Bound as one array per column: a VALUES row per leg would take 4 bind parameters each
+    reverted = unnest_rows(
+        "reverted_legs",
+        [
+            column("user_id", Integer),
+            column("currency", String),
+            column("created", DateTime(timezone=True)),
+            column("delta", Numeric()),
+        ],
+        legs,
+    )
+    # The legs are summed per snapshot row first, so each row is updated once from a hash join
+    deltas = (
+        select(
+            BalanceSnapshot.as_of,
+            BalanceSnapshot.user_id,
+            BalanceSnapshot.currency,
+            func.sum(reverted.c.delta).label("delta"),
+        )
+        .join(
+            reverted,
+            and_(
+                reverted.c.user_id == BalanceSnapshot.user_id,
+                reverted.c.currency == BalanceSnapshot.currency,
+                reverted.c.created < BalanceSnapshot.as_of,
+            ),
+        )
+        .where(BalanceSnapshot.as_of > min(created for _, _, created, _ in legs))
+        .group_by(BalanceSnapshot.as_of, BalanceSnapshot.user_id, BalanceSnapshot.currency)
+        .subquery("snapshot_deltas")
+    )
+    await session.execute(
+        update(BalanceSnapshot)
+        .where(
+            BalanceSnapshot.as_of == deltas.c.as_of,
+            BalanceSnapshot.user_id == deltas.c.user_id,
+            BalanceSnapshot.currency == deltas.c.currency,
+        )
+        .values(amount=BalanceSnapshot.amount + deltas.c.delta)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def clear_balance_snapshots(session: AsyncSession) -> None:
+    """
+    Drops every snapshot, e.g. after history was rewritten; the next snapshot is rebuilt from the ledger.
+    """
+    await session.execute(delete(BalanceSnapshot))
@@ -0,0 +1,166 @@
+import random
+import time
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import (Integer, Numeric, String, column, delete, func, select,
+                        tuple_, update)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import BALANCE_MAX_STRIPES, BALANCE_STRIPES_CACHE_SECONDS
+from app.db.filters import unnest_rows
+from app.exceptions.exceptions import (BadRequestDataException,
+                                       UserNotExistsException)
+from app.models.db_models import BalanceStripe, User, UserBalance
+from app.schemas.enums import CurrencyEnum
+
+BalanceKey = Tuple[int, CurrencyEnum]
+
+# Stripe counts of the striped balances, as last loaded by this process
+_stripe_counts: Dict[BalanceKey, int] = {}
+_stripe_counts_loaded_at: Optional[float] = None
+
+
+async def get_stripe_counts(session: AsyncSession) -> Dict[BalanceKey, int]:
+    """
+    Returns the number of stripes of every striped balance, reloaded at most every BALANCE_STRIPES_CACHE_SECONDS.
+    A stale answer is safe: a credit to the user_balance row is always correct, only less spread out.
+    """
+    global _stripe_counts, _stripe_counts_loaded_at
+    now = time.monotonic()
+    if _stripe_counts_loaded_at is None or now - _stripe_counts_loaded_at > BALANCE_STRIPES_CACHE_SECONDS:
+        result = await session.execute(
+            select(BalanceStripe.user_id, BalanceStripe.currency, func.count()).group_by(
+                BalanceStripe.user_id, BalanceStripe.currency
+            )
+        )
+        _stripe_counts = {(user_id, currency): count for user_id, currency, count in result.tuples()}
+        _stripe_counts_loaded_at = now
+    return _stripe_counts
+
+
+def invalidate_stripe_counts() -> None:
+    global _stripe_counts_loaded_at
+    _stripe_counts_loaded_at = None
+
+
+async def credit_stripe(session: AsyncSession, user_id: int, currency: CurrencyEnum, amount: Decimal) -> bool:
+    """
+    Adds amount to a random stripe of a striped balance, so concurrent credits mostly touch different rows.
+    Returns False if the balance is not striped and the caller has to credit the user_balance row.
+    """
+    stripes = (await get_stripe_counts(session)).get((user_id, currency))
+    if not stripes:
+        return False
+    result = await session.execute(
+        update(BalanceStripe)
+        .where(
+            BalanceStripe.user_id == user_id,
+            BalanceStripe.currency == currency,
+            BalanceStripe.stripe == random.randrange(stripes),
+        )
+        .values(amount=BalanceStripe.amount + amount)
+        .returning(BalanceStripe.stripe)
+    )
+    # None: the stripe was removed since the counts were loaded
+    return result.scalar() is not None
+
+
+async def sweep_stripes(session: AsyncSession, keys: Iterable[BalanceKey]) -> Dict[BalanceKey, Decimal]:
+    """
+    Moves the stripe amounts of the given balances into their user_balance rows, so the rows alone
+    can be checked and debited. Returns the moved amounts by key (balances without stripes are left out).
+    Stripes are locked in primary key order; callers lock the user_balance rows first.
+    """
+    keys = {(user_id, CurrencyEnum(currency).value) for user_id, currency in keys}
+    if not keys:
+        return {}
+    # Keys, like the amounts below, are bound as one array per column, however many balances are swept
+    stripe_keys = unnest_rows("stripe_keys", [column("user_id", Integer), column("currency", String)], keys)
+    result = await session.execute(
+        select(BalanceStripe.user_id, BalanceStripe.currency, BalanceStripe.amount)
+        .where(tuple_(BalanceStripe.user_id, BalanceStripe.currency).in_(select(stripe_keys)))
+        .order_by(BalanceStripe.user_id, BalanceStripe.currency, BalanceStripe.stripe)
+        .with_for_update()
+    )
+    swept: Dict[BalanceKey, Decimal] = defaultdict(Decimal)
+    for user_id, currency, amount in result.tuples():
+        if amount:
+            swept[(user_id, currency)] += amount
+    if not swept:
+        return {}
+
+    swept_amounts = unnest_rows(
+        "swept_amounts",
+        [column("user_id", Integer), column("currency", String), column("amount", Numeric())],
+        [(user_id, currency.value, amount) for (user_id, currency), amount in swept.items()],
+    )
+    await session.execute(
+        update(BalanceStripe)
+        .where(
+            tuple_(BalanceStripe.user_id, BalanceStripe.currency).in_(
+                select(swept_amounts.c.user_id, swept_amounts.c.currency)
+            )
+        )
+        .values(amount=0)
+        .execution_options(synchronize_session=False)
+    )
+    await session.execute(
+        update(UserBalance)
+        .where(UserBalance.user_id == swept_amounts.c.user_id, UserBalance.currency == swept_amounts.c.currency)
+        .values(amount=UserBalance.amount + swept_amounts.c.amount)
+        .execution_options(synchronize_session=False)
+    )
+    return dict(swept)
+
+
+async def get_stripe_totals(session: AsyncSession, user_id: Optional[int] = None) -> Dict[BalanceKey, Decimal]:
+    """
+    Returns the amounts held in stripes by (user_id, currency), to be added to the user_balance amounts.
+    """
+    query = select(BalanceStripe.user_id, BalanceStripe.currency, func.sum(BalanceStripe.amount)).group_by(
+        BalanceStripe.user_id, BalanceStripe.currency
+    )
+    if user_id is not None:
+        query = query.where(BalanceStripe.user_id == user_id)
+    result = await session.execute(query)
+    return {(user_id, currency): amount for user_id, currency, amount in result.tuples()}
+
+
+async def set_balance_stripes(session: AsyncSession, user_id: int, stripes: int) -> None:
+    """
+    Splits every balance of the user into `stripes` stripe rows (0 turns striping off).
+    The money in the stripes is moved into the user_balance rows first, so no balance changes.
+    """
+    if stripes < 0 or stripes > BALANCE_MAX_STRIPES:
+        raise BadRequestDataException(detail=f"Stripes must be between 0 and {BALANCE_MAX_STRIPES}")
+    if await session.get(User, user_id) is None:
+        raise UserNotExistsException(user_id=user_id)
+
+    result = await session.execute(
+        select(UserBalance.currency)
+        .where(UserBalance.user_id == user_id)
+        .order_by(UserBalance.currency)
+        .with_for_update()
+    )
+    currencies = result.scalars().all()
+    await sweep_stripes(session, [(user_id, currency) for currency in currencies])
+    await session.execute(
+        delete(BalanceStripe).where(BalanceStripe.user_id == user_id, BalanceStripe.stripe >= stripes)
+    )
+    if stripes:
+        await session.execute(
+            insert(BalanceStripe)
+            .values(
+                [
+                    {"user_id": user_id, "currency": currency, "stripe": stripe, "amount": 0}
+                    for currency in currencies
+                    for stripe in range(stripes)
+                ]
+            )
+            .on_conflict_do_nothing()
+        )
+    await session.commit()
+    invalidate_stripe_counts()
@@ -0,0 +1,126 @@
+import json
+from datetime import date, datetime
+from typing import Any, Dict, List
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import BUCKET_CACHE_SECONDS
+from app.db.cache import get_cache_client
+from app.db.filters import utc_day
+from app.exceptions.exceptions import BadRequestDataException
+from app.schemas.enums import GranularityEnum
+from app.services.analysis_service import (bucket_start_of,
+                                           collect_buckets_metrics,
+                                           next_bucket_start, week_dynamics)
+
+BUCKET_KEY_PREFIX = "analytics"
+# Bumped by invalidate_all_buckets
+BUCKET_GENERATION_KEY = f"{BUCKET_KEY_PREFIX}:generation"
+MAX_BUCKETS = 1000
+
+
+def bucket_generation_key(granularity: GranularityEnum, bucket_start: date) -> str:
+    """
+    Key of the counter bumped whenever the bucket is invalidated.
+    """
+    return f"{BUCKET_GENERATION_KEY}:{granularity.value}:{bucket_start.isoformat()}"
+
+
+def bucket_key(granularity: GranularityEnum, bucket_start: date, generation: str) -> str:
+    return f"{BUCKET_KEY_PREFIX}:{granularity.value}:{bucket_start.isoformat()}:{generation}"
+
+
+def _decode(generation: bytes | None) -> str:
+    return generation.decode() if generation is not None else "0"
+
+
+def _contiguous_runs(bucket_starts: List[date], granularity: GranularityEnum) -> List[List[date]]:
+    """
+    Splits sorted bucket starts into runs of consecutive buckets.
+    """
+    runs: List[List[date]] = []
+    for bucket_start in bucket_starts:
+        if runs and next_bucket_start(runs[-1][-1], granularity) == bucket_start:
+            runs[-1].append(bucket_start)
+        else:
+            runs.append([bucket_start])
+    return runs
+
+
+async def get_range_metrics(
+    session: AsyncSession, start_date: date, end_date: date, granularity: GranularityEnum
+) -> List[Dict[str, Any]]:
+    """
+    Returns the metrics of every day/week/month bucket touching start_date..end_date, with dynamics.
+    Closed buckets are cached in Redis for BUCKET_CACHE_SECONDS; only buckets missing from the cache are computed,
+    one grouped query per run of consecutive missing buckets.
+    A bucket is cached under the generations read before computing it, so a value computed before an
+    invalidation is written under a key that is no longer read.
+    """
+    bucket_starts = []
+    bucket_start = bucket_start_of(start_date, granularity)
+    while bucket_start <= end_date:
+        bucket_starts.append(bucket_start)
+        bucket_start = next_bucket_start(bucket_start, granularity)
+    if len(bucket_starts) > MAX_BUCKETS:
+        raise BadRequestDataException(detail=f"Too many buckets requested (max {MAX_BUCKETS})")
+
+    client = get_cache_client()
+    generations = await client.mget(
+        [BUCKET_GENERATION_KEY, *[bucket_generation_key(granularity, b) for b in bucket_starts]]
+    )
+    keys = {
+        b: bucket_key(granularity, b, f"{_decode(generations[0])}.{_decode(generation)}")
+        for b, generation in zip(bucket_starts, generations[1:])
+    }
+    cached = await client.mget(list(keys.values()))
+    metrics_by_bucket = {b: json.loads(data) for b, data in zip(bucket_starts, cached) if data is not None}
+
+    today = datetime.utcnow().date()
+    to_cache = {}
+    for run in _contiguous_runs([b for b in bucket_starts if b not in metrics_by_bucket], granularity):
+        computed = await collect_buckets_metrics(session, granularity, run)
+        metrics_by_bucket.update(computed)
+        # The bucket containing today is still changing, so it is never cached
+        to_cache.update(
+            {
+                keys[b]: json.dumps(metrics, ensure_ascii=False)
+                for b, metrics in computed.items()
+                if next_bucket_start(b, granularity) <= today
+            }
+        )
+    if to_cache:
+        async with client.pipeline(transaction=False) as pipe:
+            for key, data in to_cache.items():
+                pipe.set(key, data, ex=BUCKET_CACHE_SECONDS)
+            await pipe.execute()
+
+    result = []
+    previous = None
+    for bucket_start in bucket_starts:
+        metrics = metrics_by_bucket[bucket_start]
+        metrics["dynamics"] = week_dynamics(metrics, previous)
+        result.append(metrics)
+        previous = metrics
+    return result
+
+
+async def invalidate_buckets_for(*created: datetime) -> None:
+    """
+    Invalidates the cached day, week and month buckets transactions created at `created` belong to
+    by bumping their generations. Call it after the change is committed.
+    """
+    days = {utc_day(m) for m in created}
+    keys = {bucket_generation_key(g, bucket_start_of(day, g)) for day in days for g in GranularityEnum}
+    if keys:
+        async with get_cache_client().pipeline(transaction=False) as pipe:
+            for key in sorted(keys):
+                pipe.incr(key)
+            await pipe.execute()
+
+
+async def invalidate_all_buckets() -> None:
+    """
+    Invalidates every cached bucket; the old entries expire on their own.
+    """
+    await get_cache_client().incr(BUCKET_GENERATION_KEY)
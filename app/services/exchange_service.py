@@ -1,17 +1,32 @@
+import asyncio
 import json
+import logging
+import operator
+import time
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 
 import redis.asyncio as aioredis
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.config import REDIS_URL
+from app.config import RATES_LOCAL_TTL_SECONDS, REDIS_URL
 from app.exceptions.exceptions import (BadRequestDataException,
-                                       CurrencyRateFetchException,
-                                       NegativeBalanceException)
-from app.models.db_models import Transaction, UserBalance
+                                       CurrencyRateFetchException)
+from app.models.db_models import Transaction
 from app.schemas.enums import (CurrencyEnum, TransactionStatusEnum,
                                TransactionTypeEnum)
+from app.schemas.exchange_schemas import (QuoteModel, RequestQuotesModel,
+                                          ResponsePortfolioModel,
+                                          ResponseQuotesModel)
+from app.services.rate_history_service import save_rates
+from app.services.rollup_service import apply_transaction_to_rollup
+from app.services.transaction_service import apply_balance_legs
+from app.tasks.update_rates import (RATES_SNAPSHOT_KEY, RATES_TTL_SECONDS,
+                                    encode_snapshot, fetch_usd_values,
+                                    queue_snapshot)
+
+logger = logging.getLogger(__name__)
 
 _redis_client = None
 
@@ -24,31 +39,177 @@ def get_redis_client():
     return _redis_client
 
 
-async def get_cached_rates_for_base(base: str) -> dict:
-    client = get_redis_client()
-    cache_key = f"rates:{base}"
-    data = await client.get(cache_key)
-    if data:
-        try:
-            return json.loads(data)
-        except Exception as e:
-            raise CurrencyRateFetchException(detail=f"Error decoding cache for {base}: {e}")
-
-    # Fallback: trigger update if cache is empty or invalid
-    from app.tasks.update_rates import update_rates
-
-    update_result = update_rates()
-    if update_result != "Success":
+class RateSnapshot:
+    """
+    USD values of the currencies from one rates refresh; every pair rate is derived from them.
+    """
+
+    def __init__(self, version: int, updated: datetime, usd_values: Dict[str, Decimal]) -> None:
+        self.version = version
+        self.updated = updated
+        self.usd_values = usd_values
+        self._rates_by_base: Dict[str, Dict[str, float]] = {}
+        self._rate_matrix: Optional[Dict[str, Dict[str, Decimal]]] = None
+
+    @classmethod
+    def decode(cls, fields: Dict[str, str]) -> "RateSnapshot":
+        values = json.loads(fields["usd"], parse_float=Decimal, parse_int=Decimal)
+        return cls(
+            version=int(fields["version"]),
+            updated=datetime.fromtimestamp(float(fields["updated"]), timezone.utc),
+            usd_values={currency: value for currency, value in zip(fields["currencies"].split(","), values) if value},
+        )
+
+    def rate(self, base: str, target: str) -> Optional[Decimal]:
+        if base not in self.usd_values or target not in self.usd_values:
+            return None
+        return self.usd_values[base] / self.usd_values[target]
+
+    def rates_for(self, base: str) -> Dict[str, float]:
+        if base not in self.usd_values:
+            return {}
+        if base not in self._rates_by_base:
+            self._rates_by_base[base] = {
+                target: float(self.rate(base, target)) for target in self.usd_values if target != base
+            }
+        return self._rates_by_base[base]
+
+    def rate_matrix(self) -> Dict[str, Dict[str, Decimal]]:
+        """
+        Returns the Decimal rate of every (base, target) pair, 1 for base == target; built once per snapshot.
+        """
+        if self._rate_matrix is None:
+            self._rate_matrix = {
+                base: {target: self.rate(base, target) for target in self.usd_values} for base in self.usd_values
+            }
+        return self._rate_matrix
+
+
+# Decoded snapshot kept in-process; after RATES_LOCAL_TTL_SECONDS Redis is asked whether the version changed
+_snapshot: Optional[RateSnapshot] = None
+_snapshot_checked_at = 0.0
+_in_flight: Dict[str, asyncio.Task] = {}
+
+
+def _keep_snapshot(snapshot: RateSnapshot) -> RateSnapshot:
+    global _snapshot, _snapshot_checked_at
+    if _snapshot is None or snapshot.version != _snapshot.version:
+        _snapshot = snapshot
+    _snapshot_checked_at = time.monotonic()
+    return _snapshot
+
+
+async def _refresh_rates() -> RateSnapshot:
+    """
+    Fetches the rates and stores them as a new snapshot in Redis and in the rate history, like the update_rates task.
+    """
+    value_in_usd = await fetch_usd_values()
+    updated = time.time()
+    fields = encode_snapshot(value_in_usd, updated)
+    async with get_redis_client().pipeline() as pipe:
+        version = (await queue_snapshot(pipe, fields).execute())[0]
+    await save_rates(datetime.fromtimestamp(updated, timezone.utc), version, value_in_usd)
+    return _keep_snapshot(RateSnapshot.decode({**fields, "version": version}))
+
+
+async def _single_flight(key: str, load: Callable[[], Awaitable]):
+    """
+    Runs load() once for all concurrent callers with the same key; they all get its result or error.
+    """
+    loop = asyncio.get_running_loop()
+    task = _in_flight.get(key)
+    if task is None or task.done() or task.get_loop() is not loop:
+        task = _in_flight[key] = loop.create_task(load())
+    # A cancelled caller must not cancel the load the others are waiting for
+    return await asyncio.shield(task)
+
+
+async def _load_snapshot() -> RateSnapshot:
+    fields = await get_redis_client().hgetall(RATES_SNAPSHOT_KEY)
+    if fields:
+        fields = {key.decode(): value.decode() for key, value in fields.items()}
+        if _snapshot is not None and fields.get("version") == str(_snapshot.version):
+            # Unchanged: keep the decoded values
+            snapshot = _snapshot
+        else:
+            try:
+                snapshot = RateSnapshot.decode(fields)
+            except Exception as e:
+                raise CurrencyRateFetchException(detail=f"Error decoding rates snapshot: {e}")
+        if datetime.now(timezone.utc) - snapshot.updated < timedelta(seconds=RATES_TTL_SECONDS):
+            return _keep_snapshot(snapshot)
+
+    # Fallback: refresh the rates if the cache is empty or expired
+    try:
+        return await _single_flight("refresh", _refresh_rates)
+    except Exception as e:
+        logger.error("Error while refreshing rates: %s", e)
         raise CurrencyRateFetchException(detail="Failed to update rates during fallback")
 
-    data = await client.get(cache_key)
-    if data:
-        try:
-            return json.loads(data)
-        except Exception as e:
-            raise CurrencyRateFetchException(detail=f"Error decoding cache after update for {base}: {e}")
 
-    raise CurrencyRateFetchException(detail="Unable to retrieve rates from cache after update")
+async def get_rate_snapshot() -> RateSnapshot:
+    """
+    Returns the current rates snapshot: in-process, then from Redis, then refreshed from CoinMarketCap.
+    Concurrent misses share one Redis read and one refresh; nothing blocks the event loop.
+    """
+    if _snapshot is not None and time.monotonic() - _snapshot_checked_at < RATES_LOCAL_TTL_SECONDS:
+        return _snapshot
+    return await _single_flight("snapshot", _load_snapshot)
+
+
+async def get_cached_rates_for_base(base: str) -> dict:
+    rates = (await get_rate_snapshot()).rates_for(base)
+    if not rates:
+        raise CurrencyRateFetchException(detail=f"Rates for {base} are not available")
+    return rates
+
+
+def convert_amounts(
+    snapshot: RateSnapshot, pairs: List[Tuple[str, str]], amounts: List[Decimal]
+) -> Tuple[List[Decimal], List[Decimal]]:
+    """
+    Converts amounts[i] along pairs[i] (from, to) with the snapshot's rate matrix.
+    Returns the rates and the converted amounts, in the order of pairs.
+    """
+    matrix = snapshot.rate_matrix()
+    missing = {currency for pair in pairs for currency in pair if currency not in matrix}
+    if missing:
+        raise BadRequestDataException(detail=f"Conversion rates for {', '.join(sorted(missing))} not available")
+    rates = [matrix[from_currency][to_currency] for from_currency, to_currency in pairs]
+    return rates, list(map(operator.mul, amounts, rates))
+
+
+async def get_quotes(request: RequestQuotesModel) -> ResponseQuotesModel:
+    """
+    Converts every item and the portfolio holdings with the rates of one snapshot, whose version is returned.
+    """
+    if not request.items and request.portfolio is None:
+        raise BadRequestDataException(detail="Items or portfolio must be provided")
+
+    pairs = [(item.from_currency.value, item.to_currency.value) for item in request.items]
+    amounts = [item.amount for item in request.items]
+    if request.portfolio is not None:
+        target = request.portfolio.target.value
+        pairs += [(currency.value, target) for currency in request.portfolio.holdings]
+        amounts += request.portfolio.holdings.values()
+
+    snapshot = await get_rate_snapshot()
+    rates, converted = convert_amounts(snapshot, pairs, amounts)
+    quotes = [
+        QuoteModel(from_currency=pair[0], to_currency=pair[1], amount=amount, rate=rate, converted_amount=value)
+        for pair, amount, rate, value in zip(pairs, amounts, rates, converted)
+    ]
+
+    portfolio = None
+    if request.portfolio is not None:
+        holdings = len(request.portfolio.holdings)
+        portfolio = ResponsePortfolioModel(
+            target=request.portfolio.target,
+            total=sum(converted[-holdings:], Decimal(0)),
+            holdings=quotes[-holdings:],
+        )
+        quotes = quotes[:-holdings]
+    return ResponseQuotesModel(version=snapshot.version, updated=snapshot.updated, quotes=quotes, portfolio=portfolio)
 
 
 async def create_exchange_transaction(
@@ -57,46 +218,42 @@ async def create_exchange_transaction(
     if amount <= 0:
         raise BadRequestDataException(detail="Amount must be positive")
 
-    # Retrieve user's balance for the source currency
-    query_from = select(UserBalance).where(UserBalance.user_id == user_id, UserBalance.currency == from_currency.value)
-    res_from = await session.execute(query_from)
-    balance_from = res_from.scalar_one_or_none()
-    if not balance_from:
-        raise BadRequestDataException(detail=f"Balance for {from_currency.value} not found")
-    if balance_from.amount < Decimal(amount):
-        raise NegativeBalanceException(balance=balance_from.amount)
-
-    # Retrieve user's balance for the target currency
-    query_to = select(UserBalance).where(UserBalance.user_id == user_id, UserBalance.currency == to_currency.value)
-    res_to = await session.execute(query_to)
-    balance_to = res_to.scalar_one_or_none()
-    if not balance_to:
-        raise BadRequestDataException(detail=f"Balance for {to_currency.value} not found")
-
-    # Get conversion rates from cache (or fallback to update)
-    rates = await get_cached_rates_for_base(from_currency.value)
-    if to_currency.value not in rates:
+    amount = Decimal(amount)
+
+    # Get the conversion rate from the current snapshot (or fallback to update) before any row is locked
+    snapshot = await get_rate_snapshot()
+    conversion_rate = snapshot.rate(from_currency.value, to_currency.value)
+    if conversion_rate is None:
         raise BadRequestDataException(detail=f"Conversion rate for {to_currency.value} not available")
 
-    conversion_rate = Decimal(rates[to_currency.value])
-    converted_amount = Decimal(amount) * conversion_rate
-
-    # Update balances
-    balance_from.amount -= Decimal(amount)
-    balance_to.amount += converted_amount
-
-    # Record the transaction in the database
-    new_transaction = Transaction(
-        sender_id=user_id,
-        recipient_id=user_id,
-        currency=from_currency.value,
-        amount=Decimal(amount),
-        type=TransactionTypeEnum.EXCHANGE.value,
-        from_currency=from_currency.value,
-        to_currency=to_currency.value,
-        status=TransactionStatusEnum.PROCESSED.value,
-    )
-    session.add(new_transaction)
+    converted_amount = amount * conversion_rate
+
+    try:
+        # The source balance is only debited if it covers the amount, atomically with the check
+        await apply_balance_legs(
+            session, [((user_id, from_currency), -amount), ((user_id, to_currency), converted_amount)]
+        )
+
+        # Record the transaction in the database
+        new_transaction = Transaction(
+            sender_id=user_id,
+            recipient_id=user_id,
+            currency=from_currency.value,
+            amount=amount,
+            type=TransactionTypeEnum.EXCHANGE.value,
+            from_currency=from_currency.value,
+            to_currency=to_currency.value,
+            converted_amount=converted_amount,
+            rate_version=snapshot.version,
+            status=TransactionStatusEnum.PROCESSED.value,
+        )
+        session.add(new_transaction)
+        await session.flush()
+        await apply_transaction_to_rollup(session, new_transaction)
+    except Exception:
+        # Releases the balance row locks right away
+        await session.rollback()
+        raise
     await session.commit()
     await session.refresh(new_transaction)
     return new_transaction
@@ -0,0 +1,69 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from passlib.context import CryptContext
+
+from app.config import PASSWORD_HASH_MAX_PENDING, PASSWORD_HASH_WORKERS
+from app.exceptions.exceptions import PasswordHashingBusyException
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# Created on first use, so processes that never hash (Celery workers, scripts) do not start one.
+# Spawned rather than forked: the parent runs an event loop and threads.
+_executor: Optional[ProcessPoolExecutor] = None
+# Hashes submitted by this process and not finished yet, queued ones included
+_pending = 0
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify(password: str, hashed: str) -> bool:
+    return pwd_context.verify(password, hashed)
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=PASSWORD_HASH_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+async def _run(func, *args):
+    """
+    Runs a bcrypt call in the process pool. Beyond PASSWORD_HASH_MAX_PENDING calls in flight it fails fast
+    with 503 instead of queueing: a bcrypt round takes tens to hundreds of milliseconds of CPU.
+    """
+    global _executor, _pending
+    if _pending >= PASSWORD_HASH_MAX_PENDING:
+        raise PasswordHashingBusyException()
+    _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_get_executor(), func, *args)
+    except BrokenProcessPool:
+        # A worker died; the next call starts a new pool
+        _executor = None
+        raise
+    finally:
+        _pending -= 1
+
+
+async def hash_password(password: str) -> str:
+    return await _run(_hash, password)
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    return await _run(_verify, password, hashed)
+
+
+def shutdown_password_pool() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
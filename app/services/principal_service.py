@@ -0,0 +1,97 @@
+import json
+import logging
+import time
+from typing import Dict, Tuple
+
+from redis.exceptions import RedisError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import PRINCIPAL_CACHE_SECONDS, PRINCIPAL_LOCAL_TTL_SECONDS
+from app.db.cache import get_cache_client
+from app.exceptions.exceptions import UserNotExistsException
+from app.models.db_models import User
+from app.schemas.auth_schemas import PrincipalModel
+
+logger = logging.getLogger(__name__)
+
+# Principals resolved by this process, with the monotonic time they expire at.
+# Invalidation reaches other processes through Redis only, so they may keep a stale entry for the local TTL.
+_principals: Dict[int, Tuple[float, PrincipalModel]] = {}
+# Bumped by every invalidation in this process; a lookup that overlapped one is not kept in-process
+_local_generation = 0
+
+
+def _principal_key(user_id: int) -> str:
+    return f"principal:{user_id}"
+
+
+def _principal_generation_key(user_id: int) -> str:
+    """
+    Key of the counter bumped whenever the user's principal is invalidated.
+    """
+    return f"principal:{user_id}:generation"
+
+
+def _decode(generation: bytes | None) -> str:
+    return generation.decode() if generation is not None else "0"
+
+
+async def get_principal(session: AsyncSession, user_id: int) -> PrincipalModel:
+    """
+    Returns the id, role and status of a user: in-process, then from Redis, then with one query.
+    Raises UserNotExistsException for an unknown user (e.g. a token of a deleted user).
+    The Redis entry carries the generation read before the query, so a row read before an invalidation
+    is written with a generation that no longer matches and is never served.
+    """
+    cached = _principals.get(user_id)
+    now = time.monotonic()
+    if cached is not None and cached[0] > now:
+        return cached[1]
+
+    local_generation = _local_generation
+    principal = None
+    generation = None
+    try:
+        raw_generation, raw = await get_cache_client().mget(
+            _principal_generation_key(user_id), _principal_key(user_id)
+        )
+        generation = _decode(raw_generation)
+        if raw is not None:
+            entry = json.loads(raw)
+            if entry["generation"] == generation:
+                principal = PrincipalModel.model_validate(entry["principal"])
+    except RedisError as e:
+        logger.warning("Principal cache unavailable: %s", e)
+
+    if principal is None:
+        result = await session.execute(select(User.id, User.role, User.status).where(User.id == user_id))
+        row = result.one_or_none()
+        if row is None:
+            raise UserNotExistsException(user_id=user_id)
+        principal = PrincipalModel(id=row.id, role=row.role, status=row.status)
+        if generation is not None:
+            entry = {"generation": generation, "principal": principal.model_dump(mode="json")}
+            try:
+                await get_cache_client().set(_principal_key(user_id), json.dumps(entry), ex=PRINCIPAL_CACHE_SECONDS)
+            except RedisError as e:
+                logger.warning("Principal cache unavailable: %s", e)
+
+    if local_generation == _local_generation:
+        _principals[user_id] = (now + PRINCIPAL_LOCAL_TTL_SECONDS, principal)
+    return principal
+
+
+async def invalidate_principal(user_id: int) -> None:
+    """
+    Drops the cached principal after the user's role or status changed.
+    """
+    global _local_generation
+    _local_generation += 1
+    _principals.pop(user_id, None)
+    try:
+        # Lookups still in flight write under the old generation
+        await get_cache_client().incr(_principal_generation_key(user_id))
+        await get_cache_client().delete(_principal_key(user_id))
+    except RedisError as e:
+        logger.warning("Principal cache unavailable: %s", e)
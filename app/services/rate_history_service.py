@@ -0,0 +1,172 @@
+import asyncio
+import logging
+from array import array
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import ARRAY, DateTime, func, literal, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.filters import created_between, date_bucket, day_start
+from app.db.sessions import async_session_maker
+from app.models.db_models import RateHistory, Transaction
+from app.schemas.enums import CurrencyEnum
+
+logger = logging.getLogger(__name__)
+
+# Used for currencies without any recorded rate, e.g. before the first refresh
+FALLBACK_RATES_TO_USD = {
+    CurrencyEnum.USD: 1,
+    CurrencyEnum.EUR: 0.9342,
+    CurrencyEnum.AUD: 0.5447,
+    CurrencyEnum.CAD: 0.6162,
+    CurrencyEnum.ARS: 0.0009,
+    CurrencyEnum.PLN: 0.2343,
+    CurrencyEnum.BTC: 100000.0,
+    CurrencyEnum.ETH: 3557.3476,
+    CurrencyEnum.DOGE: 0.3627,
+    CurrencyEnum.USDT: 0.9709,
+}
+
+
+class RateTimeline:
+    """
+    USD value of every currency over time, as sorted arrays of epoch timestamps and values per currency.
+    The value at time T is the one recorded last at or before T (the first one for earlier times).
+    """
+
+    def __init__(self) -> None:
+        self.timestamps: Dict[str, array] = defaultdict(lambda: array("d"))
+        self.values: Dict[str, array] = defaultdict(lambda: array("d"))
+        self.last_recorded_at: Optional[datetime] = None
+
+    def extend(self, rows: Iterable[Tuple[datetime, str, Decimal]]) -> None:
+        """
+        Appends (recorded_at, currency, usd_value) rows sorted by recorded_at. Rows at or before the last loaded
+        time are skipped: a refresh commits all its rows at once, so they are already loaded.
+        """
+        loaded_until = self.last_recorded_at
+        for recorded_at, currency, usd_value in rows:
+            if loaded_until is not None and recorded_at <= loaded_until:
+                continue
+            self.timestamps[currency].append(recorded_at.timestamp())
+            self.values[currency].append(float(usd_value))
+            self.last_recorded_at = recorded_at
+
+    def change_points(self, start: datetime, end: datetime) -> List[datetime]:
+        """
+        Returns the distinct times in (start, end) at which some rate changed.
+        """
+        low, high = start.timestamp(), end.timestamp()
+        points = {t for timestamps in self.timestamps.values() for t in timestamps if low < t < high}
+        return [datetime.fromtimestamp(t, timezone.utc) for t in sorted(points)]
+
+    def rate_at(self, currency: str, moment: datetime) -> float:
+        timestamps = self.timestamps.get(currency)
+        if not timestamps:
+            return float(FALLBACK_RATES_TO_USD[CurrencyEnum(currency)])
+        index = bisect_right(timestamps, moment.timestamp())
+        return self.values[currency][max(index - 1, 0)]
+
+    def to_usd(self, rows: Iterable[Tuple[str, datetime, Decimal]]) -> List[float]:
+        """
+        Converts a column of (currency, created, amount) to USD at the rate of each created time, in one pass.
+        """
+        result = []
+        series: Dict[str, Tuple[Optional[array], Optional[array], float]] = {}
+        for currency, created, amount in rows:
+            if currency not in series:
+                timestamps = self.timestamps.get(currency)
+                fallback = float(FALLBACK_RATES_TO_USD[CurrencyEnum(currency)])
+                series[currency] = (timestamps, self.values.get(currency), fallback)
+            timestamps, values, fallback = series[currency]
+            if timestamps:
+                rate = values[max(bisect_right(timestamps, created.timestamp()) - 1, 0)]
+            else:
+                rate = fallback
+            result.append(float(amount) * rate)
+        return result
+
+
+# Loaded once per process and then extended with the rows recorded since
+_history = RateTimeline()
+# Concurrent callers would load the same new rows; they wait for one load instead
+_history_lock = asyncio.Lock()
+
+
+async def get_rate_history(session: AsyncSession) -> RateTimeline:
+    """
+    Returns the in-process rate history after loading the rows recorded since the last call.
+    """
+    async with _history_lock:
+        # Read under the lock: a load that ran while waiting has moved it
+        history = _history
+        query = select(RateHistory.recorded_at, RateHistory.currency, RateHistory.usd_value).order_by(
+            RateHistory.recorded_at
+        )
+        if history.last_recorded_at is not None:
+            query = query.where(RateHistory.recorded_at > history.last_recorded_at)
+        history.extend((await session.execute(query)).tuples())
+    return history
+
+
+async def save_rates(recorded_at: datetime, version: Optional[int], value_in_usd: Dict[str, float]) -> None:
+    """
+    Persists one refresh of the rates. Errors are logged only: the refresh itself has succeeded.
+    """
+    try:
+        async with async_session_maker() as session:
+            await session.execute(
+                insert(RateHistory)
+                .values(
+                    [
+                        {"recorded_at": recorded_at, "currency": currency, "version": version, "usd_value": value}
+                        for currency, value in value_in_usd.items()
+                        if value
+                    ]
+                )
+                .on_conflict_do_nothing()
+            )
+            await session.commit()
+    except Exception as e:
+        logger.error("Error while saving rate history: %s", e)
+
+
+async def usd_totals(
+    session: AsyncSession, start_date: date, end_date: date, *conditions, granularity: Optional[str] = None
+) -> Dict[Optional[date], float]:
+    """
+    Sums Transaction.amount in USD at the rates of the transactions' times, for created in start_date..end_date.
+    The database groups the amounts by currency and rate interval (and by bucket with a granularity),
+    the groups are converted with RateTimeline.to_usd. Returns the totals by bucket start (None without buckets).
+    """
+    history = await get_rate_history(session)
+    start, end = day_start(start_date), day_start(end_date + timedelta(days=1))
+    points = history.change_points(start, end)
+
+    columns = [Transaction.currency]
+    if points:
+        # 0 before the first change point, i from the i-th one on
+        columns.append(func.width_bucket(Transaction.created, literal(points, ARRAY(DateTime(timezone=True)))))
+    if granularity is not None:
+        columns.append(date_bucket(Transaction.created, granularity))
+    query = (
+        select(func.sum(Transaction.amount), *columns)
+        .where(created_between(Transaction.created, start_date, end_date), *conditions)
+        .group_by(*columns)
+    )
+    rows = (await session.execute(query)).all()
+
+    groups, buckets = [], []
+    for row in rows:
+        interval = row[2] if points else 0
+        groups.append((row[1], points[interval - 1] if interval else start, row[0]))
+        buckets.append(row[-1] if granularity is not None else None)
+    totals: Dict[Optional[date], float] = defaultdict(float)
+    for bucket, amount in zip(buckets, history.to_usd(groups)):
+        totals[bucket] += amount
+    return totals
@@ -0,0 +1,121 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from redis import Redis
+
+from app.celery import celery_app
+from app.config import CELERY_PUBLISH_WORKERS, REDIS_URL
+from app.db.cache import get_cache_client
+from app.exceptions.exceptions import ReportEnqueueException
+
+# Synchronous client for the Celery task; the API uses the async get_cache_client()
+redis_cache = Redis.from_url(REDIS_URL, db=1)
+
+# The JSON response body is stored pre-serialised and gzip-compressed, each file with a content hash ETag
+REPORT_JSON_KEY = "weekly_report_json:gz"
+REPORT_JSON_ETAG_KEY = "weekly_report_json:etag"
+REPORT_EXCEL_KEY = "weekly_report_excel"
+REPORT_EXCEL_ETAG_KEY = "weekly_report_excel:etag"
+REPORT_GENERATED_AT_KEY = "weekly_report_generated_at"
+REPORT_TASK_KEY = "weekly_report_task"
+
+# A report older than this is still served, but a background refresh is started
+REPORT_FRESH_SECONDS = 3600
+# Upper bound for one generation job; the lock expires by itself if a worker dies
+REPORT_TASK_LOCK_SECONDS = 600
+
+_RELEASE_TASK_LOCK = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+_celery_executor = ThreadPoolExecutor(max_workers=CELERY_PUBLISH_WORKERS, thread_name_prefix="celery-publish")
+
+
+async def run_celery_call(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    Runs a blocking Celery call (broker publish, result backend read) in the bounded Celery thread pool.
+    """
+    return await asyncio.get_running_loop().run_in_executor(_celery_executor, partial(func, *args, **kwargs))
+
+
+async def get_task_state(task_id: str) -> str:
+    return await run_celery_call(lambda: celery_app.AsyncResult(task_id).state)
+
+
+async def enqueue_report_generation() -> str:
+    """
+    Starts report generation unless a job is already in flight.
+    Returns the id of the job that is in flight, so concurrent callers share one task_id.
+    """
+    client = get_cache_client()
+    while True:
+        task_id = str(uuid.uuid4())
+        if await client.set(REPORT_TASK_KEY, task_id, nx=True, ex=REPORT_TASK_LOCK_SECONDS):
+            try:
+                await run_celery_call(celery_app.send_task, "generate_weekly_report", task_id=task_id)
+            except Exception as e:
+                await client.eval(_RELEASE_TASK_LOCK, 1, REPORT_TASK_KEY, task_id)
+                raise ReportEnqueueException(f"Failed to enqueue report generation: {str(e)}")
+            return task_id
+        current_task_id = await get_in_flight_task_id()
+        # Otherwise the running job finished between SET and GET, so try to take the lock again
+        if current_task_id is not None:
+            return current_task_id
+
+
+def release_report_task_lock(task_id: str) -> None:
+    """
+    Releases the single-flight lock if it is still held by task_id.
+    """
+    redis_cache.eval(_RELEASE_TASK_LOCK, 1, REPORT_TASK_KEY, task_id)
+
+
+async def get_in_flight_task_id() -> Optional[str]:
+    task_id = await get_cache_client().get(REPORT_TASK_KEY)
+    return task_id.decode() if task_id is not None else None
+
+
+def make_etag(hexdigest: str) -> str:
+    return f'"{hexdigest[:32]}"'
+
+
+def compress_report_body(report: List[Dict[str, Any]], generated_at: datetime) -> Tuple[bytes, str]:
+    """
+    Serialises the JSON endpoint body once and returns it gzip-compressed with its ETag.
+    """
+    body = json.dumps({"report": report, "generated_at": generated_at.isoformat()}, ensure_ascii=False).encode()
+    return gzip.compress(body), make_etag(hashlib.sha256(body).hexdigest())
+
+
+def _is_stale(generated_at: Optional[datetime]) -> bool:
+    if generated_at is None:
+        return True
+    return (datetime.now(timezone.utc) - generated_at).total_seconds() > REPORT_FRESH_SECONDS
+
+
+async def get_stored_report(data_key: str, etag_key: str) -> Tuple[Optional[bytes], Optional[str], bool]:
+    """
+    Reads a stored report file, its ETag and its staleness in one round trip.
+    """
+    data, etag, generated_at_raw = await get_cache_client().mget(data_key, etag_key, REPORT_GENERATED_AT_KEY)
+    generated_at = datetime.fromisoformat(generated_at_raw.decode()) if generated_at_raw is not None else None
+    return data, etag.decode() if etag is not None else None, _is_stale(generated_at)
+
+
+async def get_report_freshness() -> Tuple[Optional[datetime], bool]:
+    """
+    Returns when the stored report was generated and whether it is stale.
+    """
+    generated_at_raw = await get_cache_client().get(REPORT_GENERATED_AT_KEY)
+    generated_at = datetime.fromisoformat(generated_at_raw.decode()) if generated_at_raw is not None else None
+    return generated_at, _is_stale(generated_at)
@@ -0,0 +1,273 @@
+import random
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List, Tuple
+
+from sqlalchemy import Date, Integer, column, delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import ROLLUP_STRIPES
+from app.db.filters import created_between, date_bucket, unnest_rows, utc_day
+from app.models.db_models import (Transaction, User, WeeklyConversion,
+                                  WeeklyMetrics, WeeklySender)
+from app.schemas.enums import TransactionStatusEnum, TransactionTypeEnum
+
+
+def week_start_of(moment: datetime) -> date:
+    """
+    Returns the Monday (UTC) of the week the moment belongs to, the bucket date_bucket() gives in SQL.
+    """
+    day = utc_day(moment)
+    return day - timedelta(days=day.weekday())
+
+
+def _random_stripe() -> int:
+    return random.randrange(ROLLUP_STRIPES)
+
+
+def _processed_deltas(transaction: Transaction, sign: int) -> Dict[str, int | Decimal]:
+    """
+    Returns the weekly_metrics deltas contributed by a PROCESSED transaction.
+    """
+    amount = Decimal(transaction.amount) * sign
+    deltas: Dict[str, int | Decimal] = {"completed_transactions": sign}
+    if transaction.type == TransactionTypeEnum.DEPOSIT:
+        deltas.update(sum_deposits=amount, deposit_count=sign)
+    elif transaction.type == TransactionTypeEnum.WITHDRAWAL:
+        deltas.update(sum_withdrawals=amount, withdrawal_count=sign)
+    elif transaction.type == TransactionTypeEnum.TRANSFER:
+        deltas.update(sum_transfers=amount)
+    return deltas
+
+
+async def _increment_metrics(session: AsyncSession, week_start: date, stripe: int, **deltas: int | Decimal) -> None:
+    stmt = insert(WeeklyMetrics).values(week_start=week_start, stripe=stripe, **deltas)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[WeeklyMetrics.week_start, WeeklyMetrics.stripe],
+        set_={name: getattr(WeeklyMetrics, name) + stmt.excluded[name] for name in deltas},
+    )
+    await session.execute(stmt)
+
+
+async def _increment_conversion(
+    session: AsyncSession, week_start: date, stripe: int, transaction: Transaction, sign: int
+) -> None:
+    stmt = insert(WeeklyConversion).values(
+        week_start=week_start,
+        stripe=stripe,
+        from_currency=transaction.from_currency,
+        to_currency=transaction.to_currency,
+        count=sign,
+        sum_amount=Decimal(transaction.amount) * sign,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[
+            WeeklyConversion.week_start,
+            WeeklyConversion.from_currency,
+            WeeklyConversion.to_currency,
+            WeeklyConversion.stripe,
+        ],
+        set_={
+            "count": WeeklyConversion.count + stmt.excluded.count,
+            "sum_amount": WeeklyConversion.sum_amount + stmt.excluded.sum_amount,
+        },
+    )
+    await session.execute(stmt)
+
+
+async def apply_transaction_to_rollup(session: AsyncSession, transaction: Transaction) -> None:
+    """
+    Adds a newly created (flushed) transaction to the weekly rollups.
+    Must run in the same DB transaction as the insert.
+    """
+    await apply_transactions_to_rollup(session, [transaction])
+
+
+async def apply_transactions_to_rollup(session: AsyncSession, transactions: List[Transaction]) -> None:
+    """
+    Adds newly created (flushed) transactions to one random stripe of the weekly rollups, with one sender
+    upsert for all weeks and one metrics increment per week. Must run in the same DB transaction as the inserts.
+    Rows are upserted in (week_start, sender_id) order and weeks in date order, the same in every
+    concurrent batch, so two batches on the same stripe cannot wait on each other's rows.
+    """
+    senders: Dict[Tuple[date, int], Dict[str, int]] = defaultdict(lambda: {"transactions": 0, "deposits": 0})
+    deltas: Dict[date, Dict[str, int | Decimal]] = defaultdict(lambda: defaultdict(int))
+    conversions: List[Tuple[date, Transaction]] = []
+    for transaction in transactions:
+        week_start = week_start_of(transaction.created)
+        sender = senders[(week_start, transaction.sender_id)]
+        sender["transactions"] += 1
+        sender["deposits"] += int(transaction.type == TransactionTypeEnum.DEPOSIT)
+        deltas[week_start]["total_transactions"] += 1
+        if transaction.status == TransactionStatusEnum.PROCESSED:
+            for name, delta in _processed_deltas(transaction, 1).items():
+                deltas[week_start][name] += delta
+            if transaction.type == TransactionTypeEnum.EXCHANGE:
+                conversions.append((week_start, transaction))
+    if not senders:
+        return
+
+    stripe = _random_stripe()
+    for week_start, transaction in sorted(
+        conversions, key=lambda item: (item[0], item[1].from_currency, item[1].to_currency)
+    ):
+        await _increment_conversion(session, week_start, stripe, transaction, 1)
+
+    # Bound as one array per column: a multi-row VALUES would take 4 bind parameters per sender
+    sender_rows = unnest_rows(
+        "sender_rows",
+        [
+            column("week_start", Date),
+            column("sender_id", Integer),
+            column("stripe", Integer),
+            column("transactions", Integer),
+            column("deposits", Integer),
+        ],
+        sorted(
+            (key[0], key[1], stripe, counts["transactions"], counts["deposits"]) for key, counts in senders.items()
+        ),
+    )
+    # The distinct (deposit) senders of a week are counted from these rows on read
+    sender_stmt = insert(WeeklySender).from_select(
+        ["week_start", "sender_id", "stripe", "transactions", "deposits"], select(sender_rows)
+    )
+    sender_stmt = sender_stmt.on_conflict_do_update(
+        index_elements=[WeeklySender.week_start, WeeklySender.sender_id, WeeklySender.stripe],
+        set_={
+            "transactions": WeeklySender.transactions + sender_stmt.excluded.transactions,
+            "deposits": WeeklySender.deposits + sender_stmt.excluded.deposits,
+        },
+    )
+    await session.execute(sender_stmt)
+    for week_start in sorted(deltas):
+        await _increment_metrics(session, week_start, stripe, **deltas[week_start])
+
+
+async def revert_transaction_from_rollup(session: AsyncSession, transaction: Transaction) -> None:
+    """
+    Subtracts a PROCESSED transaction that is being rolled back from the week it was created in.
+    Must run in the same DB transaction as the status update.
+    """
+    await revert_transactions_from_rollup(session, [transaction])
+
+
+async def revert_transactions_from_rollup(session: AsyncSession, transactions: List[Transaction]) -> None:
+    """
+    Subtracts PROCESSED transactions that are being rolled back from one random stripe of the weekly rollups,
+    with one metrics increment per week. Must run in the same DB transaction as the status update.
+    """
+    stripe = _random_stripe()
+    by_week: Dict[date, Dict[str, int | Decimal]] = defaultdict(lambda: defaultdict(int))
+    for transaction in transactions:
+        week_start = week_start_of(transaction.created)
+        for name, delta in _processed_deltas(transaction, -1).items():
+            by_week[week_start][name] += delta
+        if transaction.type == TransactionTypeEnum.EXCHANGE:
+            await _increment_conversion(session, week_start, stripe, transaction, -1)
+    for week_start in sorted(by_week):
+        await _increment_metrics(session, week_start, stripe, **by_week[week_start])
+
+
+async def add_new_user_to_rollup(session: AsyncSession, user: User) -> None:
+    """
+    Counts a newly created (flushed) user in the weekly rollups.
+    """
+    await _increment_metrics(session, week_start_of(user.created), _random_stripe(), new_users=1)
+
+
+async def rebuild_weekly_rollups(session: AsyncSession, start_date: date, end_date: date, chunk_weeks: int = 4) -> int:
+    """
+    Rebuilds the weekly rollups from raw data for the weeks covering start_date..end_date, into stripe 0.
+    Works in chunks of chunk_weeks weeks, each committed separately.
+    Returns the number of rebuilt weeks.
+    """
+    chunk_start = start_date - timedelta(days=start_date.weekday())
+    # Sunday of the week of end_date: the last chunk stops there
+    last_day = end_date + timedelta(days=6 - end_date.weekday())
+    weeks = 0
+    while chunk_start <= last_day:
+        chunk_end = min(chunk_start + timedelta(weeks=chunk_weeks, days=-1), last_day)
+        await _rebuild_chunk(session, chunk_start, chunk_end)
+        await session.commit()
+        weeks += ((chunk_end - chunk_start).days + 1) // 7
+        chunk_start = chunk_end + timedelta(days=1)
+    return weeks
+
+
+async def _rebuild_chunk(session: AsyncSession, start_date: date, end_date: date) -> None:
+    for table in (WeeklySender, WeeklyConversion, WeeklyMetrics):
+        await session.execute(delete(table).where(table.week_start.between(start_date, end_date)))
+
+    txn_bucket = date_bucket(Transaction.created)
+    in_range = created_between(Transaction.created, start_date, end_date)
+    is_processed = Transaction.status == TransactionStatusEnum.PROCESSED.value
+    is_deposit = Transaction.type == TransactionTypeEnum.DEPOSIT.value
+    is_withdrawal = Transaction.type == TransactionTypeEnum.WITHDRAWAL.value
+    is_transfer = Transaction.type == TransactionTypeEnum.TRANSFER.value
+
+    await session.execute(
+        insert(WeeklySender).from_select(
+            ["week_start", "sender_id", "transactions", "deposits"],
+            select(txn_bucket, Transaction.sender_id, func.count(), func.count().filter(is_deposit))
+            .where(in_range)
+            .group_by(txn_bucket, Transaction.sender_id),
+        )
+    )
+
+    await session.execute(
+        insert(WeeklyMetrics).from_select(
+            [
+                "week_start",
+                "sum_deposits",
+                "deposit_count",
+                "sum_withdrawals",
+                "withdrawal_count",
+                "sum_transfers",
+                "total_transactions",
+                "completed_transactions",
+            ],
+            select(
+                txn_bucket,
+                func.coalesce(func.sum(Transaction.amount).filter(is_deposit & is_processed), 0),
+                func.count().filter(is_deposit & is_processed),
+                func.coalesce(func.sum(Transaction.amount).filter(is_withdrawal & is_processed), 0),
+                func.count().filter(is_withdrawal & is_processed),
+                func.coalesce(func.sum(Transaction.amount).filter(is_transfer & is_processed), 0),
+                func.count(),
+                func.count().filter(is_processed),
+            )
+            .where(in_range)
+            .group_by(txn_bucket),
+        )
+    )
+
+    user_bucket = date_bucket(User.created)
+    new_users_stmt = insert(WeeklyMetrics).from_select(
+        ["week_start", "new_users"],
+        select(user_bucket, func.count())
+        .where(created_between(User.created, start_date, end_date))
+        .group_by(user_bucket),
+    )
+    await session.execute(
+        new_users_stmt.on_conflict_do_update(
+            index_elements=[WeeklyMetrics.week_start, WeeklyMetrics.stripe],
+            set_={"new_users": new_users_stmt.excluded.new_users},
+        )
+    )
+
+    await session.execute(
+        insert(WeeklyConversion).from_select(
+            ["week_start", "from_currency", "to_currency", "count", "sum_amount"],
+            select(
+                txn_bucket,
+                Transaction.from_currency,
+                Transaction.to_currency,
+                func.count(),
+                func.sum(Transaction.amount),
+            )
+            .where(in_range, Transaction.type == TransactionTypeEnum.EXCHANGE.value, is_processed)
+            .group_by(txn_bucket, Transaction.from_currency, Transaction.to_currency),
+        )
+    )
@@ -1,150 +1,672 @@
+import asyncio
+import base64
+import logging
 import typing
+from collections import defaultdict
+from datetime import datetime, timedelta
 from decimal import Decimal
 
-from sqlalchemy import and_, or_, select, update
+from sqlalchemy import (Integer, Numeric, String, and_, column, literal, or_,
+                        select, true, tuple_, union_all, update)
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import (TRANSACTION_BATCH_MAX_SIZE,
+                        TRANSACTION_BATCH_MAX_WAIT_MS)
+from app.db.filters import day_start, in_array, unnest_rows
+from app.db.sessions import async_session_maker
 from app.exceptions.exceptions import (
     BadRequestDataException, CreateTransactionForBlockedUserException,
     NegativeBalanceException, TransactionAlreadyRollbackedException,
     TransactionNotExistsException, UpdateTransactionForBlockedUserException,
     UserNotExistsException)
 from app.models.db_models import Transaction, User, UserBalance
-from app.schemas.enums import (TransactionDirectionEnum, TransactionStatusEnum,
-                               TransactionTypeEnum, UserStatusEnum)
-from app.schemas.transaction_schemas import (RequestTransactionModel,
-                                             TransactionModel)
+from app.schemas.auth_schemas import PrincipalModel
+from app.schemas.enums import (CurrencyEnum, TransactionDirectionEnum,
+                               TransactionStatusEnum, TransactionTypeEnum,
+                               UserStatusEnum)
+from app.schemas.transaction_schemas import (BalanceChangeModel,
+                                             BatchRollbackRequestModel,
+                                             BatchRollbackResponseModel,
+                                             BatchRollbackResultModel,
+                                             BatchTransactionResponseModel,
+                                             BatchTransactionRowModel,
+                                             BatchTransactionRowResultModel,
+                                             RequestTransactionModel,
+                                             TransactionModel,
+                                             TransactionPageModel)
+from app.services.balance_snapshot_service import \
+    revert_transactions_from_snapshots
+from app.services.balance_stripe_service import (BalanceKey, credit_stripe,
+                                                 sweep_stripes)
+from app.services.bucket_cache_service import invalidate_buckets_for
+from app.services.rollup_service import (apply_transaction_to_rollup,
+                                         apply_transactions_to_rollup,
+                                         revert_transaction_from_rollup,
+                                         revert_transactions_from_rollup)
+
+logger = logging.getLogger(__name__)
+
+
+def encode_cursor(transaction: Transaction) -> str:
+    raw = f"{transaction.created.isoformat()}|{transaction.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> typing.Tuple[datetime, int]:
+    try:
+        created, transaction_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created), int(transaction_id)
+    except (ValueError, UnicodeDecodeError):
+        raise BadRequestDataException(detail="Invalid cursor")
 
 
 async def get_transactions(
     user_id: typing.Optional[int],
     session: AsyncSession,
     direction: typing.Optional[TransactionDirectionEnum] = None,
-) -> typing.List[TransactionModel]:
-    query = select(Transaction).order_by(Transaction.created.desc())
-    if user_id is not None:
-        if direction == "received":
-            query = query.where(
-                or_(
-                    and_(Transaction.type == TransactionTypeEnum.DEPOSIT.value, Transaction.sender_id == user_id),
-                    and_(Transaction.type == TransactionTypeEnum.TRANSFER.value, Transaction.recipient_id == user_id),
-                )
+    limit: int = 50,
+    cursor: typing.Optional[str] = None,
+) -> TransactionPageModel:
+    """
+    Returns one page of transactions, newest first, keyset-paginated on (created, id).
+    Each branch below walks one (user, created, id) index in order, so the cost per page
+    does not depend on how deep the cursor is.
+    """
+    if user_id is None:
+        branches = [true()]
+    elif direction == TransactionDirectionEnum.RECEIVED:
+        branches = [
+            and_(Transaction.sender_id == user_id, Transaction.type == TransactionTypeEnum.DEPOSIT.value),
+            and_(Transaction.recipient_id == user_id, Transaction.type == TransactionTypeEnum.TRANSFER.value),
+        ]
+    elif direction == TransactionDirectionEnum.SENT:
+        branches = [
+            and_(
+                Transaction.sender_id == user_id,
+                Transaction.type.in_([TransactionTypeEnum.WITHDRAWAL.value, TransactionTypeEnum.TRANSFER.value]),
             )
-        elif direction == "sent":
-            query = query.where(
-                or_(
-                    and_(Transaction.type == TransactionTypeEnum.WITHDRAWAL.value, Transaction.sender_id == user_id),
-                    and_(Transaction.type == TransactionTypeEnum.TRANSFER.value, Transaction.sender_id == user_id),
-                )
-            )
-        else:
-            query = query.where(or_(Transaction.sender_id == user_id, Transaction.recipient_id == user_id))
+        ]
+    else:
+        branches = [
+            Transaction.sender_id == user_id,
+            and_(Transaction.recipient_id == user_id, Transaction.sender_id != user_id),
+        ]
+
+    keyset = true()
+    if cursor is not None:
+        cursor_created, cursor_id = decode_cursor(cursor)
+        # The plain bound on created lets the planner prune newer monthly partitions; the row comparison does not
+        keyset = and_(
+            Transaction.created <= cursor_created,
+            tuple_(Transaction.created, Transaction.id) < tuple_(cursor_created, cursor_id),
+        )
+
+    newest_first = (Transaction.created.desc(), Transaction.id.desc())
+    if len(branches) == 1:
+        query = select(Transaction).where(branches[0], keyset).order_by(*newest_first).limit(limit + 1)
+    else:
+        branch_pages = [
+            select(Transaction.id, Transaction.created).where(branch, keyset).order_by(*newest_first).limit(limit + 1)
+            for branch in branches
+        ]
+        page_ids = union_all(*branch_pages).subquery()
+        # Joining on the whole primary key lets the planner look up each row in its own partition
+        query = (
+            select(Transaction)
+            .join(page_ids, and_(Transaction.id == page_ids.c.id, Transaction.created == page_ids.c.created))
+            .order_by(*newest_first)
+            .limit(limit + 1)
+        )
 
     result = await session.execute(query)
     transactions = result.scalars().all()
-    return [TransactionModel.model_validate(t) for t in transactions]
+    next_cursor = encode_cursor(transactions[limit - 1]) if len(transactions) > limit else None
+    return TransactionPageModel(
+        items=[TransactionModel.model_validate(t) for t in transactions[:limit]], next_cursor=next_cursor
+    )
+
+
+async def credit_balance(
+    session: AsyncSession, user_id: int, currency: CurrencyEnum, amount: Decimal, missing_detail: str
+) -> None:
+    """
+    Adds amount to the balance in one UPDATE ... RETURNING, to a random stripe if the balance is striped.
+    """
+    if await credit_stripe(session, user_id, currency, amount):
+        return
+    result = await session.execute(
+        update(UserBalance)
+        .where(UserBalance.user_id == user_id, UserBalance.currency == currency)
+        .values(amount=UserBalance.amount + amount)
+        .returning(UserBalance.amount)
+    )
+    if result.scalar() is None:
+        raise BadRequestDataException(detail=missing_detail)
+
+
+async def debit_balance(
+    session: AsyncSession, user_id: int, currency: CurrencyEnum, amount: Decimal, missing_detail: str
+) -> Decimal:
+    """
+    Subtracts amount from the balance only if it covers it, in one conditional UPDATE ... RETURNING.
+    The row lock taken by the UPDATE makes the check and the write atomic under concurrency.
+    If the user_balance row alone is too small, the balance's stripes are swept into it and the debit retried.
+    """
+    result = await session.execute(
+        update(UserBalance)
+        .where(
+            UserBalance.user_id == user_id,
+            UserBalance.currency == currency,
+            UserBalance.amount >= literal(amount, Numeric()),
+        )
+        .values(amount=UserBalance.amount - amount)
+        .returning(UserBalance.amount)
+    )
+    new_amount = result.scalar()
+    if new_amount is None:
+        # Not updated: either there is no such balance, it is too small or part of it sits in stripes
+        result = await session.execute(
+            select(UserBalance.amount)
+            .where(UserBalance.user_id == user_id, UserBalance.currency == currency)
+            .with_for_update()
+        )
+        balance = result.scalar()
+        if balance is None:
+            raise BadRequestDataException(detail=missing_detail)
+        balance += (await sweep_stripes(session, [(user_id, currency)])).get((user_id, currency), 0)
+        if balance < amount:
+            raise NegativeBalanceException(balance=balance)
+        result = await session.execute(
+            update(UserBalance)
+            .where(UserBalance.user_id == user_id, UserBalance.currency == currency)
+            .values(amount=UserBalance.amount - amount)
+            .returning(UserBalance.amount)
+        )
+        new_amount = result.scalar()
+    return new_amount
+
+
+async def apply_balance_legs(session: AsyncSession, legs: typing.List[typing.Tuple[BalanceKey, Decimal]]) -> None:
+    """
+    Applies signed (user_id, currency) balance changes with debit_balance/credit_balance, in key order,
+    so concurrent callers lock the balance rows in the same order.
+    """
+    for (user_id, currency), delta in sorted(legs, key=lambda leg: leg[0]):
+        missing_detail = f"Balance for {CurrencyEnum(currency).value} not found"
+        if delta < 0:
+            await debit_balance(session, user_id, currency, -delta, missing_detail)
+        else:
+            await credit_balance(session, user_id, currency, delta, missing_detail)
 
 
 async def create_transaction(
     session: AsyncSession,
     sender_id: int,
     transaction_data: RequestTransactionModel,
+    sender: typing.Optional[PrincipalModel] = None,
 ) -> Transaction:
+    """
+    Applies and commits one transaction. `sender` is the already resolved principal of sender_id,
+    whose status is then not queried again.
+    """
+    try:
+        new_transaction = await _apply_transaction(session, sender_id, transaction_data, sender)
+        await apply_transaction_to_rollup(session, new_transaction)
+    except Exception:
+        # Releases the balance row locks right away
+        await session.rollback()
+        raise
+    await session.commit()
+    await session.refresh(new_transaction)
+    return new_transaction
+
+
+async def _apply_transaction(
+    session: AsyncSession,
+    sender_id: int,
+    transaction_data: RequestTransactionModel,
+    sender: typing.Optional[PrincipalModel] = None,
+) -> Transaction:
+    """
+    Validates the request, updates the balances and flushes the new transaction, without committing.
+    """
     if sender_id < 0:
         raise BadRequestDataException(detail="Sender id must be positive")
     if transaction_data.amount <= 0:
         raise BadRequestDataException(detail="Amount must be positive")
 
     amount = Decimal(transaction_data.amount)
+    currency = transaction_data.currency
+
+    if transaction_data.type == TransactionTypeEnum.TRANSFER and transaction_data.recipient_id is None:
+        raise BadRequestDataException(detail="Recipient id must be provided for transfer.")
+    if transaction_data.type not in (
+        TransactionTypeEnum.TRANSFER,
+        TransactionTypeEnum.DEPOSIT,
+        TransactionTypeEnum.WITHDRAWAL,
+    ):
+        raise BadRequestDataException(detail="Invalid transaction type")
 
-    result = await session.execute(select(User).where(User.id == sender_id))
-    sender = result.scalar()
-    if not sender:
-        raise UserNotExistsException(user_id=sender_id)
-    if sender.status != UserStatusEnum.ACTIVE:
-        raise CreateTransactionForBlockedUserException(user_id=sender_id)
+    user_ids = {sender_id}
+    if transaction_data.type == TransactionTypeEnum.TRANSFER:
+        user_ids.add(transaction_data.recipient_id)
+    statuses = {}
+    if sender is not None and sender.id == sender_id:
+        statuses[sender_id] = sender.status
+    if user_ids - statuses.keys():
+        result = await session.execute(select(User.id, User.status).where(User.id.in_(user_ids - statuses.keys())))
+        statuses.update(result.tuples().all())
+    for user_id in (sender_id, transaction_data.recipient_id):
+        if user_id not in user_ids:
+            continue
+        if user_id not in statuses:
+            raise UserNotExistsException(user_id=user_id)
+        if statuses[user_id] != UserStatusEnum.ACTIVE:
+            raise CreateTransactionForBlockedUserException(user_id=user_id)
 
-    result = await session.execute(
-        select(UserBalance).where(
-            (UserBalance.user_id == sender_id) & (UserBalance.currency == transaction_data.currency)
-        )
+    if transaction_data.type == TransactionTypeEnum.TRANSFER:
+        # Row locks are taken in user id order so opposite transfers cannot deadlock
+        recipient_id = transaction_data.recipient_id
+        if sender_id <= recipient_id:
+            await debit_balance(session, sender_id, currency, amount, "Sender balance not found")
+            await credit_balance(session, recipient_id, currency, amount, "Recipient balance not found")
+        else:
+            await credit_balance(session, recipient_id, currency, amount, "Recipient balance not found")
+            await debit_balance(session, sender_id, currency, amount, "Sender balance not found")
+    elif transaction_data.type == TransactionTypeEnum.DEPOSIT:
+        await credit_balance(session, sender_id, currency, amount, "Sender balance not found")
+    else:
+        await debit_balance(session, sender_id, currency, amount, "Sender balance not found")
+
+    new_transaction = Transaction(
+        sender_id=sender_id,
+        recipient_id=transaction_data.recipient_id if transaction_data.type == TransactionTypeEnum.TRANSFER else None,
+        currency=currency,
+        amount=amount,
+        type=transaction_data.type.value,
+        status=TransactionStatusEnum.PROCESSED.value,
     )
-    sender_balance = result.scalar()
-    if not sender_balance:
-        raise BadRequestDataException(detail="Sender balance not found")
 
-    if transaction_data.type == TransactionTypeEnum.TRANSFER:
-        if transaction_data.recipient_id is None:
-            raise BadRequestDataException(detail="Recipient id must be provided for transfer.")
+    session.add(new_transaction)
+    await session.flush()
+    return new_transaction
 
-        result = await session.execute(select(User).where(User.id == transaction_data.recipient_id))
-        recipient = result.scalar()
-        if not recipient:
-            raise UserNotExistsException(user_id=transaction_data.recipient_id)
-        if recipient.status != UserStatusEnum.ACTIVE:
-            raise CreateTransactionForBlockedUserException(user_id=transaction_data.recipient_id)
 
-        result = await session.execute(
-            select(UserBalance).where(
-                (UserBalance.user_id == transaction_data.recipient_id)
-                & (UserBalance.currency == transaction_data.currency)
-            )
-        )
-        recipient_balance = result.scalar()
-        if not recipient_balance:
-            raise BadRequestDataException(detail="Recipient balance not found")
+class TransactionBatcher:
+    """
+    Group commit for create_transaction: requests arriving within max_wait seconds (up to max_size)
+    are applied in one DB transaction, each in its own savepoint, and committed once.
+    Every caller gets its own transaction or error.
+    """
+
+    def __init__(self, max_size: int, max_wait: float) -> None:
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self.loop = asyncio.get_running_loop()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._worker = self.loop.create_task(self._run())
+
+    async def submit(
+        self,
+        sender_id: int,
+        transaction_data: RequestTransactionModel,
+        sender: typing.Optional[PrincipalModel] = None,
+    ) -> Transaction:
+        future = self.loop.create_future()
+        self._queue.put_nowait((sender_id, transaction_data, sender, future))
+        return await future
+
+    def _drain(self, batch: list) -> None:
+        while len(batch) < self.max_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            self._drain(batch)
+            if len(batch) < self.max_size:
+                await asyncio.sleep(self.max_wait)
+                self._drain(batch)
+            try:
+                await self._apply_batch(batch)
+            except Exception as e:
+                logger.exception("Group commit worker failed")
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    async def _apply_batch(self, batch: list) -> None:
+        applied = []
+        try:
+            async with async_session_maker() as session:
+                for item in batch:
+                    sender_id, transaction_data, sender, future = item
+                    try:
+                        async with session.begin_nested():
+                            applied.append(
+                                (item, await _apply_transaction(session, sender_id, transaction_data, sender))
+                            )
+                    except Exception as e:
+                        if not future.done():
+                            future.set_exception(e)
+                if applied:
+                    await apply_transactions_to_rollup(session, [transaction for _, transaction in applied])
+                await session.commit()
+        except Exception:
+            # E.g. a deadlock with another process: nothing was committed, so retry one by one
+            logger.exception("Group commit of %d transactions failed, applying them separately", len(applied))
+            for (sender_id, transaction_data, sender, future), _ in applied:
+                try:
+                    async with async_session_maker() as session:
+                        transaction = await create_transaction(session, sender_id, transaction_data, sender)
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(transaction)
+            return
+        for (*_, future), transaction in applied:
+            if not future.done():
+                future.set_result(transaction)
+
+
+_batcher: typing.Optional[TransactionBatcher] = None
+
+
+async def create_transaction_grouped(
+    sender_id: int,
+    transaction_data: RequestTransactionModel,
+    sender: typing.Optional[PrincipalModel] = None,
+) -> Transaction:
+    """
+    Same as create_transaction, but committed together with other concurrent requests.
+    """
+    global _batcher
+    if _batcher is None or _batcher.loop is not asyncio.get_running_loop():
+        _batcher = TransactionBatcher(TRANSACTION_BATCH_MAX_SIZE, TRANSACTION_BATCH_MAX_WAIT_MS / 1000)
+    return await _batcher.submit(sender_id, transaction_data, sender)
+
+
+async def _lock_balances(
+    session: AsyncSession, keys: typing.Set[BalanceKey], debit_keys: typing.Set[BalanceKey]
+) -> typing.Tuple[typing.Dict[BalanceKey, int], typing.Dict[BalanceKey, Decimal]]:
+    """
+    Locks the (user_id, currency) balances FOR UPDATE in key order, like apply_balance_legs, so they cannot deadlock,
+    and sweeps the stripes of the ones in debit_keys into them. Credited-only balances keep their stripes unlocked:
+    their amounts are not checked. Returns the ids and amounts by key.
+    """
+    balance_keys = unnest_rows(
+        "balance_keys",
+        [column("user_id", Integer), column("currency", String)],
+        [(user_id, CurrencyEnum(currency).value) for user_id, currency in keys],
+    )
+    result = await session.execute(
+        select(UserBalance.id, UserBalance.user_id, UserBalance.currency, UserBalance.amount)
+        .where(tuple_(UserBalance.user_id, UserBalance.currency).in_(select(balance_keys)))
+        .order_by(UserBalance.user_id, UserBalance.currency)
+        .with_for_update()
+    )
+    balance_ids, balances = {}, {}
+    for balance in result.all():
+        balance_ids[(balance.user_id, balance.currency)] = balance.id
+        balances[(balance.user_id, balance.currency)] = balance.amount
+    for key, swept in (await sweep_stripes(session, debit_keys & balances.keys())).items():
+        balances[key] += swept
+    return balance_ids, balances
+
+
+async def _apply_balance_deltas(session: AsyncSession, deltas: typing.Dict[int, Decimal]) -> None:
+    """
+    Adds the net delta to every balance id in a single UPDATE ... FROM unnest(...), in id order.
+    """
+    balance_deltas = unnest_rows(
+        "balance_deltas", [column("id", Integer), column("delta", Numeric())], sorted(deltas.items())
+    )
+    await session.execute(
+        update(UserBalance)
+        .where(UserBalance.id == balance_deltas.c.id)
+        .values(amount=UserBalance.amount + balance_deltas.c.delta)
+        .execution_options(synchronize_session=False)
+    )
 
-        if sender_balance.amount < amount:
-            raise NegativeBalanceException(balance=sender_balance.amount)
 
-        sender_balance.amount -= amount
-        recipient_balance.amount += amount
+BATCH_TRANSACTION_TYPES = (TransactionTypeEnum.DEPOSIT, TransactionTypeEnum.WITHDRAWAL)
+AMOUNT_QUANTUM = Decimal("0.000001")
+
+
+def _batch_row_error(
+    row: BatchTransactionRowModel,
+    amount: Decimal,
+    statuses: typing.Dict[int, UserStatusEnum],
+    balances: typing.Dict[BalanceKey, Decimal],
+) -> typing.Optional[str]:
+    if amount <= 0:
+        return "Amount must be positive"
+    if row.type not in BATCH_TRANSACTION_TYPES:
+        return "Only deposits and withdrawals can be ingested in a batch"
+    if row.user_id not in statuses:
+        return UserNotExistsException(user_id=row.user_id).detail
+    if statuses[row.user_id] != UserStatusEnum.ACTIVE:
+        return CreateTransactionForBlockedUserException(user_id=row.user_id).detail
+    balance = balances.get((row.user_id, row.currency))
+    if balance is None:
+        return "Balance not found"
+    if row.type == TransactionTypeEnum.WITHDRAWAL and balance < amount:
+        return NegativeBalanceException(balance=balance).detail
+    return None
+
+
+async def create_transactions_batch(
+    session: AsyncSession, rows: typing.List[BatchTransactionRowModel]
+) -> BatchTransactionResponseModel:
+    """
+    Ingests deposits and withdrawals in one DB transaction.
+    Rows are applied in order against the running balances and a row that is invalid or would overdraw
+    is rejected on its own. Balances get one set-based UPDATE with the net delta per (user_id, currency).
+    """
+    user_ids = {row.user_id for row in rows}
+    result = await session.execute(select(User.id, User.status).where(in_array(User.id, user_ids, Integer)))
+    statuses = dict(result.tuples().all())
+
+    balance_ids, balances = await _lock_balances(
+        session,
+        {(row.user_id, row.currency) for row in rows},
+        {(row.user_id, row.currency) for row in rows if row.type == TransactionTypeEnum.WITHDRAWAL},
+    )
 
-        new_transaction = Transaction(
-            sender_id=sender_id,
-            recipient_id=transaction_data.recipient_id,
-            currency=transaction_data.currency,
+    deltas: typing.Dict[int, Decimal] = defaultdict(Decimal)
+    results: typing.List[BatchTransactionRowResultModel] = []
+    accepted: typing.List[typing.Tuple[BatchTransactionRowResultModel, Transaction]] = []
+    for index, row in enumerate(rows):
+        amount = Decimal(row.amount).quantize(AMOUNT_QUANTUM)
+        error = _batch_row_error(row, amount, statuses, balances)
+        results.append(BatchTransactionRowResultModel(index=index, accepted=error is None, error=error))
+        if error is not None:
+            continue
+        key = (row.user_id, row.currency)
+        delta = amount if row.type == TransactionTypeEnum.DEPOSIT else -amount
+        balances[key] += delta
+        deltas[balance_ids[key]] += delta
+        transaction = Transaction(
+            sender_id=row.user_id,
+            currency=row.currency,
             amount=amount,
-            type=TransactionTypeEnum.TRANSFER.value,
+            type=row.type.value,
             status=TransactionStatusEnum.PROCESSED.value,
         )
+        accepted.append((results[-1], transaction))
+
+    if accepted:
+        await _apply_balance_deltas(session, deltas)
+        transactions = [transaction for _, transaction in accepted]
+        session.add_all(transactions)
+        await session.flush()
+        await apply_transactions_to_rollup(session, transactions)
+    await session.commit()
 
-    elif transaction_data.type == TransactionTypeEnum.DEPOSIT:
-        sender_balance.amount += amount
-        new_transaction = Transaction(
-            sender_id=sender_id,
-            currency=transaction_data.currency,
-            amount=amount,
-            type=TransactionTypeEnum.DEPOSIT.value,
-            status=TransactionStatusEnum.PROCESSED.value,
-        )
+    for row_result, transaction in accepted:
+        row_result.transaction_id = transaction.id
+    return BatchTransactionResponseModel(accepted=len(accepted), rejected=len(results) - len(accepted), results=results)
+
+
+MAX_BATCH_ROLLBACK = 50000
+
+
+def _rollback_legs(transaction: Transaction) -> typing.List[typing.Tuple[BalanceKey, Decimal]]:
+    """
+    Returns the balance changes that reverse a transaction, credits first.
+    """
+    amount = Decimal(transaction.amount)
+    if transaction.type == TransactionTypeEnum.DEPOSIT:
+        return [((transaction.sender_id, transaction.currency), -amount)]
+    if transaction.type == TransactionTypeEnum.WITHDRAWAL:
+        return [((transaction.sender_id, transaction.currency), amount)]
+    if transaction.type == TransactionTypeEnum.TRANSFER:
+        return [
+            ((transaction.sender_id, transaction.currency), amount),
+            ((transaction.recipient_id, transaction.currency), -amount),
+        ]
+    if transaction.type == TransactionTypeEnum.EXCHANGE and transaction.converted_amount is not None:
+        return [
+            ((transaction.sender_id, transaction.from_currency), amount),
+            ((transaction.sender_id, transaction.to_currency), -Decimal(transaction.converted_amount)),
+        ]
+    return []
+
+
+def _rollback_error(
+    transaction: Transaction,
+    statuses: typing.Dict[int, UserStatusEnum],
+    balances: typing.Dict[BalanceKey, Decimal],
+) -> typing.Optional[str]:
+    if transaction.status == TransactionStatusEnum.ROLLBACKED:
+        return TransactionAlreadyRollbackedException(transaction_id=transaction.id).detail
+    if transaction.type == TransactionTypeEnum.EXCHANGE and transaction.converted_amount is None:
+        # Exchanges made before the converted amount was recorded cannot be reversed
+        return "Exchange without a recorded converted amount cannot be rolled back"
+    user_ids = [transaction.sender_id]
+    if transaction.type == TransactionTypeEnum.TRANSFER:
+        user_ids.append(transaction.recipient_id)
+    for user_id in user_ids:
+        if user_id not in statuses:
+            return UserNotExistsException(user_id=user_id).detail
+        if statuses[user_id] != UserStatusEnum.ACTIVE:
+            return UpdateTransactionForBlockedUserException(user_id=user_id).detail
+
+    running = {}
+    for key, delta in _rollback_legs(transaction):
+        if key not in balances:
+            return "Balance not found"
+        balance = running.get(key, balances[key])
+        if balance + delta < 0:
+            return NegativeBalanceException(balance=balance).detail
+        running[key] = balance + delta
+    return None
+
+
+async def rollback_transactions_batch(
+    session: AsyncSession, request: BatchRollbackRequestModel
+) -> BatchRollbackResponseModel:
+    """
+    Rolls back the listed transactions and/or every PROCESSED transaction matching the filter.
+    Transactions are checked in id order against the running balances; the net reversal per
+    (user_id, currency) is applied with one UPDATE and the statuses with another, atomically.
+    With dry_run nothing is written and the result shows which rollbacks would fail.
+    """
+    conditions = []
+    if request.transaction_ids is not None:
+        conditions.append(in_array(Transaction.id, request.transaction_ids, Integer))
+    if request.user_id is not None:
+        conditions.append(or_(Transaction.sender_id == request.user_id, Transaction.recipient_id == request.user_id))
+    if request.type is not None:
+        conditions.append(Transaction.type == request.type.value)
+    if request.currency is not None:
+        conditions.append(Transaction.currency == request.currency.value)
+    if request.start_date is not None:
+        conditions.append(Transaction.created >= day_start(request.start_date))
+    if request.end_date is not None:
+        conditions.append(Transaction.created < day_start(request.end_date + timedelta(days=1)))
+    if not conditions:
+        raise BadRequestDataException(detail="Transaction ids or at least one filter must be provided")
+    if request.transaction_ids is None:
+        conditions.append(Transaction.status == TransactionStatusEnum.PROCESSED.value)
 
-    elif transaction_data.type == TransactionTypeEnum.WITHDRAWAL:
-        if sender_balance.amount < amount:
-            raise NegativeBalanceException(balance=sender_balance.amount)
-        sender_balance.amount -= amount
-        new_transaction = Transaction(
-            sender_id=sender_id,
-            currency=transaction_data.currency,
-            amount=amount,
-            type=TransactionTypeEnum.WITHDRAWAL.value,
-            status=TransactionStatusEnum.PROCESSED.value,
+    result = await session.execute(
+        select(Transaction).where(*conditions).order_by(Transaction.id).limit(MAX_BATCH_ROLLBACK + 1).with_for_update()
+    )
+    transactions = result.scalars().all()
+    if len(transactions) > MAX_BATCH_ROLLBACK:
+        raise BadRequestDataException(detail=f"More than {MAX_BATCH_ROLLBACK} transactions match the filter")
+
+    user_ids = {t.sender_id for t in transactions} | {t.recipient_id for t in transactions if t.recipient_id}
+    result = await session.execute(select(User.id, User.status).where(in_array(User.id, user_ids, Integer)))
+    statuses = dict(result.tuples().all())
+    legs = [leg for transaction in transactions for leg in _rollback_legs(transaction)]
+    balance_ids, balances = await _lock_balances(
+        session, {key for key, _ in legs}, {key for key, delta in legs if delta < 0}
+    )
+
+    changes: typing.Dict[BalanceKey, Decimal] = defaultdict(Decimal)
+    results: typing.List[BatchRollbackResultModel] = []
+    reverted: typing.List[Transaction] = []
+    for transaction in transactions:
+        error = _rollback_error(transaction, statuses, balances)
+        results.append(BatchRollbackResultModel(transaction_id=transaction.id, rolled_back=error is None, error=error))
+        if error is not None:
+            continue
+        for key, delta in _rollback_legs(transaction):
+            balances[key] += delta
+            changes[key] += delta
+        reverted.append(transaction)
+
+    found_ids = {transaction.id for transaction in transactions}
+    for transaction_id in sorted(set(request.transaction_ids or []) - found_ids):
+        results.append(
+            BatchRollbackResultModel(
+                transaction_id=transaction_id,
+                rolled_back=False,
+                error=TransactionNotExistsException(transaction_id=transaction_id).detail,
+            )
         )
+    results.sort(key=lambda r: r.transaction_id)
 
+    if request.dry_run or not reverted:
+        await session.rollback()
     else:
-        raise BadRequestDataException(detail="Invalid transaction type")
-
-    session.add(new_transaction)
-    await session.commit()
-    await session.refresh(new_transaction)
-    return new_transaction
+        await _apply_balance_deltas(session, {balance_ids[key]: delta for key, delta in changes.items()})
+        await revert_transactions_from_rollup(session, reverted)
+        await revert_transactions_from_snapshots(session, reverted)
+        await session.execute(
+            update(Transaction)
+            .where(in_array(Transaction.id, [transaction.id for transaction in reverted], Integer))
+            .values(status=TransactionStatusEnum.ROLLBACKED.value)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        await invalidate_buckets_for(*[transaction.created for transaction in reverted])
+
+    return BatchRollbackResponseModel(
+        dry_run=request.dry_run,
+        rolled_back=len(reverted),
+        failed=len(results) - len(reverted),
+        balance_changes=[
+            BalanceChangeModel(user_id=user_id, currency=currency, delta=delta)
+            for (user_id, currency), delta in sorted(changes.items())
+            if delta != 0
+        ],
+        results=results,
+    )
 
 
 async def patch_rollback_transaction(transaction_id: int, session: AsyncSession):
     if transaction_id < 0:
         raise BadRequestDataException(detail="transaction_id must be positive")
 
-    db_transaction_query = await session.execute(select(Transaction).where(Transaction.id == transaction_id))
+    # Locked until commit: a concurrent rollback of the same transaction waits and then sees ROLLBACKED
+    db_transaction_query = await session.execute(
+        select(Transaction).where(Transaction.id == transaction_id).with_for_update()
+    )
     db_transaction = db_transaction_query.scalar()
     if not db_transaction:
         raise TransactionNotExistsException(transaction_id=transaction_id)
@@ -167,87 +689,28 @@ async def patch_rollback_transaction(transaction_id: int, session: AsyncSession)
         if recipient_user.status != UserStatusEnum.ACTIVE.value:
             raise UpdateTransactionForBlockedUserException(user_id=db_transaction.recipient_id)
 
-    t_amount = Decimal(db_transaction.amount)
-
-    if db_transaction.type == TransactionTypeEnum.DEPOSIT.value:
-        balance_query = await session.execute(
-            select(UserBalance).where(
-                (UserBalance.user_id == db_transaction.sender_id) & (UserBalance.currency == db_transaction.currency)
-            )
-        )
-        balance = balance_query.scalar()
-        if not balance:
-            raise BadRequestDataException(detail="Balance not found")
-        if balance.amount < t_amount:
-            raise NegativeBalanceException(balance=balance.amount)
-        balance.amount -= t_amount
-
-    elif db_transaction.type == TransactionTypeEnum.WITHDRAWAL.value:
-        balance_query = await session.execute(
-            select(UserBalance).where(
-                (UserBalance.user_id == db_transaction.sender_id) & (UserBalance.currency == db_transaction.currency)
-            )
-        )
-        sender_balance = balance_query.scalar()
-        if not sender_balance:
-            raise BadRequestDataException(detail="Balance not found")
-        sender_balance.amount += t_amount
-
-    elif db_transaction.type == TransactionTypeEnum.TRANSFER.value:
-        sender_balance_query = await session.execute(
-            select(UserBalance).where(
-                (UserBalance.user_id == db_transaction.sender_id) & (UserBalance.currency == db_transaction.currency)
-            )
-        )
-        sender_balance = sender_balance_query.scalar()
-        if not sender_balance:
-            raise BadRequestDataException(detail="Sender balance not found")
-        sender_balance.amount += t_amount
-        recipient_balance_query = await session.execute(
-            select(UserBalance).where(
-                (UserBalance.user_id == db_transaction.recipient_id) & (UserBalance.currency == db_transaction.currency)
-            )
-        )
-        recipient_balance = recipient_balance_query.scalar()
-        if not recipient_balance:
-            raise BadRequestDataException(detail="Recipient balance not found")
-        if recipient_balance.amount < t_amount:
-            raise NegativeBalanceException(balance=recipient_balance.amount)
-        recipient_balance.amount -= t_amount
-
-    elif db_transaction.type == TransactionTypeEnum.EXCHANGE.value:
-        query_from_balance = await session.execute(
-            select(UserBalance).where(
-                (UserBalance.user_id == db_transaction.sender_id)
-                & (UserBalance.currency == db_transaction.from_currency)
-            )
-        )
-        balance_from = query_from_balance.scalar()
-        if not balance_from:
-            raise BadRequestDataException(detail="From-currency balance not found")
-        query_to_balance = await session.execute(
-            select(UserBalance).where(
-                (UserBalance.user_id == db_transaction.sender_id) & (UserBalance.currency == db_transaction.to_currency)
-            )
-        )
-        balance_to = query_to_balance.scalar()
-        if not balance_to:
-            raise BadRequestDataException(detail="To-currency balance not found")
-        if balance_to.amount < Decimal(db_transaction.converted_amount):
-            raise NegativeBalanceException(balance=balance_to.amount)
-        balance_from.amount += t_amount
-        balance_to.amount -= Decimal(db_transaction.converted_amount)
-
-    else:
+    if db_transaction.type == TransactionTypeEnum.EXCHANGE.value and db_transaction.converted_amount is None:
+        raise BadRequestDataException(detail="Exchange without a recorded converted amount cannot be rolled back")
+    legs = _rollback_legs(db_transaction)
+    if not legs:
         raise BadRequestDataException(detail="Unknown transaction type")
 
-    await session.execute(
-        update(Transaction)
-        .where(Transaction.id == transaction_id)
-        .values(status=TransactionStatusEnum.ROLLBACKED.value)
-    )
+    try:
+        await apply_balance_legs(session, legs)
+        await revert_transaction_from_rollup(session, db_transaction)
+        await revert_transactions_from_snapshots(session, [db_transaction])
+        await session.execute(
+            update(Transaction)
+            .where(Transaction.id == transaction_id)
+            .values(status=TransactionStatusEnum.ROLLBACKED.value)
+        )
+    except Exception:
+        # Releases the balance row locks right away
+        await session.rollback()
+        raise
 
     await session.commit()
+    await invalidate_buckets_for(db_transaction.created)
 
     updated_transaction_query = await session.execute(select(Transaction).where(Transaction.id == transaction_id))
     updated_transaction = updated_transaction_query.scalar()
@@ -1,8 +1,8 @@
 import typing
 
-from passlib.context import CryptContext
 from pydantic import EmailStr
 from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
@@ -16,8 +16,10 @@ from app.schemas.enums import CurrencyEnum, UserRoleEnum, UserStatusEnum
 from app.schemas.user_schemas import (RequestUserModel, RequestUserUpdateModel,
                                       ResponseUserBalanceModel,
                                       ResponseUserModel, UserModel)
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.services.balance_stripe_service import get_stripe_totals
+from app.services.password_service import hash_password
+from app.services.principal_service import invalidate_principal
+from app.services.rollup_service import add_new_user_to_rollup
 
 
 async def get_users(
@@ -38,6 +40,8 @@ async def get_users(
 
     users_query = await session.execute(query)
     users = users_query.scalars().all()
+    # Hot accounts keep part of their balance in stripes
+    stripe_totals = await get_stripe_totals(session, user_id) if users else {}
 
     result_users = []
     for user in users:
@@ -45,7 +49,7 @@ async def get_users(
             [
                 ResponseUserBalanceModel(
                     currency=b.currency,
-                    amount=b.amount,
+                    amount=b.amount + stripe_totals.get((user.id, b.currency), 0),
                 )
                 for b in user.user_balance
             ],
@@ -65,12 +69,13 @@ async def get_users(
 
 
 async def create_user(user: RequestUserModel, session: AsyncSession):
-
-    query_existing_user = await session.execute(select(User).where(User.email == user.email))
-    existing_user = query_existing_user.scalar()
-    if existing_user:
+    # Checked before hashing: a taken email must not cost a bcrypt round
+    query_existing_user = await session.execute(select(User.id).where(User.email == user.email))
+    if query_existing_user.scalar() is not None:
         raise UserAlreadyExistsException(email=str(user.email))
-    hashed_password = pwd_context.hash(user.password)
+    # Ends the transaction so no connection is held while hashing; keeps what the caller has pending
+    await session.commit()
+    hashed_password = await hash_password(user.password)
 
     new_user = User(
         role=UserRoleEnum.USER,
@@ -79,9 +84,15 @@ async def create_user(user: RequestUserModel, session: AsyncSession):
         status=UserStatusEnum.ACTIVE,
     )
     session.add(new_user)
-    await session.flush()
+    try:
+        await session.flush()
+    except IntegrityError:
+        # Registered concurrently while hashing
+        await session.rollback()
+        raise UserAlreadyExistsException(email=str(user.email))
     wallets = [UserBalance(user_id=new_user.id, currency=curr, amount=0) for curr in CurrencyEnum]
     session.add_all(wallets)
+    await add_new_user_to_rollup(session, new_user)
     await session.commit()
     await session.refresh(new_user)
     return new_user
@@ -105,6 +116,7 @@ async def update_user_status(user_id: int, status_update: RequestUserUpdateModel
     db_user.status = status_update.status
     session.add(db_user)
     await session.commit()
+    await invalidate_principal(user_id)
     await session.refresh(db_user)
 
     return UserModel.model_validate(db_user)
@@ -0,0 +1,20 @@
+import asyncio
+from datetime import datetime
+
+from app.celery import celery_app
+from app.db.filters import day_start
+from app.db.sessions import async_session_maker
+from app.services.balance_snapshot_service import take_balance_snapshot
+
+
+async def snapshot_today() -> int:
+    async with async_session_maker() as session:
+        return await take_balance_snapshot(session, day_start(datetime.utcnow().date()))
+
+
+@celery_app.task(name="take_balance_snapshot")
+def take_balance_snapshot_task() -> int:
+    """
+    Celery beat task to snapshot every balance as of the start of the current day (UTC).
+    """
+    return asyncio.run(snapshot_today())
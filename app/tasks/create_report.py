@@ -1,29 +1,50 @@
 # app/tasks/report_tasks.py
 import asyncio
-
-from redis import Redis
+import hashlib
+from datetime import datetime, timezone
 
 from app.celery import celery_app
-from app.config import REDIS_URL
-from app.services.analysis_service import collect_all_weeks_report
-
-redis_cache = Redis.from_url(REDIS_URL, db=1)
+from app.services.analysis_service import (collect_all_weeks_report,
+                                           iter_excel_report)
+from app.services.report_service import (REPORT_EXCEL_ETAG_KEY,
+                                         REPORT_EXCEL_KEY,
+                                         REPORT_GENERATED_AT_KEY,
+                                         REPORT_JSON_ETAG_KEY, REPORT_JSON_KEY,
+                                         compress_report_body, make_etag,
+                                         redis_cache, release_report_task_lock)
 
-CACHE_TTL_SECONDS = 3600
+EXCEL_TMP_KEY = "weekly_report_excel:tmp"
 
 
-@celery_app.task(name="generate_weekly_report")
-def generate_weekly_report() -> bool:
+@celery_app.task(name="generate_weekly_report", bind=True)
+def generate_weekly_report(self) -> bool:
     """
     Celery task to collect a report for the last 52 weeks.
-    The results (JSON and Excel) are saved to Redis with a TTL of 1 hour.
+    The results (compressed JSON body and Excel, each with an ETag) are saved to Redis without expiry together
+    with their generation time, so the last good report keeps being served while the next one is generated.
     """
-
-    # Execute the asynchronous function
-    json_report, excel_report = asyncio.run(collect_all_weeks_report())
-
-    # Save the results to Redis
-    redis_cache.setex("weekly_report_json", CACHE_TTL_SECONDS, json_report)
-    redis_cache.setex("weekly_report_excel", CACHE_TTL_SECONDS, excel_report)
+    try:
+        # Execute the asynchronous function
+        report = asyncio.run(collect_all_weeks_report())
+        generated_at = datetime.now(timezone.utc)
+        json_body, json_etag = compress_report_body(report, generated_at)
+
+        # Stream the Excel file into a temporary key, then swap it in together with the JSON
+        redis_cache.delete(EXCEL_TMP_KEY)
+        excel_hash = hashlib.sha256()
+        for chunk in iter_excel_report(report):
+            excel_hash.update(chunk)
+            redis_cache.append(EXCEL_TMP_KEY, chunk)
+
+        # Save the results to Redis
+        pipe = redis_cache.pipeline()
+        pipe.set(REPORT_JSON_KEY, json_body)
+        pipe.set(REPORT_JSON_ETAG_KEY, json_etag)
+        pipe.rename(EXCEL_TMP_KEY, REPORT_EXCEL_KEY)
+        pipe.set(REPORT_EXCEL_ETAG_KEY, make_etag(excel_hash.hexdigest()))
+        pipe.set(REPORT_GENERATED_AT_KEY, generated_at.isoformat())
+        pipe.execute()
+    finally:
+        release_report_task_lock(self.request.id)
 
     return True
@@ -0,0 +1,54 @@
+import argparse
+import asyncio
+from datetime import date
+from typing import List, Optional
+
+from app.celery import celery_app
+from app.db.partitions import (convert_transaction_table_to_partitioned,
+                               detach_transaction_partitions,
+                               ensure_transaction_partitions)
+from app.db.sessions import engine
+
+
+async def create_partitions() -> List[str]:
+    async with engine.begin() as conn:
+        return await ensure_transaction_partitions(conn)
+
+
+async def detach_partitions(before: date) -> List[str]:
+    async with engine.begin() as conn:
+        return await detach_transaction_partitions(conn, before)
+
+
+async def manage_partitions(convert: bool, detach_before: Optional[date]) -> None:
+    async with engine.begin() as conn:
+        if convert:
+            print(f"Copied {await convert_transaction_table_to_partitioned(conn)} transactions into partitions")
+        if detach_before:
+            print("Detached:", ", ".join(await detach_transaction_partitions(conn, detach_before)) or "nothing")
+        print("Partitions:", ", ".join(await ensure_transaction_partitions(conn)))
+
+
+@celery_app.task(name="create_transaction_partitions")
+def create_transaction_partitions_task() -> List[str]:
+    """
+    Celery beat task to create the monthly transaction partitions ahead of time.
+    """
+    return asyncio.run(create_partitions())
+
+
+@celery_app.task(name="detach_transaction_partitions")
+def detach_transaction_partitions_task(before: str) -> List[str]:
+    """
+    Celery task to detach the transaction partitions of months before `before` (ISO date) for archival.
+    """
+    return asyncio.run(detach_partitions(date.fromisoformat(before)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the monthly partitions of the transaction table.")
+    parser.add_argument("--convert", action="store_true", help="Convert an existing plain table to a partitioned one")
+    parser.add_argument("--detach-before", type=date.fromisoformat, help="Detach partitions of months before this date")
+    args = parser.parse_args()
+
+    asyncio.run(manage_partitions(args.convert, args.detach_before))
@@ -0,0 +1,31 @@
+import argparse
+import asyncio
+from datetime import date, datetime
+
+from app.celery import celery_app
+from app.db.sessions import async_session_maker
+from app.services.analysis_service import get_report_window
+from app.services.rollup_service import rebuild_weekly_rollups
+
+
+async def rebuild(start_date: date, chunk_weeks: int) -> int:
+    async with async_session_maker() as session:
+        return await rebuild_weekly_rollups(session, start_date, datetime.utcnow().date(), chunk_weeks)
+
+
+@celery_app.task(name="rebuild_weekly_rollups")
+def rebuild_weekly_rollups_task(weeks: int = 52, chunk_weeks: int = 4) -> int:
+    """
+    Celery task to rebuild the weekly rollups for the last `weeks` weeks from raw transactions.
+    """
+    return asyncio.run(rebuild(get_report_window(weeks), chunk_weeks))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill or repair the weekly rollup tables from raw data.")
+    parser.add_argument("--start", type=date.fromisoformat, help="First day to rebuild (default: 52 weeks ago)")
+    parser.add_argument("--chunk-weeks", type=int, default=4, help="Weeks rebuilt per DB transaction")
+    args = parser.parse_args()
+
+    rebuilt = asyncio.run(rebuild(args.start or get_report_window(52), args.chunk_weeks))
+    print(f"Rebuilt {rebuilt} weeks")
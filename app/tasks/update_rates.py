@@ -1,13 +1,19 @@
+import argparse
+import asyncio
 import json
 import logging
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
 
 import httpx
 import redis
 
 from app.celery import celery_app
-from app.config import COINMARKETCAP_API_URL
+from app.config import COINMARKETCAP_API_URL, COINMARKETCAP_BASE_URL, REDIS_URL
+from app.services.rate_history_service import save_rates
 
-BASE_URL = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest"
+BASE_URL = COINMARKETCAP_BASE_URL
 HEADERS = {"X-CMC_PRO_API_KEY": COINMARKETCAP_API_URL}
 CURRENCIES = ["USD", "EUR", "AUD", "CAD", "ARS", "PLN", "BTC", "ETH", "DOGE", "USDT"]
 FIATS = ["USD", "EUR", "AUD", "CAD", "ARS", "PLN"]
@@ -16,7 +22,102 @@ CRYPTOS = ["BTC", "ETH", "DOGE", "USDT"]
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-redis_client = redis.Redis(host="redis", port=6379, db=0)
+redis_client = redis.Redis.from_url(REDIS_URL)
+
+# All rates live in one hash: a version bumped by every refresh, the refresh time
+# and the USD value of every currency as a JSON vector in the order of "currencies".
+# The hash does not expire (the version must keep counting); readers ignore it after RATES_TTL_SECONDS.
+RATES_SNAPSHOT_KEY = "rates:snapshot"
+RATES_TTL_SECONDS = 3600
+
+# One pooled client per event loop of the app: its connections cannot be shared between loops
+_http_client: Optional[httpx.AsyncClient] = None
+_http_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+async def new_http_client() -> httpx.AsyncClient:
+    # Building the client loads the TLS certificates, which would block the event loop
+    return await asyncio.to_thread(
+        httpx.AsyncClient,
+        headers=HEADERS,
+        timeout=10.0,
+        limits=httpx.Limits(max_connections=len(FIATS), max_keepalive_connections=len(FIATS)),
+    )
+
+
+async def get_http_client() -> httpx.AsyncClient:
+    global _http_client, _http_client_loop
+    loop = asyncio.get_running_loop()
+    if _http_client is None or _http_client_loop is not loop:
+        _http_client = await new_http_client()
+        _http_client_loop = loop
+    return _http_client
+
+
+async def _get_quotes(client: httpx.AsyncClient, params: Dict[str, str]) -> dict:
+    resp = await client.get(BASE_URL, params=params)
+    resp.raise_for_status()
+    return resp.json()["data"]
+
+
+async def _get_fiat_to_usd(client: httpx.AsyncClient, fiat: str) -> float:
+    # Fiat conversion rate via USDT
+    data = await _get_quotes(client, {"symbol": "USDT", "convert": fiat})
+    price = data["USDT"]["quote"][fiat]["price"]
+    return 0 if price == 0 else 1 / price
+
+
+async def fetch_usd_values(client: Optional[httpx.AsyncClient] = None) -> Dict[str, float]:
+    """
+    Fetches the USD value of every currency from CoinMarketCap without blocking the event loop.
+    The crypto quotes and the fiat conversions are requested concurrently over one pooled client,
+    the loop's shared one unless `client` is given.
+    """
+    if client is None:
+        client = await get_http_client()
+    fiats = [fiat for fiat in FIATS if fiat != "USD"]
+    data, *fiat_values = await asyncio.gather(
+        _get_quotes(client, {"symbol": ",".join(CRYPTOS)}),
+        *[_get_fiat_to_usd(client, fiat) for fiat in fiats],
+    )
+    prices_usd = {sym: data[sym]["quote"]["USD"]["price"] for sym in CRYPTOS}
+    logger.info("Crypto prices retrieved: %s", prices_usd)
+    fiat_to_usd = {"USD": 1.0, **dict(zip(fiats, fiat_values))}
+    logger.info("Fiat rates retrieved: %s", fiat_to_usd)
+
+    # Combine rates
+    value_in_usd = {**fiat_to_usd, **prices_usd}
+    logger.info("Combined currency values: %s", value_in_usd)
+    return value_in_usd
+
+
+async def fetch_usd_values_once() -> Dict[str, float]:
+    """
+    fetch_usd_values over a client closed before returning, for callers that run their own short-lived loop.
+    """
+    async with await new_http_client() as client:
+        return await fetch_usd_values(client)
+
+
+def encode_snapshot(value_in_usd: Dict[str, float], updated: float) -> Dict[str, str]:
+    """
+    Returns the snapshot hash fields other than the version.
+    """
+    return {
+        "updated": repr(updated),
+        "currencies": ",".join(CURRENCIES),
+        "usd": json.dumps([value_in_usd.get(currency) for currency in CURRENCIES]),
+    }
+
+
+def queue_snapshot(pipe, fields: Dict[str, str]):
+    """
+    Queues the snapshot write on a Redis pipeline (sync or asyncio). Run in one MULTI/EXEC, readers see
+    either the old or the new snapshot; the first result of the pipeline is the new version.
+    """
+    pipe.hincrby(RATES_SNAPSHOT_KEY, "version", 1)
+    pipe.hset(RATES_SNAPSHOT_KEY, mapping=fields)
+    return pipe
 
 
 @celery_app.task
@@ -26,43 +127,35 @@ def update_rates():
     """
     logger.info("Started task for updating rates")
     try:
-        # Retrieve crypto prices in USD
-        params = {"symbol": ",".join(CRYPTOS)}
-        resp = httpx.get(BASE_URL, params=params, headers=HEADERS, timeout=10.0)
-        resp.raise_for_status()
-        data = resp.json()["data"]
-        prices_usd = {sym: data[sym]["quote"]["USD"]["price"] for sym in CRYPTOS}
-        logger.info("Crypto prices retrieved: %s", prices_usd)
-
-        # Retrieve fiat conversion rates (via USDT)
-        fiat_to_usd = {"USD": 1.0}
-        for fiat in FIATS:
-            if fiat == "USD":
-                continue
-            params = {"symbol": "USDT", "convert": fiat}
-            resp = httpx.get(BASE_URL, params=params, headers=HEADERS, timeout=10.0)
-            resp.raise_for_status()
-            price = resp.json()["data"]["USDT"]["quote"][fiat]["price"]
-            fiat_to_usd[fiat] = 0 if price == 0 else 1 / price
-        logger.info("Fiat rates retrieved: %s", fiat_to_usd)
-
-        # Combine rates and calculate conversions
-        value_in_usd = {**fiat_to_usd, **prices_usd}
-        logger.info("Combined currency values: %s", value_in_usd)
-
-        for base in CURRENCIES:
-            rates = {}
-            for target in CURRENCIES:
-                if target == base or base not in value_in_usd or target not in value_in_usd:
-                    continue
-                rate = value_in_usd[base] / value_in_usd[target]
-                rates[target] = rate
-            # Cache the conversion rates with a TTL of 3600 seconds
-            cache_key = f"rates:{base}"
-            redis_client.setex(cache_key, 3600, json.dumps(rates))
-            logger.info("Rates saved for %s: %s", base, rates)
+        # asyncio.run makes a new loop every run, so the client must not outlive it
+        value_in_usd = asyncio.run(fetch_usd_values_once())
+        updated = time.time()
+        with redis_client.pipeline() as pipe:
+            version = queue_snapshot(pipe, encode_snapshot(value_in_usd, updated)).execute()[0]
+        logger.info("Rates snapshot %s saved", version)
+        asyncio.run(save_rates(datetime.fromtimestamp(updated, timezone.utc), version, value_in_usd))
         logger.info("Rate update task completed successfully.")
         return "Success"
     except Exception as e:
         logger.error("Error while updating rates: %s", e)
         return "Failed"
+
+
+async def benchmark(runs: int) -> None:
+    timings = []
+    async with await new_http_client() as client:
+        for _ in range(runs):
+            start = time.perf_counter()
+            await fetch_usd_values(client)
+            timings.append(time.perf_counter() - start)
+    timings.sort()
+    print(f"{runs} refreshes: median {timings[len(timings) // 2] * 1000:.1f} ms, max {timings[-1] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the rate refresh latency (set COINMARKETCAP_BASE_URL).")
+    parser.add_argument("--runs", type=int, default=20, help="Number of refreshes")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    asyncio.run(benchmark(args.runs))
@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Dict, List
+
+import pytest
+
+from app.db.sessions import async_session_maker
+from app.schemas.enums import CurrencyEnum, TransactionTypeEnum
+from app.schemas.transaction_schemas import RequestTransactionModel
+from app.services.balance_snapshot_service import (get_balances_as_of,
+                                                   take_balance_snapshot)
+from app.services.balance_stripe_service import set_balance_stripes
+from app.services.exchange_service import create_exchange_transaction
+from app.services.transaction_service import (create_transaction,
+                                              patch_rollback_transaction)
+from app.tests.utils import create_users, get_balance, store_rates
+
+
+async def _as_of(user_id: int, as_of: datetime) -> Dict[CurrencyEnum, Decimal]:
+    async with async_session_maker() as session:
+        balances = await get_balances_as_of(session, user_id, as_of)
+    return {balance.currency: Decimal(balance.amount) for balance in balances}
+
+
+async def _current(user_id: int) -> Dict[CurrencyEnum, Decimal]:
+    return {currency: Decimal(await get_balance(user_id, currency)) for currency in CurrencyEnum}
+
+
+async def _move_money(user_ids: List[int]) -> None:
+    payer, merchant, other = user_ids
+    store_rates({currency.value: 1.0 for currency in CurrencyEnum})
+    requests = [
+        (payer, RequestTransactionModel(type=TransactionTypeEnum.DEPOSIT, currency=CurrencyEnum.USD, amount=50)),
+        (payer, RequestTransactionModel(type=TransactionTypeEnum.WITHDRAWAL, currency=CurrencyEnum.EUR, amount=30)),
+        (
+            payer,
+            RequestTransactionModel(
+                type=TransactionTypeEnum.TRANSFER, currency=CurrencyEnum.USD, amount=70, recipient_id=merchant
+            ),
+        ),
+        (
+            other,
+            RequestTransactionModel(
+                type=TransactionTypeEnum.TRANSFER, currency=CurrencyEnum.USD, amount=5, recipient_id=merchant
+            ),
+        ),
+    ]
+    transaction_ids = []
+    for sender_id, request in requests:
+        async with async_session_maker() as session:
+            transaction_ids.append((await create_transaction(session, sender_id, request)).id)
+    async with async_session_maker() as session:
+        await create_exchange_transaction(session, other, CurrencyEnum.USD, CurrencyEnum.EUR, 20)
+    async with async_session_maker() as session:
+        await patch_rollback_transaction(transaction_ids[1], session)
+
+
+async def test_balances_as_of_now_equal_the_current_balances(db):
+    # Seeded balances never went through a transaction: the as-of balances must still include them
+    user_ids = await create_users(3, amount=Decimal(1000))
+    async with async_session_maker() as session:
+        await set_balance_stripes(session, user_ids[1], 4)
+    snapshot_at = datetime.now(timezone.utc) - timedelta(hours=1)
+
+    await _move_money(user_ids)
+    for user_id in user_ids:
+        assert await _as_of(user_id, datetime.now(timezone.utc)) == await _current(user_id)
+        assert set((await _as_of(user_id, snapshot_at)).values()) == {Decimal(1000)}
+
+    async with async_session_maker() as session:
+        assert await take_balance_snapshot(session, snapshot_at) == 3 * len(CurrencyEnum)
+    await _move_money(user_ids)
+    for user_id in user_ids:
+        assert await _as_of(user_id, datetime.now(timezone.utc)) == await _current(user_id)
+        assert set((await _as_of(user_id, snapshot_at)).values()) == {Decimal(1000)}
+
+
+async def test_snapshot_waits_for_transactions_still_committing(db):
+    async with async_session_maker() as session:
+        with pytest.raises(ValueError):
+            await take_balance_snapshot(session, datetime.now(timezone.utc) - timedelta(seconds=1))
@@ -0,0 +1,82 @@
+import asyncio
+import time
+from decimal import Decimal
+
+from sqlalchemy import select
+
+from app.db.sessions import async_session_maker
+from app.models.db_models import BalanceStripe
+from app.schemas.enums import CurrencyEnum, TransactionTypeEnum
+from app.schemas.transaction_schemas import (BatchTransactionRowModel,
+                                             RequestTransactionModel)
+from app.services import transaction_service
+from app.services.balance_stripe_service import set_balance_stripes
+from app.services.transaction_service import (create_transaction,
+                                              create_transactions_batch)
+from app.tests.utils import create_users, get_balance
+
+CONCURRENCY = 32
+TRANSFERS = 200
+# Time each transaction keeps its row locks after the credit, standing in for the round trips to a remote database
+HOLD_SECONDS = 0.02
+
+
+async def _pay_merchant(payer_ids: list, merchant_id: int) -> float:
+    """
+    Sends TRANSFERS transfers of 1 USD from the payers to the merchant through create_transaction,
+    CONCURRENCY at a time. Returns the transfers per second.
+    """
+    slots = asyncio.Semaphore(CONCURRENCY)
+
+    async def pay(payer_id: int) -> None:
+        async with slots, async_session_maker() as session:
+            await create_transaction(
+                session,
+                payer_id,
+                RequestTransactionModel(
+                    type=TransactionTypeEnum.TRANSFER, currency=CurrencyEnum.USD, amount=1, recipient_id=merchant_id
+                ),
+            )
+
+    started = time.perf_counter()
+    await asyncio.gather(*[pay(payer_ids[i % len(payer_ids)]) for i in range(TRANSFERS)])
+    return TRANSFERS / (time.perf_counter() - started)
+
+
+async def test_striped_merchant_takes_concurrent_transfers_faster(db, monkeypatch):
+    apply_to_rollup = transaction_service.apply_transaction_to_rollup
+
+    async def slow_apply_to_rollup(session, transaction):
+        await asyncio.sleep(HOLD_SECONDS)
+        await apply_to_rollup(session, transaction)
+
+    monkeypatch.setattr(transaction_service, "apply_transaction_to_rollup", slow_apply_to_rollup)
+    merchant_id, *payer_ids = await create_users(41)
+
+    plain_rate = await _pay_merchant(payer_ids, merchant_id)
+    async with async_session_maker() as session:
+        await set_balance_stripes(session, merchant_id, 16)
+    striped_rate = await _pay_merchant(payer_ids, merchant_id)
+
+    print(f"{TRANSFERS} transfers to one merchant: plain {plain_rate:.0f}/s, 16 stripes {striped_rate:.0f}/s")
+    assert await get_balance(merchant_id) == 1000 + 2 * TRANSFERS
+    assert striped_rate > plain_rate
+
+
+async def test_batch_deposits_do_not_lock_the_stripes(db):
+    (merchant_id,) = await create_users(1)
+    async with async_session_maker() as session:
+        await set_balance_stripes(session, merchant_id, 4)
+
+    async with async_session_maker() as holder:
+        # E.g. a debit of the merchant sweeping its stripes, not committed yet
+        await holder.execute(select(BalanceStripe).where(BalanceStripe.user_id == merchant_id).with_for_update())
+        async with async_session_maker() as session:
+            row = BatchTransactionRowModel(
+                user_id=merchant_id, currency=CurrencyEnum.USD, amount=10, type=TransactionTypeEnum.DEPOSIT
+            )
+            response = await asyncio.wait_for(create_transactions_batch(session, [row]), timeout=5)
+        await holder.rollback()
+
+    assert response.accepted == 1
+    assert await get_balance(merchant_id) == Decimal(1010)
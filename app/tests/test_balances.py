@@ -0,0 +1,109 @@
+import asyncio
+from decimal import Decimal
+
+from app.db.sessions import async_session_maker
+from app.exceptions.exceptions import (NegativeBalanceException,
+                                       TransactionAlreadyRollbackedException)
+from app.schemas.enums import CurrencyEnum, TransactionTypeEnum
+from app.schemas.transaction_schemas import RequestTransactionModel
+from app.services.exchange_service import create_exchange_transaction
+from app.services.transaction_service import (create_transaction,
+                                              patch_rollback_transaction)
+from app.tests.utils import create_users, get_balance, store_rates
+
+
+async def _run(operation, *args):
+    """
+    Runs one operation in its own session; returns True if it succeeded and False if it was refused for funds.
+    """
+    async with async_session_maker() as session:
+        try:
+            return await operation(session, *args)
+        except NegativeBalanceException:
+            return False
+
+
+async def test_concurrent_debits_never_overdraw(db):
+    store_rates({currency.value: 1.0 for currency in CurrencyEnum})
+    (user_id,) = await create_users(1, amount=Decimal(100))
+
+    async def withdraw(session):
+        await create_transaction(
+            session,
+            user_id,
+            RequestTransactionModel(type=TransactionTypeEnum.WITHDRAWAL, currency=CurrencyEnum.USD, amount=10),
+        )
+        return True
+
+    async def exchange(session):
+        await create_exchange_transaction(session, user_id, CurrencyEnum.USD, CurrencyEnum.EUR, 10)
+        return True
+
+    results = await asyncio.gather(*[_run(withdraw if i % 2 else exchange) for i in range(40)])
+
+    assert sum(results) == 10
+    assert await get_balance(user_id, CurrencyEnum.USD) == 0
+    exchanged = sum(result for i, result in enumerate(results) if not i % 2)
+    assert await get_balance(user_id, CurrencyEnum.EUR) == 100 + 10 * exchanged
+
+
+async def test_concurrent_rollbacks_never_overdraw(db):
+    (user_id,) = await create_users(1, amount=Decimal(0))
+    deposit_ids = []
+    for _ in range(4):
+        async with async_session_maker() as session:
+            deposit = await create_transaction(
+                session,
+                user_id,
+                RequestTransactionModel(type=TransactionTypeEnum.DEPOSIT, currency=CurrencyEnum.USD, amount=25),
+            )
+            deposit_ids.append(deposit.id)
+
+    async def withdraw(session):
+        await create_transaction(
+            session,
+            user_id,
+            RequestTransactionModel(type=TransactionTypeEnum.WITHDRAWAL, currency=CurrencyEnum.USD, amount=25),
+        )
+        return True
+
+    async def rollback(session, transaction_id):
+        await patch_rollback_transaction(transaction_id, session)
+        return True
+
+    # Reversing a deposit debits it back, so it competes with the withdrawals for the same 100
+    results = await asyncio.gather(
+        *[_run(rollback, transaction_id) for transaction_id in deposit_ids], *[_run(withdraw) for _ in range(4)]
+    )
+
+    assert sum(results) == 4
+    assert await get_balance(user_id, CurrencyEnum.USD) == 0
+
+
+async def test_concurrent_rollbacks_of_one_transaction_revert_once(db):
+    (user_id,) = await create_users(1, amount=Decimal(0))
+    async with async_session_maker() as session:
+        deposit = await create_transaction(
+            session,
+            user_id,
+            RequestTransactionModel(type=TransactionTypeEnum.DEPOSIT, currency=CurrencyEnum.USD, amount=25),
+        )
+        deposit_id = deposit.id
+    async with async_session_maker() as session:
+        await create_transaction(
+            session,
+            user_id,
+            RequestTransactionModel(type=TransactionTypeEnum.DEPOSIT, currency=CurrencyEnum.USD, amount=75),
+        )
+
+    async def rollback(session):
+        try:
+            await patch_rollback_transaction(deposit_id, session)
+        except TransactionAlreadyRollbackedException:
+            return False
+        return True
+
+    results = await asyncio.gather(*[_run(rollback) for _ in range(8)])
+
+    assert sum(results) == 1
+    assert await get_balance(user_id, CurrencyEnum.USD) == 75
@@ -0,0 +1,91 @@
+import time
+import tracemalloc
+from datetime import date, timedelta
+from io import BytesIO
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.utils import get_column_letter
+
+from app.services.analysis_service import (EXCEL_SHEETS, _column_widths,
+                                           generate_excel_file,
+                                           iter_excel_report)
+
+
+def _report(weeks: int) -> list:
+    report = []
+    start = date(2020, 1, 6)
+    for i in range(weeks):
+        week_start = start + timedelta(weeks=i)
+        report.append(
+            {
+                "week_start": week_start.isoformat(),
+                "week_end": (week_start + timedelta(days=6)).isoformat(),
+                "new_users": i,
+                "sum_deposits": i * 10.5,
+                "sum_deposits_usd": i * 11.25,
+                "total_transactions": i * 3,
+                "conversions": {"USD_to_EUR": {"count": i, "sum_amount": i * 2.5}} if i % 2 else {},
+                "dynamics": {"new_users": {"delta": 1, "pct_change": 0.5}} if i else {},
+            }
+        )
+    return report
+
+
+def _in_memory_workbook(report_data: list) -> bytes:
+    """
+    The regular-mode workbook the report used to be built with, kept as the reference.
+    """
+    wb = Workbook()
+    wb.remove(wb.active)
+    for title, rows in EXCEL_SHEETS:
+        ws = wb.create_sheet(title=title)
+        for row in rows(report_data):
+            ws.append(row)
+        for index, width in enumerate(_column_widths(rows(report_data)), start=1):
+            ws.column_dimensions[get_column_letter(index)].width = width
+    buffer = BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def _measure(func, *args):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = func(*args)
+    seconds = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def _sheets(content: bytes) -> dict:
+    wb = load_workbook(BytesIO(content))
+    return {
+        ws.title: (
+            [[cell.value for cell in row] for row in ws.rows],
+            {key: dimension.width for key, dimension in ws.column_dimensions.items()},
+        )
+        for ws in wb.worksheets
+    }
+
+
+def test_write_only_excel_matches_in_memory_workbook_with_less_memory():
+    report = _report(1040)
+
+    expected, reference_seconds, reference_peak = _measure(_in_memory_workbook, report)
+    content, seconds, peak = _measure(generate_excel_file, report)
+
+    assert _sheets(content) == _sheets(expected)
+    print(
+        f"1040 weeks: in-memory {reference_seconds:.3f}s peak {reference_peak / 1e6:.1f}MB, "
+        f"write-only {seconds:.3f}s peak {peak / 1e6:.1f}MB"
+    )
+    assert peak < reference_peak
+
+
+def test_streamed_excel_has_the_generated_content():
+    report = _report(52)
+    chunks = list(iter_excel_report(report, chunk_size=4096))
+    assert all(len(chunk) <= 4096 for chunk in chunks)
+    # Byte equality would depend on the creation time stored in the file
+    assert _sheets(b"".join(chunks)) == _sheets(generate_excel_file(report))
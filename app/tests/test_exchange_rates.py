@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+import pytest
+
+from app.exceptions.exceptions import CurrencyRateFetchException
+from app.services import exchange_service
+from app.services.exchange_service import get_rate_snapshot
+from app.tasks import update_rates
+from app.tasks.update_rates import (CRYPTOS, FIATS, fetch_usd_values,
+                                    fetch_usd_values_once)
+
+REFRESH_SECONDS = 0.3
+TICK_SECONDS = 0.005
+
+
+async def _max_scheduling_lag(done: asyncio.Event) -> float:
+    """
+    Sleeps TICK_SECONDS in a loop until `done` is set; returns the longest overshoot of a tick.
+    """
+    lag = 0.0
+    while not done.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK_SECONDS)
+        lag = max(lag, time.perf_counter() - started - TICK_SECONDS)
+    return lag
+
+
+async def test_concurrent_misses_share_one_refresh_without_blocking_the_loop(db, monkeypatch):
+    refreshes = []
+
+    async def slow_fetch_usd_values():
+        refreshes.append(time.perf_counter())
+        await asyncio.sleep(REFRESH_SECONDS)
+        return {"USD": 1.0, "EUR": 1.1, "BTC": 60000.0}
+
+    monkeypatch.setattr(exchange_service, "fetch_usd_values", slow_fetch_usd_values)
+    done = asyncio.Event()
+    ticker = asyncio.create_task(_max_scheduling_lag(done))
+
+    started = time.perf_counter()
+    snapshots = await asyncio.gather(*[get_rate_snapshot() for _ in range(50)])
+    elapsed = time.perf_counter() - started
+    done.set()
+    lag = await ticker
+
+    print(f"50 misses in {elapsed * 1000:.0f} ms, longest scheduling lag {lag * 1000:.1f} ms")
+    assert len(refreshes) == 1
+    assert len({snapshot.version for snapshot in snapshots}) == 1
+    assert elapsed < 2 * REFRESH_SECONDS
+    assert lag < REFRESH_SECONDS / 4
+
+
+async def test_fetch_requests_all_quotes_at_once(cmc_stub):
+    cmc_stub.delay = REFRESH_SECONDS
+    started = time.perf_counter()
+    value_in_usd = await fetch_usd_values()
+    elapsed = time.perf_counter() - started
+
+    # One crypto request and one per fiat besides USD
+    assert cmc_stub.peak == len(FIATS)
+    assert elapsed < 2 * REFRESH_SECONDS
+    assert set(value_in_usd) == set(CRYPTOS) | set(FIATS)
+    assert value_in_usd["BTC"] == 60000.0
+    assert value_in_usd["EUR"] == pytest.approx(1 / 0.9)
+
+
+async def test_quote_errors_surface_as_rate_fetch_errors(db, cmc_stub):
+    cmc_stub.status = 500
+    with pytest.raises(CurrencyRateFetchException):
+        await get_rate_snapshot()
+
+    cmc_stub.status = None
+    assert (await get_rate_snapshot()).usd_values["BTC"] == 60000
+
+
+async def test_task_fetch_closes_its_client(cmc_stub, monkeypatch):
+    clients = []
+    new_http_client = update_rates.new_http_client
+
+    async def recording_new_http_client():
+        clients.append(await new_http_client())
+        return clients[-1]
+
+    monkeypatch.setattr(update_rates, "new_http_client", recording_new_http_client)
+    assert (await fetch_usd_values_once())["BTC"] == 60000.0
+    assert len(clients) == 1 and clients[0].is_closed
@@ -0,0 +1,109 @@
+import asyncio
+import random
+import time
+from decimal import Decimal
+from typing import List, Tuple
+
+from sqlalchemy import event
+
+from app.db.sessions import async_session_maker, engine
+from app.schemas.auth_schemas import PrincipalModel
+from app.schemas.enums import (CurrencyEnum, TransactionTypeEnum, UserRoleEnum,
+                               UserStatusEnum)
+from app.schemas.transaction_schemas import RequestTransactionModel
+from app.services.transaction_service import (create_transaction,
+                                              create_transaction_grouped)
+from app.tests.utils import create_users, get_balance
+
+CONCURRENCY = 64
+REQUESTS = 1000
+
+
+def _principal(user_id: int) -> PrincipalModel:
+    return PrincipalModel(id=user_id, role=UserRoleEnum.USER, status=UserStatusEnum.ACTIVE)
+
+
+def _requests(user_ids: List[int]) -> List[Tuple[int, RequestTransactionModel]]:
+    rng = random.Random(17)
+    requests = []
+    for _ in range(REQUESTS):
+        sender_id, recipient_id = rng.sample(user_ids, 2)
+        if rng.random() < 0.7:
+            data = RequestTransactionModel(
+                type=TransactionTypeEnum.TRANSFER, currency=CurrencyEnum.USD, amount=1, recipient_id=recipient_id
+            )
+        else:
+            data = RequestTransactionModel(type=TransactionTypeEnum.DEPOSIT, currency=CurrencyEnum.USD, amount=1)
+        requests.append((sender_id, data))
+    return requests
+
+
+async def _load(create, requests: List[Tuple[int, RequestTransactionModel]]) -> Tuple[float, float]:
+    """
+    Sends the requests CONCURRENCY at a time; returns the requests per second and the p99 latency in seconds.
+    """
+    latencies = []
+    slots = asyncio.Semaphore(CONCURRENCY)
+
+    async def send(sender_id: int, data: RequestTransactionModel) -> None:
+        async with slots:
+            started = time.perf_counter()
+            await create(sender_id, data)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[send(sender_id, data) for sender_id, data in requests])
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return len(requests) / elapsed, latencies[int(len(latencies) * 0.99)]
+
+
+async def test_group_commit_outpaces_single_commits(db):
+    user_ids = await create_users(100)
+    requests = _requests(user_ids)
+
+    async def single(sender_id: int, data: RequestTransactionModel) -> None:
+        async with async_session_maker() as session:
+            await create_transaction(session, sender_id, data, _principal(sender_id))
+
+    async def grouped(sender_id: int, data: RequestTransactionModel) -> None:
+        await create_transaction_grouped(sender_id, data, _principal(sender_id))
+
+    single_rate, single_p99 = await _load(single, requests)
+    grouped_rate, grouped_p99 = await _load(grouped, requests)
+
+    print(
+        f"{REQUESTS} requests at concurrency {CONCURRENCY}: single {single_rate:.0f}/s p99 {single_p99 * 1000:.0f} ms, "
+        f"grouped {grouped_rate:.0f}/s p99 {grouped_p99 * 1000:.0f} ms"
+    )
+    deposits = sum(data.type == TransactionTypeEnum.DEPOSIT for _, data in requests)
+    balances = [await get_balance(user_id) for user_id in user_ids]
+    assert sum(balances) == 1000 * len(user_ids) + 2 * deposits
+    assert grouped_rate > single_rate
+    assert grouped_p99 < single_p99
+
+
+async def test_group_commit_does_not_query_the_resolved_sender(db):
+    user_ids = await create_users(10, amount=Decimal(0))
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        await asyncio.gather(
+            *[
+                create_transaction_grouped(
+                    user_id,
+                    RequestTransactionModel(type=TransactionTypeEnum.DEPOSIT, currency=CurrencyEnum.USD, amount=1),
+                    _principal(user_id),
+                )
+                for user_id in user_ids
+            ]
+        )
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+    assert not [statement for statement in statements if 'FROM "user"' in statement]
+    assert [await get_balance(user_id) for user_id in user_ids] == [1] * len(user_ids)
@@ -0,0 +1,100 @@
+from datetime import datetime
+from datetime import time as time_of_day
+from datetime import timedelta, timezone
+from decimal import Decimal
+
+from app.db.sessions import async_session_maker
+from app.models.db_models import Transaction
+from app.schemas.enums import (CurrencyEnum, TransactionStatusEnum,
+                               TransactionTypeEnum)
+from app.services import bucket_cache_service
+from app.services.analysis_service import get_report_window
+from app.services.transaction_service import patch_rollback_transaction
+from app.tests.utils import create_users
+
+# Three closed weeks, so every bucket of the range can be cached
+START_DATE = get_report_window(3)
+END_DATE = get_report_window(0) - timedelta(days=1)
+CREATED = datetime.combine(START_DATE + timedelta(days=2), time_of_day(12), tzinfo=timezone.utc)
+
+
+async def _deposit() -> Transaction:
+    (user_id,) = await create_users(1)
+    async with async_session_maker() as session:
+        transaction = Transaction(
+            sender_id=user_id,
+            currency=CurrencyEnum.USD,
+            amount=Decimal(10),
+            type=TransactionTypeEnum.DEPOSIT,
+            status=TransactionStatusEnum.PROCESSED,
+            created=CREATED,
+        )
+        session.add(transaction)
+        await session.commit()
+        return transaction
+
+
+def _count_computations(monkeypatch) -> list:
+    computed = []
+    collect = bucket_cache_service.collect_buckets_metrics
+
+    async def counting(session, granularity, bucket_starts):
+        computed.extend(bucket_starts)
+        return await collect(session, granularity, bucket_starts)
+
+    monkeypatch.setattr(bucket_cache_service, "collect_buckets_metrics", counting)
+    return computed
+
+
+async def _get_weeks(client) -> list:
+    response = await client.get(
+        "/analysis/metrics", params={"start_date": START_DATE.isoformat(), "end_date": END_DATE.isoformat()}
+    )
+    assert response.status_code == 200
+    return response.json()["buckets"]
+
+
+async def test_closed_buckets_are_computed_once(db, client, monkeypatch):
+    await _deposit()
+    computed = _count_computations(monkeypatch)
+
+    first = await _get_weeks(client)
+    second = await _get_weeks(client)
+
+    assert len(computed) == 3
+    assert second == first
+    assert first[0]["completed_transactions"] == 1
+
+
+async def test_rollback_invalidates_the_cached_bucket(db, client, monkeypatch):
+    transaction = await _deposit()
+    computed = _count_computations(monkeypatch)
+    await _get_weeks(client)
+
+    async with async_session_maker() as session:
+        await patch_rollback_transaction(transaction.id, session)
+    weeks = await _get_weeks(client)
+
+    # Only the week of the rolled back transaction is computed again
+    assert computed == [START_DATE, START_DATE + timedelta(weeks=1), END_DATE - timedelta(days=6), START_DATE]
+    assert weeks[0]["completed_transactions"] == 0
+
+
+async def test_bucket_computed_before_an_invalidation_is_not_served(db, client, monkeypatch):
+    await _deposit()
+    collect = bucket_cache_service.collect_buckets_metrics
+    computed = []
+
+    async def invalidated_meanwhile(session, granularity, bucket_starts):
+        metrics = await collect(session, granularity, bucket_starts)
+        computed.extend(bucket_starts)
+        # A rollback committed after the read but before the write of the cache
+        await bucket_cache_service.invalidate_buckets_for(CREATED)
+        return metrics
+
+    monkeypatch.setattr(bucket_cache_service, "collect_buckets_metrics", invalidated_meanwhile)
+    await _get_weeks(client)
+    await _get_weeks(client)
+
+    assert computed.count(START_DATE) == 2
+    assert computed.count(END_DATE - timedelta(days=6)) == 1
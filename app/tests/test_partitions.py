@@ -0,0 +1,100 @@
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import text
+
+from app.db.partitions import (DEFAULT_PARTITION,
+                               convert_transaction_table_to_partitioned,
+                               create_transaction_partition,
+                               detach_transaction_partitions,
+                               ensure_transaction_partitions,
+                               is_transaction_table_partitioned,
+                               list_transaction_partitions, partition_name)
+from app.db.sessions import engine
+from app.tests.utils import create_users
+
+# The transaction table as it was before partitioning
+LEGACY_TABLE = """
+CREATE TABLE "transaction" (
+    id SERIAL PRIMARY KEY,
+    sender_id INTEGER NOT NULL REFERENCES "user" (id),
+    recipient_id INTEGER REFERENCES "user" (id),
+    currency VARCHAR(8) NOT NULL,
+    amount NUMERIC(12, 6) NOT NULL,
+    type VARCHAR(16) NOT NULL,
+    from_currency VARCHAR(8),
+    to_currency VARCHAR(8),
+    status VARCHAR(16) NOT NULL,
+    created TIMESTAMP WITH TIME ZONE
+)
+"""
+
+
+async def _insert(conn, sender_id: int, created: datetime) -> int:
+    result = await conn.execute(
+        text(
+            'INSERT INTO "transaction" (sender_id, currency, amount, type, status, created)'
+            " VALUES (:sender_id, 'USD', 1, 'DEPOSIT', 'PROCESSED', :created) RETURNING id"
+        ),
+        {"sender_id": sender_id, "created": created},
+    )
+    return result.scalar()
+
+
+async def _ids(conn, table: str) -> list:
+    return list((await conn.execute(text(f'SELECT id FROM "{table}" ORDER BY id'))).scalars())
+
+
+async def test_convert_then_detach_round_trip(db):
+    (user_id,) = await create_users(1)
+    this_month = datetime.now(timezone.utc).replace(day=1, hour=12, minute=0, second=0, microsecond=0)
+    old_month = (this_month - timedelta(days=70)).replace(day=1)
+    created = [old_month, old_month + timedelta(days=3), this_month - timedelta(days=1), this_month]
+
+    # DDL is transactional: the legacy table only exists inside this transaction
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        try:
+            await conn.execute(text('DROP TABLE "transaction" CASCADE'))
+            await conn.execute(text(LEGACY_TABLE))
+            legacy_ids = [await _insert(conn, user_id, moment) for moment in created]
+            assert not await is_transaction_table_partitioned(conn)
+            # The app refuses to start until the table is converted
+            with pytest.raises(RuntimeError):
+                await ensure_transaction_partitions(conn)
+
+            assert await convert_transaction_table_to_partitioned(conn) == len(created)
+            assert await is_transaction_table_partitioned(conn)
+            assert await _ids(conn, "transaction") == legacy_ids
+            months = [month for _, month in await list_transaction_partitions(conn)]
+            assert months[0] == old_month.date()
+            # The id sequence continues after the copied ids
+            new_id = await _insert(conn, user_id, this_month)
+            assert new_id == legacy_ids[-1] + 1
+
+            detached = await detach_transaction_partitions(conn, this_month.date())
+            assert detached == [partition_name(month) for month in months if month < this_month.date()]
+            assert await _ids(conn, partition_name(old_month.date())) == legacy_ids[:2]
+            assert await _ids(conn, "transaction") == [legacy_ids[3], new_id]
+        finally:
+            await transaction.rollback()
+
+
+async def test_rows_outside_every_month_go_to_the_default_partition(db):
+    (user_id,) = await create_users(1)
+    far_future = date.today().replace(day=1) + timedelta(days=3660)
+
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        try:
+            created = datetime.combine(far_future, datetime.min.time(), timezone.utc)
+            transaction_id = await _insert(conn, user_id, created)
+            assert await _ids(conn, DEFAULT_PARTITION) == [transaction_id]
+
+            # Creating the month later moves its rows out of the default partition
+            await create_transaction_partition(conn, far_future)
+            assert await _ids(conn, DEFAULT_PARTITION) == []
+            assert await _ids(conn, partition_name(far_future.replace(day=1))) == [transaction_id]
+            assert await _ids(conn, "transaction") == [transaction_id]
+        finally:
+            await transaction.rollback()
@@ -0,0 +1,70 @@
+from typing import List, Tuple
+
+from sqlalchemy import event, update
+
+from app.db.sessions import async_session_maker, engine
+from app.models.db_models import User
+from app.schemas.auth_schemas import PrincipalModel
+from app.schemas.enums import UserStatusEnum
+from app.services import principal_service
+from app.services.principal_service import get_principal, invalidate_principal
+from app.tests.utils import create_users
+
+
+async def _principal_with_query_count(user_id: int) -> Tuple[PrincipalModel, int]:
+    statements: List[str] = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count)
+    try:
+        async with async_session_maker() as session:
+            principal = await get_principal(session, user_id)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", count)
+    return principal, len(statements)
+
+
+async def _block(user_id: int) -> None:
+    async with async_session_maker() as session:
+        await session.execute(update(User).where(User.id == user_id).values(status=UserStatusEnum.BLOCKED))
+        await session.commit()
+    await invalidate_principal(user_id)
+
+
+async def test_principal_is_queried_once_until_invalidated(db):
+    (user_id,) = await create_users(1)
+
+    assert (await _principal_with_query_count(user_id))[1] == 1
+    assert (await _principal_with_query_count(user_id))[1] == 0
+    # Another process: nothing in-process, served from Redis
+    principal_service._principals.clear()
+    assert (await _principal_with_query_count(user_id))[1] == 0
+
+    await _block(user_id)
+    principal, queries = await _principal_with_query_count(user_id)
+    assert (principal.status, queries) == (UserStatusEnum.BLOCKED, 1)
+    assert (await _principal_with_query_count(user_id))[1] == 0
+
+
+async def test_lookup_racing_an_invalidation_does_not_cache_the_old_status(db):
+    (user_id,) = await create_users(1)
+
+    async with async_session_maker() as session:
+        execute = session.execute
+
+        async def execute_then_block(*args, **kwargs):
+            # The user is blocked after the lookup read the row and before it caches it
+            result = await execute(*args, **kwargs)
+            await _block(user_id)
+            return result
+
+        session.execute = execute_then_block
+        assert (await get_principal(session, user_id)).status == UserStatusEnum.ACTIVE
+
+    principal, queries = await _principal_with_query_count(user_id)
+    assert (principal.status, queries) == (UserStatusEnum.BLOCKED, 1)
+    principal_service._principals.clear()
+    principal, queries = await _principal_with_query_count(user_id)
+    assert (principal.status, queries) == (UserStatusEnum.BLOCKED, 0)
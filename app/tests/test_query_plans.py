@@ -0,0 +1,74 @@
+import json
+from datetime import timedelta
+from typing import Any, Dict, Iterator
+
+import pytest
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects import postgresql
+
+from app.db.filters import created_between
+from app.db.partitions import partition_name
+from app.db.sessions import async_session_maker
+from app.models.db_models import Transaction, User
+from app.schemas.enums import TransactionTypeEnum
+from app.services.analysis_service import get_report_window
+from app.tests.utils import seed_history
+
+
+def _plan_nodes(node: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield node
+    for child in node.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+async def _explain(query) -> list:
+    sql = str(query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    async with async_session_maker() as session:
+        # The seeded tables are small enough for sequential scans to win on cost;
+        # with them disabled a seq scan is only chosen when the predicate cannot use an index
+        await session.execute(text("SET LOCAL enable_seqscan = off"))
+        plan = (await session.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return list(_plan_nodes(plan[0]["Plan"]))
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        pytest.param(
+            lambda start, end: select(func.sum(Transaction.amount)).where(
+                created_between(Transaction.created, start, end), Transaction.type == TransactionTypeEnum.DEPOSIT
+            ),
+            id="transaction-sum",
+        ),
+        pytest.param(
+            lambda start, end: select(func.count()).select_from(User).where(created_between(User.created, start, end)),
+            id="new-users",
+        ),
+    ],
+)
+async def test_week_range_uses_index(db, query):
+    await seed_history()
+    async with async_session_maker() as session:
+        await session.execute(text("ANALYZE"))
+        await session.commit()
+
+    start = get_report_window(4)
+    nodes = await _explain(query(start, start + timedelta(days=6)))
+
+    # The range must be an index condition, not a filter over a full index scan
+    assert any("created" in node.get("Index Cond", "") for node in nodes)
+    assert not [node["Relation Name"] for node in nodes if node["Node Type"] == "Seq Scan"]
+
+
+async def test_week_range_scans_only_its_monthly_partitions(db):
+    # A week that straddles two months, so both partitions are expected and every other one pruned
+    start = get_report_window(0).replace(day=1) - timedelta(days=3)
+    end = start + timedelta(days=6)
+    query = select(func.count()).select_from(Transaction).where(created_between(Transaction.created, start, end))
+
+    nodes = await _explain(query)
+
+    scanned = {node["Relation Name"] for node in nodes if "Relation Name" in node}
+    assert scanned == {partition_name(start.replace(day=1)), partition_name(end.replace(day=1))}
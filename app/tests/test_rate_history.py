@@ -0,0 +1,98 @@
+import asyncio
+import random
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select
+
+from app.db.filters import utc_day
+from app.db.sessions import async_session_maker
+from app.models.db_models import RateHistory, Transaction
+from app.schemas.enums import CurrencyEnum, TransactionTypeEnum
+from app.services import rate_history_service
+from app.services.rate_history_service import (FALLBACK_RATES_TO_USD,
+                                               get_rate_history, save_rates,
+                                               usd_totals)
+from app.tests.utils import SEED_DAYS, seed_history
+
+
+async def _record_refreshes(count: int, start: datetime, days: float, seed: int) -> None:
+    """
+    `count` refreshes at random times in the `days` after start; DOGE is never refreshed and keeps its fallback rate.
+    """
+    rng = random.Random(seed)
+    for _ in range(count):
+        recorded_at = start + timedelta(days=rng.uniform(0, days))
+        values = {
+            currency.value: FALLBACK_RATES_TO_USD[currency] * rng.uniform(0.5, 1.5)
+            for currency in CurrencyEnum
+            if currency != CurrencyEnum.DOGE
+        }
+        await save_rates(recorded_at, None, values)
+
+
+async def _expected_totals(start: date, end: date) -> dict:
+    """
+    The deposits of start..end converted one by one at the rate recorded last before each, summed by week.
+    """
+    async with async_session_maker() as session:
+        rates = (await session.execute(select(RateHistory).order_by(RateHistory.recorded_at))).scalars().all()
+        transactions = (await session.execute(select(Transaction))).scalars().all()
+    history = defaultdict(list)
+    for rate in rates:
+        history[rate.currency].append((rate.recorded_at, float(rate.usd_value)))
+
+    def rate_at(currency: CurrencyEnum, moment: datetime) -> float:
+        series = history.get(currency)
+        if not series:
+            return FALLBACK_RATES_TO_USD[currency]
+        index = bisect_right([recorded_at for recorded_at, _ in series], moment)
+        return series[max(index - 1, 0)][1]
+
+    totals = defaultdict(float)
+    for t in transactions:
+        day = utc_day(t.created)
+        if t.type == TransactionTypeEnum.DEPOSIT and start <= day <= end:
+            totals[day - timedelta(days=day.weekday())] += float(t.amount) * rate_at(t.currency, t.created)
+    return totals
+
+
+async def test_usd_totals_match_row_by_row_conversion(db):
+    await seed_history()
+    await _record_refreshes(40, datetime.now(timezone.utc) - timedelta(days=SEED_DAYS), SEED_DAYS, seed=3)
+    end = date.today()
+    start = end - timedelta(days=SEED_DAYS)
+
+    async with async_session_maker() as session:
+        totals = await usd_totals(
+            session, start, end, Transaction.type == TransactionTypeEnum.DEPOSIT.value, granularity="week"
+        )
+    expected = await _expected_totals(start, end)
+
+    assert set(totals) == set(expected)
+    for week, amount in expected.items():
+        assert totals[week] == pytest.approx(amount)
+
+
+async def test_concurrent_loads_do_not_duplicate_rates(db):
+    now = datetime.now(timezone.utc)
+    await _record_refreshes(5, now - timedelta(days=1), 1, seed=3)
+    async with async_session_maker() as session:
+        await get_rate_history(session)
+    # Recorded after the loaded ones, as refreshes are
+    await _record_refreshes(5, now, 1, seed=4)
+
+    async def load() -> None:
+        async with async_session_maker() as session:
+            await get_rate_history(session)
+
+    await asyncio.gather(*[load() for _ in range(10)])
+
+    timeline = rate_history_service._history
+    assert {currency: len(timestamps) for currency, timestamps in timeline.timestamps.items()} == {
+        currency.value: 10 for currency in CurrencyEnum if currency != CurrencyEnum.DOGE
+    }
+    for timestamps in timeline.timestamps.values():
+        assert list(timestamps) == sorted(timestamps)
@@ -0,0 +1,130 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.celery import celery_app
+from app.db.cache import get_cache_client
+from app.services.report_service import (REPORT_GENERATED_AT_KEY,
+                                         REPORT_JSON_ETAG_KEY, REPORT_JSON_KEY,
+                                         REPORT_TASK_KEY, compress_report_body)
+from app.tests.utils import auth_headers, create_users
+
+BROKER_SECONDS = 0.3
+
+
+async def store_report(age: timedelta) -> str:
+    generated_at = datetime.now(timezone.utc) - age
+    body, etag = compress_report_body([{"week_start": "2026-01-05"}], generated_at)
+    await get_cache_client().mset(
+        {REPORT_JSON_KEY: body, REPORT_JSON_ETAG_KEY: etag, REPORT_GENERATED_AT_KEY: generated_at.isoformat()}
+    )
+    return etag
+
+
+async def test_stale_report_is_served_when_the_refresh_cannot_be_enqueued(client, monkeypatch):
+    def broker_down(*args, **kwargs):
+        raise ConnectionError("broker unavailable")
+
+    monkeypatch.setattr(celery_app, "send_task", broker_down)
+    await store_report(timedelta(days=1))
+
+    response = await client.get("/analysis/reports/weekly/json")
+
+    assert response.status_code == 200
+    assert response.headers["X-Report-Stale"] == "true"
+    assert "X-Report-Task-Id" not in response.headers
+    assert response.json()["report"] == [{"week_start": "2026-01-05"}]
+    # The single-flight lock is released, so the next request retries
+    assert await get_cache_client().get(REPORT_TASK_KEY) is None
+
+
+async def test_stale_report_starts_one_refresh(client, monkeypatch):
+    sent = []
+    monkeypatch.setattr(celery_app, "send_task", lambda name, task_id: sent.append(task_id))
+    await store_report(timedelta(days=1))
+
+    first = await client.get("/analysis/reports/weekly/json")
+    second = await client.get("/analysis/reports/weekly/json")
+
+    assert first.headers["X-Report-Task-Id"] == second.headers["X-Report-Task-Id"] == sent[0]
+    assert len(sent) == 1
+
+
+class SlowResult:
+    @property
+    def state(self) -> str:
+        time.sleep(BROKER_SECONDS)
+        return "PENDING"
+
+
+async def test_report_endpoints_do_not_block_other_requests(db, client, monkeypatch):
+    # Broker publishes and result-backend reads that block; on the event loop they would stall every request
+    monkeypatch.setattr(celery_app, "send_task", lambda *args, **kwargs: time.sleep(BROKER_SECONDS))
+    monkeypatch.setattr(celery_app, "AsyncResult", lambda task_id: SlowResult())
+    headers = auth_headers((await create_users(1))[0])
+
+    async def timed_transactions() -> list:
+        await asyncio.sleep(0.01)
+        latencies = []
+        for _ in range(20):
+            started = time.perf_counter()
+            response = await client.get("/transactions/", headers=headers)
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200
+        return latencies
+
+    reports = [client.get(f"/analysis/reports/weekly/status/task-{i}") for i in range(8)]
+    reports += [client.get("/analysis/reports/weekly/json") for _ in range(8)]
+    latencies, *responses = await asyncio.gather(timed_transactions(), *reports)
+
+    latencies.sort()
+    print(
+        f"/transactions/ during 16 report requests: "
+        f"p50 {latencies[10] * 1000:.1f} ms, max {latencies[-1] * 1000:.1f} ms"
+    )
+    assert all(response.status_code in (200, 202) for response in responses)
+    assert latencies[-1] < BROKER_SECONDS
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, compressed",
+    [
+        ("gzip", True),
+        ("br, gzip;q=0.5", True),
+        ("*", True),
+        ("gzip;q=0", False),
+        ("gzip;q=0.000, *;q=1", False),
+        ("identity", False),
+        ("", False),
+    ],
+)
+async def test_report_honours_accept_encoding_q_values(client, accept_encoding, compressed):
+    await store_report(timedelta(0))
+
+    response = await client.get("/analysis/reports/weekly/json", headers={"Accept-Encoding": accept_encoding})
+
+    assert response.status_code == 200
+    assert (response.headers.get("Content-Encoding") == "gzip") is compressed
+    assert response.json()["report"] == [{"week_start": "2026-01-05"}]
+
+
+async def test_report_etag_differs_per_content_coding(client):
+    await store_report(timedelta(0))
+    gzip_headers, identity_headers = {"Accept-Encoding": "gzip"}, {"Accept-Encoding": "identity"}
+
+    compressed = await client.get("/analysis/reports/weekly/json", headers=gzip_headers)
+    identity = await client.get("/analysis/reports/weekly/json", headers=identity_headers)
+    assert compressed.headers["ETag"] != identity.headers["ETag"]
+
+    # A validator of one representation does not revalidate the other
+    revalidated = await client.get(
+        "/analysis/reports/weekly/json", headers={**gzip_headers, "If-None-Match": compressed.headers["ETag"]}
+    )
+    assert revalidated.status_code == 304
+    assert revalidated.headers["ETag"] == compressed.headers["ETag"]
+    other = await client.get(
+        "/analysis/reports/weekly/json", headers={**identity_headers, "If-None-Match": compressed.headers["ETag"]}
+    )
+    assert other.status_code == 200
@@ -0,0 +1,74 @@
+from datetime import date, timedelta
+
+from sqlalchemy import event, select
+
+from app.db.sessions import async_session_maker, engine
+from app.models.db_models import Transaction, User
+from app.schemas.enums import TransactionStatusEnum, TransactionTypeEnum
+from app.services import queries
+from app.services.rate_history_service import FALLBACK_RATES_TO_USD
+from app.tests.utils import create_users, seed_history
+
+
+async def _summary_with_query_count(start: date, end: date):
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count)
+    try:
+        async with async_session_maker() as session:
+            summary = await queries.get_summary(session, start, end)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", count)
+    return summary, len(statements)
+
+
+async def _expected_summary(start: date, end: date) -> dict:
+    async with async_session_maker() as session:
+        users = (await session.execute(select(User))).scalars().all()
+        transactions = (await session.execute(select(Transaction))).scalars().all()
+
+    def in_range(moment) -> bool:
+        return start <= moment.date() <= end
+
+    registered = {user.id for user in users if in_range(user.created)}
+    deposits = [t for t in transactions if t.type == TransactionTypeEnum.DEPOSIT and in_range(t.created)]
+    kept = [t for t in transactions if t.status != TransactionStatusEnum.ROLLBACKED and in_range(t.created)]
+    return {
+        "registered_users": len(registered),
+        "registered_and_deposit_users": len({t.sender_id for t in deposits} & registered),
+        "registered_and_not_rollbacked_deposit_users": len(
+            {t.sender_id for t in deposits if t.status != TransactionStatusEnum.ROLLBACKED} & registered
+        ),
+        "not_rollbacked_deposit_amount_usd": sum(
+            float(t.amount) * FALLBACK_RATES_TO_USD[t.currency] for t in kept if t.type == TransactionTypeEnum.DEPOSIT
+        ),
+        "not_rollbacked_withdraw_amount_usd": sum(
+            float(t.amount) * FALLBACK_RATES_TO_USD[t.currency]
+            for t in kept
+            if t.type == TransactionTypeEnum.WITHDRAWAL
+        ),
+        "transactions": sum(in_range(t.created) for t in transactions),
+        "not_rollbacked_transactions": len(kept),
+    }
+
+
+def _rounded(summary: dict) -> dict:
+    return {key: round(value, 2) for key, value in summary.items()}
+
+
+async def test_summary_runs_a_fixed_number_of_queries(db):
+    end = date.today()
+    start = end - timedelta(days=180)
+    await seed_history(users=50, transactions=2000)
+
+    summary, queries_count = await _summary_with_query_count(start, end)
+    assert _rounded(summary) == _rounded(await _expected_summary(start, end))
+
+    await create_users(450)
+    grown_summary, grown_queries_count = await _summary_with_query_count(start, end)
+
+    assert grown_summary["registered_users"] == summary["registered_users"] + 450
+    assert grown_queries_count == queries_count
@@ -0,0 +1,122 @@
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from sqlalchemy import func, select
+
+from app.db.sessions import async_session_maker
+from app.models.db_models import Transaction, WeeklySender
+from app.schemas.enums import (CurrencyEnum, TransactionStatusEnum,
+                               TransactionTypeEnum)
+from app.schemas.transaction_schemas import (BatchRollbackRequestModel,
+                                             BatchTransactionRequestModel,
+                                             BatchTransactionRowModel,
+                                             RequestTransactionModel)
+from app.services import balance_snapshot_service
+from app.services.analysis_service import collect_weeks_from_rollup
+from app.services.balance_snapshot_service import (get_balances_as_of,
+                                                   take_balance_snapshot)
+from app.services.rollup_service import week_start_of
+from app.services.transaction_service import (MAX_BATCH_ROLLBACK,
+                                              create_transaction,
+                                              create_transactions_batch,
+                                              rollback_transactions_batch)
+from app.tests.utils import create_usd_users, create_users, get_balance
+
+MAX_BATCH_ROWS = BatchTransactionRequestModel.model_fields["rows"].metadata[1].max_length
+
+
+async def test_batch_of_maximum_size_with_distinct_users(db):
+    # One row per user: more users, balances and weekly senders than bind parameters fit in one statement
+    await create_usd_users(MAX_BATCH_ROWS)
+    rows = [
+        BatchTransactionRowModel(
+            user_id=user_id,
+            currency=CurrencyEnum.USD,
+            amount=10,
+            type=TransactionTypeEnum.DEPOSIT if user_id % 2 else TransactionTypeEnum.WITHDRAWAL,
+        )
+        for user_id in range(1, MAX_BATCH_ROWS + 1)
+    ]
+
+    started = time.perf_counter()
+    async with async_session_maker() as session:
+        response = await create_transactions_batch(session, rows)
+    print(f"{MAX_BATCH_ROWS} rows in {time.perf_counter() - started:.1f}s")
+
+    assert response.accepted == MAX_BATCH_ROWS
+    assert await get_balance(1) == 110
+    assert await get_balance(2) == 90
+    async with async_session_maker() as session:
+        assert await session.scalar(select(func.count()).select_from(Transaction)) == MAX_BATCH_ROWS
+        assert await session.scalar(select(func.count()).select_from(WeeklySender)) == MAX_BATCH_ROWS
+        (week,) = await collect_weeks_from_rollup(session, week_start_of(datetime.now(timezone.utc)), 1)
+    assert week["transaction_users"] == MAX_BATCH_ROWS
+    assert week["deposit_users"] == MAX_BATCH_ROWS // 2
+
+
+async def test_batch_outpaces_the_per_row_path(db):
+    user_ids = await create_users(50, amount=Decimal(0))
+    rows = [
+        BatchTransactionRowModel(
+            user_id=user_ids[i % 50], currency=CurrencyEnum.USD, amount=1, type=TransactionTypeEnum.DEPOSIT
+        )
+        for i in range(1000)
+    ]
+
+    started = time.perf_counter()
+    for row in rows[:200]:
+        async with async_session_maker() as session:
+            await create_transaction(
+                session, row.user_id, RequestTransactionModel(type=row.type, currency=row.currency, amount=row.amount)
+            )
+    per_row = 200 / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    async with async_session_maker() as session:
+        response = await create_transactions_batch(session, rows)
+    batched = len(rows) / (time.perf_counter() - started)
+
+    print(f"per-row {per_row:.0f} rows/s, batch {batched:.0f} rows/s")
+    assert response.accepted == len(rows)
+    assert await get_balance(user_ids[0]) == 24
+    assert batched > 5 * per_row
+
+
+async def _usd_as_of(user_id: int, as_of: datetime) -> Decimal:
+    async with async_session_maker() as session:
+        balances = await get_balances_as_of(session, user_id, as_of)
+    return {balance.currency: balance.amount for balance in balances}[CurrencyEnum.USD]
+
+
+async def test_rollback_of_maximum_size_by_ids(db, monkeypatch):
+    # The snapshot is taken right after the deposits, not BALANCE_SNAPSHOT_LAG_SECONDS later
+    monkeypatch.setattr(balance_snapshot_service, "BALANCE_SNAPSHOT_LAG_SECONDS", 0)
+    await create_usd_users(MAX_BATCH_ROLLBACK)
+    rows = [
+        BatchTransactionRowModel(
+            user_id=user_id, currency=CurrencyEnum.USD, amount=10, type=TransactionTypeEnum.DEPOSIT
+        )
+        for user_id in range(1, MAX_BATCH_ROLLBACK + 1)
+    ]
+    async with async_session_maker() as session:
+        ingested = await create_transactions_batch(session, rows)
+    snapshot_at = datetime.now(timezone.utc)
+    async with async_session_maker() as session:
+        await take_balance_snapshot(session, snapshot_at)
+    assert await _usd_as_of(MAX_BATCH_ROLLBACK, snapshot_at) == 110
+
+    async with async_session_maker() as session:
+        response = await rollback_transactions_batch(
+            session, BatchRollbackRequestModel(transaction_ids=[row.transaction_id for row in ingested.results])
+        )
+
+    assert response.rolled_back == MAX_BATCH_ROLLBACK
+    assert await get_balance(MAX_BATCH_ROLLBACK) == 100
+    # The snapshot taken after the deposits no longer includes them
+    assert await _usd_as_of(MAX_BATCH_ROLLBACK, snapshot_at) == 100
+    async with async_session_maker() as session:
+        rolled_back = await session.scalar(
+            select(func.count()).select_from(Transaction).where(Transaction.status == TransactionStatusEnum.ROLLBACKED)
+        )
+    assert rolled_back == MAX_BATCH_ROLLBACK
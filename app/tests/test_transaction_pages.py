@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import List, Optional
+
+import pytest
+
+from app.db.sessions import async_session_maker
+from app.models.db_models import Transaction
+from app.schemas.enums import (CurrencyEnum, TransactionDirectionEnum,
+                               TransactionStatusEnum, TransactionTypeEnum)
+from app.schemas.transaction_schemas import RequestTransactionModel
+from app.services.transaction_service import (create_transaction,
+                                              get_transactions)
+from app.tests.utils import create_users
+
+
+async def _insert(sender_id: int, recipient_id: Optional[int], created: datetime, count: int) -> None:
+    async with async_session_maker() as session:
+        session.add_all(
+            [
+                Transaction(
+                    sender_id=sender_id,
+                    recipient_id=recipient_id,
+                    currency=CurrencyEnum.USD,
+                    amount=Decimal(1),
+                    type=TransactionTypeEnum.TRANSFER if recipient_id else TransactionTypeEnum.DEPOSIT,
+                    status=TransactionStatusEnum.PROCESSED,
+                    created=created,
+                )
+                for _ in range(count)
+            ]
+        )
+        await session.commit()
+
+
+async def _walk(user_id: Optional[int], direction: Optional[TransactionDirectionEnum], limit: int, between_pages=None):
+    ids: List[int] = []
+    cursor = None
+    while True:
+        async with async_session_maker() as session:
+            page = await get_transactions(user_id, session, direction, limit=limit, cursor=cursor)
+        ids.extend(item.id for item in page.items)
+        if page.next_cursor is None:
+            return ids
+        cursor = page.next_cursor
+        if between_pages is not None:
+            await between_pages()
+
+
+@pytest.mark.parametrize("direction", [None, TransactionDirectionEnum.RECEIVED, TransactionDirectionEnum.SENT])
+async def test_pages_split_transactions_with_equal_created(db, direction):
+    user_id, other_id = await create_users(2)
+    created = datetime.now(timezone.utc) - timedelta(days=3)
+    # Deposits by the user, transfers to the user (a second branch) and transfers by the user, all at one instant
+    await _insert(user_id, None, created, 5)
+    await _insert(other_id, user_id, created, 4)
+    await _insert(user_id, other_id, created, 3)
+    await _insert(user_id, None, created - timedelta(seconds=1), 2)
+
+    expected = await _walk(user_id, direction, limit=100)
+    for limit in (1, 2, 3, 4):
+        assert await _walk(user_id, direction, limit=limit) == expected
+    assert len(expected) == {None: 14, TransactionDirectionEnum.RECEIVED: 11, TransactionDirectionEnum.SENT: 3}[
+        direction
+    ]
+
+
+async def test_pages_stay_stable_under_concurrent_inserts(db):
+    user_id, other_id = await create_users(2)
+    created = datetime.now(timezone.utc) - timedelta(days=3)
+    await _insert(user_id, None, created, 6)
+    await _insert(other_id, user_id, created, 6)
+    expected = await _walk(user_id, None, limit=100)
+
+    async def insert_newer() -> None:
+        for sender_id in (user_id, other_id):
+            async with async_session_maker() as session:
+                await create_transaction(
+                    session,
+                    sender_id,
+                    RequestTransactionModel(type=TransactionTypeEnum.DEPOSIT, currency=CurrencyEnum.USD, amount=1),
+                )
+        await _insert(other_id, user_id, created + timedelta(seconds=1), 2)
+
+    # Rows newer than the cursor never shift the pages behind it: no row is repeated or skipped
+    assert await _walk(user_id, None, limit=5, between_pages=insert_newer) == expected
@@ -0,0 +1,39 @@
+from sqlalchemy import func, select
+
+from app.config import PASSWORD_HASH_MAX_PENDING
+from app.db.sessions import async_session_maker
+from app.models.db_models import User
+from app.services import password_service, user_service
+
+
+async def _user_count() -> int:
+    async with async_session_maker() as session:
+        return (await session.execute(select(func.count()).select_from(User))).scalar()
+
+
+async def test_registration_is_refused_while_the_hash_pool_is_saturated(db, client, monkeypatch):
+    monkeypatch.setattr(password_service, "_pending", PASSWORD_HASH_MAX_PENDING)
+
+    response = await client.post("/users/register", json={"email": "new@example.com", "password": "secret"})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert await _user_count() == 0
+
+
+async def test_taken_email_is_refused_before_hashing(db, client, monkeypatch):
+    hashed = []
+
+    async def fake_hash_password(password: str) -> str:
+        hashed.append(password)
+        return "not-a-hash"
+
+    monkeypatch.setattr(user_service, "hash_password", fake_hash_password)
+    payload = {"email": "taken@example.com", "password": "secret"}
+
+    assert (await client.post("/users/register", json=payload)).status_code == 200
+    response = await client.post("/users/register", json=payload)
+
+    assert response.status_code == 409
+    assert hashed == ["secret"]
+    assert await _user_count() == 1
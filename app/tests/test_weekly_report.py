@@ -0,0 +1,122 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+from datetime import time as time_of_day
+from datetime import timedelta, timezone
+from decimal import Decimal
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.db.sessions import async_session_maker
+from app.models.db_models import Transaction, User
+from app.schemas.enums import (CurrencyEnum, TransactionStatusEnum,
+                               TransactionTypeEnum)
+from app.services import rollup_service
+from app.services.analysis_service import (collect_all_weeks_report_sequential,
+                                           collect_weeks_from_rollup,
+                                           collect_weeks_metrics,
+                                           get_report_window)
+from app.services.rollup_service import (add_new_user_to_rollup,
+                                         apply_transactions_to_rollup,
+                                         rebuild_weekly_rollups)
+from app.tests.utils import create_users, seed_history
+
+
+async def test_weeks_metrics_match_sequential_reference(db):
+    await seed_history()
+
+    started = time.perf_counter()
+    expected = await collect_all_weeks_report_sequential()
+    sequential_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    async with async_session_maker() as session:
+        report = await collect_weeks_metrics(session, get_report_window(52), 52)
+    grouped_seconds = time.perf_counter() - started
+
+    assert report == expected
+    print(f"52 weeks: sequential {sequential_seconds:.3f}s, grouped {grouped_seconds:.3f}s")
+    assert grouped_seconds < sequential_seconds
+
+
+async def test_rollups_bucket_weeks_in_utc_whatever_the_session_timezone(db):
+    # A session 14 hours ahead of UTC would put a Sunday-evening transaction into the next week
+    engine = create_async_engine(
+        os.environ["DATABASE_URL"], connect_args={"server_settings": {"timezone": "Etc/GMT-14"}}
+    )
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    monday = get_report_window(4)
+    sunday_evening = datetime.combine(monday - timedelta(days=1), time_of_day(23, 30), tzinfo=timezone.utc)
+    try:
+        async with session_maker() as session:
+            user = User(email="late@example.com", password="not-a-hash", created=sunday_evening)
+            session.add(user)
+            await session.flush()
+            await add_new_user_to_rollup(session, user)
+            transactions = [
+                Transaction(
+                    sender_id=user.id,
+                    currency=CurrencyEnum.USD,
+                    amount=Decimal(10),
+                    type=TransactionTypeEnum.DEPOSIT,
+                    status=TransactionStatusEnum.PROCESSED,
+                    created=sunday_evening + timedelta(hours=hours),
+                )
+                for hours in (0, 1)
+            ]
+            session.add_all(transactions)
+            await session.flush()
+            await apply_transactions_to_rollup(session, transactions)
+            await session.commit()
+            incremental = await collect_weeks_from_rollup(session, monday - timedelta(weeks=2), 3)
+
+            weeks = await rebuild_weekly_rollups(session, monday - timedelta(weeks=2), monday + timedelta(days=2))
+            rebuilt = await collect_weeks_from_rollup(session, monday - timedelta(weeks=2), 3)
+    finally:
+        await engine.dispose()
+
+    assert [week["new_users"] for week in incremental] == [0, 1, 0]
+    assert [week["total_transactions"] for week in incremental] == [0, 1, 1]
+    assert rebuilt == incremental
+    assert weeks == 3
+
+
+async def test_concurrent_rollup_writers_on_different_stripes_do_not_wait(db, monkeypatch):
+    stripes = iter(range(3))
+    monkeypatch.setattr(rollup_service, "_random_stripe", lambda: next(stripes))
+    first_id, second_id = await create_users(2)
+    week_start = get_report_window(1)
+    created = datetime.combine(week_start, time_of_day(12), tzinfo=timezone.utc)
+
+    async def deposit(session, sender_id: int) -> None:
+        transaction = Transaction(
+            sender_id=sender_id,
+            currency=CurrencyEnum.USD,
+            amount=Decimal(10),
+            type=TransactionTypeEnum.DEPOSIT,
+            status=TransactionStatusEnum.PROCESSED,
+            created=created,
+        )
+        session.add(transaction)
+        await session.flush()
+        await apply_transactions_to_rollup(session, [transaction])
+
+    # The first writer holds its rows until commit; the second, on another stripe of the same week, goes through
+    async with async_session_maker() as first, async_session_maker() as second:
+        await deposit(first, first_id)
+        await asyncio.wait_for(deposit(second, second_id), timeout=5)
+        await second.commit()
+        await first.commit()
+    async with async_session_maker() as session:
+        await deposit(session, first_id)
+        await session.commit()
+
+        (week,) = await collect_weeks_from_rollup(session, week_start, 1)
+        (reference,) = await collect_weeks_metrics(session, week_start, 1)
+    assert week["total_transactions"] == 3
+    assert week["sum_deposits"] == 30
+    assert week["deposit_users"] == week["transaction_users"] == 2
+    assert {key: reference[key] for key in week if key != "dynamics"} == {
+        key: week[key] for key in week if key != "dynamics"
+    }
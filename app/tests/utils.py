@@ -0,0 +1,153 @@
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+from app.db.sessions import async_session_maker
+from app.models.db_models import Transaction, User, UserBalance
+from app.schemas.enums import (CurrencyEnum, TransactionStatusEnum,
+                               TransactionTypeEnum, UserRoleEnum,
+                               UserStatusEnum)
+from app.services.auth_service import create_access_token
+from app.tasks import update_rates
+from app.tasks.update_rates import encode_snapshot, queue_snapshot
+
+# Oldest transaction the seeded data goes back to; partitions are created from there
+SEED_DAYS = 400
+
+
+def auth_headers(user_id: int) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {create_access_token({'sub': str(user_id)})}"}
+
+
+async def create_users(
+    count: int,
+    amount: Decimal = Decimal(1000),
+    role: UserRoleEnum = UserRoleEnum.USER,
+    created: Optional[datetime] = None,
+) -> List[int]:
+    """
+    Creates active users with a balance of `amount` in every currency and returns their ids.
+    """
+    async with async_session_maker() as session:
+        users = [
+            User(
+                email=f"{role.value.lower()}-{random.getrandbits(48)}@example.com",
+                password="not-a-hash",
+                role=role,
+                status=UserStatusEnum.ACTIVE,
+                created=created or datetime.now(timezone.utc),
+            )
+            for _ in range(count)
+        ]
+        session.add_all(users)
+        await session.flush()
+        session.add_all(
+            [UserBalance(user_id=user.id, currency=c, amount=amount) for user in users for c in CurrencyEnum]
+        )
+        await session.commit()
+        return [user.id for user in users]
+
+
+async def create_usd_users(count: int) -> None:
+    """
+    Users 1..count with 100 USD each, inserted server-side: fast enough for tens of thousands.
+    """
+    async with async_session_maker() as session:
+        await session.execute(
+            text(
+                'INSERT INTO "user" (id, email, password, role, status, created)'
+                " SELECT i, 'bulk-' || i || '@example.com', 'not-a-hash', 'USER', 'ACTIVE', now()"
+                " FROM generate_series(1, :count) AS i"
+            ),
+            {"count": count},
+        )
+        await session.execute(
+            text(
+                "INSERT INTO user_balance (user_id, currency, amount)"
+                " SELECT i, 'USD', 100 FROM generate_series(1, :count) AS i"
+            ),
+            {"count": count},
+        )
+        await session.execute(
+            text("""SELECT setval(pg_get_serial_sequence('"user"', 'id'), :count)"""), {"count": count}
+        )
+        await session.commit()
+
+
+async def seed_history(users: int = 200, transactions: int = 5000, seed: int = 1) -> None:
+    """
+    Users registered and transactions made at random times over the last SEED_DAYS days, of every type and status.
+    Balances are not kept consistent with the transactions.
+    """
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    async with async_session_maker() as session:
+        people = [
+            User(
+                email=f"seed-{i}@example.com",
+                password="not-a-hash",
+                role=UserRoleEnum.USER,
+                status=UserStatusEnum.ACTIVE,
+                created=now - timedelta(days=rng.uniform(0, SEED_DAYS)),
+            )
+            for i in range(users)
+        ]
+        session.add_all(people)
+        await session.flush()
+        session.add_all(
+            [UserBalance(user_id=p.id, currency=c, amount=Decimal(100000)) for p in people for c in CurrencyEnum]
+        )
+        rows = []
+        for _ in range(transactions):
+            kind = rng.choice(list(TransactionTypeEnum))
+            sender = rng.choice(people).id
+            row = dict(
+                sender_id=sender,
+                currency=rng.choice(list(CurrencyEnum)),
+                amount=Decimal(str(round(rng.uniform(1, 1000), 2))),
+                type=kind,
+                status=rng.choice([TransactionStatusEnum.PROCESSED] * 9 + [TransactionStatusEnum.ROLLBACKED]),
+                created=now - timedelta(days=rng.uniform(0, SEED_DAYS)),
+            )
+            if kind == TransactionTypeEnum.TRANSFER:
+                row["recipient_id"] = rng.choice(people).id
+            if kind == TransactionTypeEnum.EXCHANGE:
+                from_currency, to_currency = rng.sample(list(CurrencyEnum), 2)
+                row.update(
+                    recipient_id=sender,
+                    from_currency=from_currency,
+                    to_currency=to_currency,
+                    currency=from_currency,
+                    converted_amount=row["amount"] * 2,
+                )
+            rows.append(Transaction(**row))
+        session.add_all(rows)
+        await session.commit()
+
+
+async def get_balance(user_id: int, currency: CurrencyEnum = CurrencyEnum.USD) -> Decimal:
+    """
+    The user's balance including stripes.
+    """
+    async with async_session_maker() as session:
+        result = await session.execute(
+            text(
+                "SELECT b.amount + COALESCE((SELECT sum(s.amount) FROM user_balance_stripe s"
+                " WHERE s.user_id = b.user_id AND s.currency = b.currency), 0)"
+                " FROM user_balance b WHERE b.user_id = :user_id AND b.currency = :currency"
+            ),
+            {"user_id": user_id, "currency": currency.value},
+        )
+        return result.scalar()
+
+
+def store_rates(usd_values: Dict[str, float]) -> None:
+    """
+    Publishes a fresh rates snapshot, as the update_rates task does.
+    """
+    with update_rates.redis_client.pipeline() as pipe:
+        queue_snapshot(pipe, encode_snapshot(usd_values, time.time())).execute()
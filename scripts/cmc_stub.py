@@ -0,0 +1,58 @@
+"""
+Local stand-in for the CoinMarketCap quotes endpoint, to refresh and benchmark the rates offline:
+
+    python scripts/cmc_stub.py --port 8081 --delay 0.1
+    COINMARKETCAP_BASE_URL=http://127.0.0.1:8081/v1/cryptocurrency/quotes/latest python -m app.tasks.update_rates
+"""
+
+import argparse
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Fixed prices: USD value of the cryptos, units of the fiat per USD
+CRYPTO_USD = {"BTC": 60000.0, "ETH": 3000.0, "DOGE": 0.1, "USDT": 1.0}
+FIAT_PER_USD = {"USD": 1.0, "EUR": 0.9, "AUD": 1.5, "CAD": 1.35, "ARS": 900.0, "PLN": 4.0}
+
+
+class QuotesHandler(BaseHTTPRequestHandler):
+    delay = 0.0
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        query = parse_qs(urlparse(self.path).query)
+        symbols = query.get("symbol", [""])[0].split(",")
+        converts = query.get("convert", ["USD"])[0].split(",")
+        if any(s not in CRYPTO_USD for s in symbols) or any(c not in FIAT_PER_USD for c in converts):
+            self.send_error(400, "Unknown symbol or convert")
+            return
+        data = {
+            symbol: {"quote": {fiat: {"price": CRYPTO_USD[symbol] * FIAT_PER_USD[fiat]} for fiat in converts}}
+            for symbol in symbols
+        }
+        body = json.dumps({"data": data}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port: int, delay: float) -> ThreadingHTTPServer:
+    QuotesHandler.delay = delay
+    return ThreadingHTTPServer(("127.0.0.1", port), QuotesHandler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve fixed CoinMarketCap quotes locally.")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds to wait before every response")
+    args = parser.parse_args()
+
+    server = serve(args.port, args.delay)
+    print(f"Serving on http://127.0.0.1:{args.port}/v1/cryptocurrency/quotes/latest")
+    server.serve_forever()
@@ -0,0 +1,58 @@
+"""
+Login storm against a running API: measures login throughput and the latency of an unrelated endpoint meanwhile.
+
+    python scripts/login_storm.py --url http://127.0.0.1:7999 --email user@example.com --password secret
+"""
+
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+import httpx
+
+
+async def storm(client: httpx.AsyncClient, args, statuses: Counter, deadline: float) -> None:
+    while time.perf_counter() < deadline:
+        resp = await client.post("/auth/login", data={"username": args.email, "password": args.password})
+        statuses[resp.status_code] += 1
+        if resp.status_code in (429, 503):
+            # Back off like a well-behaved client instead of hammering the server with rejected requests
+            await asyncio.sleep(float(resp.headers.get("Retry-After", 1)))
+
+
+async def probe(client: httpx.AsyncClient, path: str, latencies: list, deadline: float) -> None:
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        await client.get(path)
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.01)
+
+
+async def main(args) -> None:
+    statuses: Counter = Counter()
+    latencies: list = []
+    limits = httpx.Limits(max_connections=args.concurrency + 1)
+    async with httpx.AsyncClient(base_url=args.url, timeout=60.0, limits=limits) as client:
+        deadline = time.perf_counter() + args.seconds
+        await asyncio.gather(
+            probe(client, args.probe_path, latencies, deadline),
+            *[storm(client, args, statuses, deadline) for _ in range(args.concurrency)],
+        )
+    latencies.sort()
+    print(f"logins: {statuses[200] / args.seconds:.1f}/s ok, responses by status {dict(statuses)}")
+    print(
+        f"{args.probe_path}: {len(latencies)} requests, p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms, max {latencies[-1] * 1000:.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure login throughput and unrelated latency during a storm.")
+    parser.add_argument("--url", default="http://127.0.0.1:7999")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--concurrency", type=int, default=64, help="Concurrent login loops")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--probe-path", default="/openapi.json", help="Unrelated endpoint timed during the storm")
+    asyncio.run(main(parser.parse_args()))